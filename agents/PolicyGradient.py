@@ -3,6 +3,10 @@ import numpy as np
 import gym
 from gym.spaces import Discrete, Box
 
+import agents.action_pool as action_pool
+import agents.network as network
+import agents.rollout as rollout
+
 
 def mlp(x, sizes, activation=tf.tanh, output_activation=None):
     # Build a feedforward neural network.
@@ -11,11 +15,81 @@ def mlp(x, sizes, activation=tf.tanh, output_activation=None):
     return tf.layers.dense(x, units=sizes[-1], activation=output_activation)
 
 
+def export(sess, file_path, **metadata):
+    # Save the dense layers of the policy network for the NumPy forward pass of agents.network.
+    variables = tf.trainable_variables()
+    kernels = [v for v in variables if v.name.endswith('kernel:0')]
+    biases = [v for v in variables if v.name.endswith('bias:0')]
+    kernels, biases = sess.run([kernels, biases])
+    network.save(file_path, kernels, biases, activation='tanh', metadata=metadata)
+
+
+class PowerGridEnv:
+    """
+    Gym view of a power grid environment, pypownet's RunEnv or the
+    surrogate. The observations are the observation arrays and the
+    discrete action i switches the element i of the node splitting
+    subaction, as the actions of the tabular agents.
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        n_acts = environment.action_space.prods_switches_subaction_length + \
+                 environment.action_space.loads_switches_subaction_length + \
+                 environment.action_space.lines_or_switches_subaction_length + \
+                 environment.action_space.lines_ex_switches_subaction_length
+        self.action_pool = action_pool.ActionPool(environment.action_space, n_acts)
+
+        obs_dim = len(self.reset())
+        self.observation_space = Box(low=-np.inf, high=np.inf, shape=(obs_dim,), dtype=np.float32)
+        self.action_space = Discrete(n_acts)
+
+    def reset(self):
+        return np.asarray(self.environment.reset(), dtype=np.float32)
+
+    def step(self, act):
+        obs, rew, done, info = self.environment.step(self.action_pool[int(act)], do_sum=True)
+        # there is no observation after a game over, the environment is reset
+        return None if obs is None else np.asarray(obs, dtype=np.float32), rew, done, info
+
+    def render(self):
+        self.environment.render()
+
+
+def make_env(env_name, env_id=0, **env_kwargs):
+    # 'RunEnv' and 'Surrogate' are power grids, anything else a gym environment.
+    # env_id shifts the chronic start id so that the copies of a power grid play different chronics.
+    if env_name == 'RunEnv':
+        import pypownet.environment
+        env_kwargs['start_id'] = env_kwargs.get('start_id', 0) + env_id
+        return PowerGridEnv(pypownet.environment.RunEnv(**env_kwargs))
+    if env_name == 'Surrogate':
+        import environments.surrogate
+        env_kwargs['start_id'] = env_kwargs.get('start_id', 0) + env_id
+        return PowerGridEnv(environments.surrogate.SurrogateEnvironment(**env_kwargs))
+    return gym.make(env_name)
+
+
 def train(env_name='CartPole-v0', hidden_sizes=[32], lr=1e-2,
-          epochs=70, batch_size=5000, render=False):
+          epochs=70, batch_size=5000, render=False, num_envs=1,
+          reward_to_go=False, env_kwargs=None, export_path=None):
+    """
+    :param num_envs: Number of environment copies stepped in lockstep,
+        all their actions being sampled in one session run. An epoch is
+        made of ceil(batch_size / num_envs) steps of every copy, and the
+        episodes cut by the end of the epoch are not learned from.
+    :param reward_to_go: Weight the log probability of an action with
+        the rewards following it instead of the return of its episode.
+    :param env_kwargs: Keyword arguments of the power grid environments.
+    :param export_path: Optional .npz file where the trained policy
+        network is exported, see agents.network and agent.ExportedPolicy.
+    """
+
+    env_kwargs = dict() if env_kwargs is None else env_kwargs
 
     # make environment, check spaces, get obs / act dims
-    env = gym.make(env_name)
+    envs = [make_env(env_name, i, **env_kwargs) for i in range(num_envs)]
+    env = envs[0]
     assert isinstance(env.observation_space, Box), \
         "This example only works for envs with continuous state spaces."
     assert isinstance(env.action_space, Discrete), \
@@ -44,66 +118,53 @@ def train(env_name='CartPole-v0', hidden_sizes=[32], lr=1e-2,
     sess = tf.InteractiveSession()
     sess.run(tf.global_variables_initializer())
 
-    # for training policy
+    # for training policy on the environment copies stepped in lockstep
     def train_one_epoch():
-        # make some empty lists for logging.
-        batch_obs = []          # for observations
-        batch_acts = []         # for actions
-        batch_weights = []      # for R(tau) weighting in policy gradient
-        batch_rets = []         # for measuring episode returns
-        batch_lens = []         # for measuring episode lengths
-
-        # reset episode-specific variables
-        obs = env.reset()       # first obs comes from starting distribution
-        done = False            # signal from environment that episode is over
-        ep_rews = []            # list for rewards accrued throughout ep
-
-        # render first episode of each epoch
+        steps = -(-batch_size // num_envs)
+
+        # preallocated (time, environment) buffers
+        batch_obs = np.zeros((steps, num_envs, obs_dim), dtype=np.float32)
+        batch_acts = np.zeros((steps, num_envs), dtype=np.int32)
+        batch_rews = np.zeros((steps, num_envs))
+        batch_dones = np.zeros((steps, num_envs), dtype=bool)
+
+        obs = np.array([e.reset() for e in envs], dtype=np.float32)
+
+        # render first episode of the first copy in each epoch
         finished_rendering_this_epoch = False
 
-        # collect experience by acting in the environment with current policy
-        while True:
+        for t in range(steps):
 
             # rendering
             if (not finished_rendering_this_epoch) and render:
                 env.render()
 
-            # save obs
-            batch_obs.append(obs.copy())
+            batch_obs[t] = obs
 
-            # act in the environment
-            act = sess.run(actions, {obs_ph: obs.reshape(1,-1)})[0]
-            obs, rew, done, _ = env.step(act)
+            # act in all the environments with one session run
+            acts = sess.run(actions, {obs_ph: obs})
+            batch_acts[t] = acts
 
-            # save action, reward
-            batch_acts.append(act)
-            ep_rews.append(rew)
+            for i, e in enumerate(envs):
+                o, rew, done, _ = e.step(acts[i])
+                batch_rews[t, i] = rew
+                batch_dones[t, i] = done
+                if done:
+                    o = e.reset()
+                    finished_rendering_this_epoch |= i == 0
+                obs[i] = o
 
-            if done:
-                # if episode is over, record info about episode
-                ep_ret, ep_len = sum(ep_rews), len(ep_rews)
-                batch_rets.append(ep_ret)
-                batch_lens.append(ep_len)
+        weights, valid, batch_rets, batch_lens = rollout.episode_weights(batch_rews, batch_dones, reward_to_go)
+        # if no episode finished, learn from the cut ones with their partial returns
+        if not np.any(valid):
+            valid[:] = True
 
-                # the weight for each logprob(a|s) is R(tau)
-                batch_weights += [ep_ret] * ep_len
-
-                # reset episode-specific variables
-                obs, done, ep_rews = env.reset(), False, []
-
-                # won't render again this epoch
-                finished_rendering_this_epoch = True
-
-                # end experience loop if we have enough of it
-                if len(batch_obs) > batch_size:
-                    break
-
-        # take a single policy gradient update step
+        # samples in environment major order, as the weights
         batch_loss, _ = sess.run([loss, train_op],
                                  feed_dict={
-                                    obs_ph: np.array(batch_obs),
-                                    act_ph: np.array(batch_acts),
-                                    weights_ph: np.array(batch_weights)
+                                    obs_ph: batch_obs.transpose(1, 0, 2).reshape(-1, obs_dim)[valid],
+                                    act_ph: batch_acts.T.ravel()[valid],
+                                    weights_ph: weights[valid]
                                  })
         return batch_loss, batch_rets, batch_lens
 
@@ -113,12 +174,22 @@ def train(env_name='CartPole-v0', hidden_sizes=[32], lr=1e-2,
         print('epoch: %3d \t loss: %.3f \t return: %.3f \t ep_len: %.3f'%
                 (i, batch_loss, np.mean(batch_rets), np.mean(batch_lens)))
 
+    if export_path is not None:
+        export(sess, export_path, env_name=env_name, obs_dim=obs_dim, n_acts=n_acts)
+
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('--env_name', '--env', type=str, default='CartPole-v0')
     parser.add_argument('--render', action='store_true')
     parser.add_argument('--lr', type=float, default=1e-2)
+    parser.add_argument('--num_envs', type=int, default=1)
+    parser.add_argument('--reward_to_go', '--rtg', action='store_true')
+    parser.add_argument('--parameters', type=str, default='./parameters/default14/')
+    parser.add_argument('--level', type=str, default='level0')
+    parser.add_argument('--export', type=str, default=None)
     args = parser.parse_args()
     print('\nUsing simplest formulation of policy gradient.\n')
-    train(env_name=args.env_name, render=args.render, lr=args.lr)
\ No newline at end of file
+    env_kwargs = dict(parameters_folder=args.parameters, game_level=args.level) if args.env_name == 'RunEnv' else None
+    train(env_name=args.env_name, render=args.render, lr=args.lr, num_envs=args.num_envs,
+          reward_to_go=args.reward_to_go, env_kwargs=env_kwargs, export_path=args.export)
@@ -0,0 +1,148 @@
+import functools
+
+import numpy as np
+
+"""Number of rejections, without any acceptance, after which an action is considered illegal."""
+DEFAULT_REJECTIONS_THRESHOLD = 3
+
+
+@functools.lru_cache(maxsize=None)
+def node_splitting_legality(prods_substations, loads_substations, lines_or_substations, lines_ex_substations):
+    """
+    Which single element switches of the node splitting subaction can
+    be legal, from the reference topology where all the elements of a
+    substation are on the same node. Cached per grid.
+
+    Switching a production or a load alone to the other node isolates
+    it, which is a game over. Switching the end of a line leaves it
+    alone on the other node: it is only useful if the substation keeps
+    another line to serve its remaining elements, otherwise they are
+    isolated or the substation has nothing else.
+
+    :param prods_substations: Tuple of the substation of every
+                              production.
+    :param loads_substations: Tuple of the substation of every load.
+    :param lines_or_substations: Tuple of the substation of the origin
+                                 of every line.
+    :param lines_ex_substations: Tuple of the substation of the
+                                 extremity of every line.
+    :return: Read-only boolean array in the order of the node splitting
+             subaction.
+    """
+
+    lines_ends_substations = np.array(lines_or_substations + lines_ex_substations)
+    (substations, lines_ends_counts) = np.unique(lines_ends_substations, return_counts=True)
+    lines_ends_per_substation = dict(zip(substations.tolist(), lines_ends_counts.tolist()))
+
+    legal = np.concatenate((np.zeros(len(prods_substations) + len(loads_substations), bool),
+                            [lines_ends_per_substation[substation] >= 2 for substation in
+                             lines_ends_substations.tolist()]))
+    legal.flags.writeable = False
+
+    return legal
+
+
+class ActionMask:
+    """
+    The set of agent's actions worth trying. It is built from the
+    structure of the action space, then refined online: an action
+    rejected by the environment (illegal action or immediate game
+    over) rejections_threshold times and never accepted is masked.
+    The last legal action is never masked.
+    """
+
+    def __init__(self, legal, rejections_threshold=DEFAULT_REJECTIONS_THRESHOLD):
+        """
+        :param legal: Boolean array of the legal actions.
+        :param rejections_threshold: Number of rejections, without any
+                                     acceptance, masking an action.
+        """
+
+        assert np.any(legal)
+
+        self.legal = np.array(legal, bool)
+        self.legal_actions = np.flatnonzero(self.legal)
+        self.rejections_threshold = rejections_threshold
+        self.rejections = np.zeros(len(self.legal), int)
+        self.acceptances = np.zeros(len(self.legal), int)
+
+    @staticmethod
+    def from_action_space(action_space, action_space_size, rejections_threshold=DEFAULT_REJECTIONS_THRESHOLD):
+        """
+        Build the mask of an environment's action space. If the action
+        space does not tell the substations of the elements, all the
+        actions are legal until rejected.
+
+        :param action_space: The action space of the environment.
+        :param action_space_size: The number of agent's actions.
+        :param rejections_threshold: See ActionMask.
+        :return: An ActionMask.
+        """
+
+        substations = [getattr(action_space, name, None) for name in
+                       ('prods_subs_ids', 'loads_subs_ids', 'lines_or_subs_id', 'lines_ex_subs_id')]
+        if any(substation_ids is None for substation_ids in substations):
+            return ActionMask(np.ones(action_space_size, bool), rejections_threshold)
+
+        legal = node_splitting_legality(*[tuple(np.asarray(substation_ids).tolist())
+                                          for substation_ids in substations])
+        assert len(legal) == action_space_size
+        if not np.any(legal):
+            legal = np.ones(action_space_size, bool)
+
+        return ActionMask(legal, rejections_threshold)
+
+    def __contains__(self, action):
+        return self.legal[action]
+
+    def __len__(self):
+        return len(self.legal_actions)
+
+    def observe(self, action, rejected):
+        """
+        Record whether the environment rejected an action.
+
+        :param action: The agent's action.
+        :param rejected: True if the action was illegal or lead to an
+                         immediate game over.
+        :return: True if the action got masked.
+        """
+
+        if not rejected:
+            self.acceptances[action] += 1
+            return False
+
+        self.rejections[action] += 1
+        if self.legal[action] and self.acceptances[action] == 0 and \
+                self.rejections[action] >= self.rejections_threshold and len(self.legal_actions) > 1:
+            self.mark_illegal(action)
+            return True
+
+        return False
+
+    def mark_illegal(self, action):
+        """
+        Mask an action.
+
+        :return: void
+        """
+
+        self.legal[action] = False
+        self.legal_actions = np.flatnonzero(self.legal)
+
+    def random_actions(self, size=None):
+        """
+        :param size: None for one action, or the number of actions.
+        :return: Legal actions drawn uniformly.
+        """
+
+        return self.legal_actions[np.random.randint(len(self.legal_actions), size=size)]
+
+    def greedy_actions(self, action_values):
+        """
+        :param action_values: A row, or a 2D array of rows, of action
+                              values.
+        :return: The legal action of highest value of every row.
+        """
+
+        return self.legal_actions[np.argmax(action_values[..., self.legal_actions], axis=-1)]
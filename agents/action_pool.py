@@ -0,0 +1,85 @@
+import collections
+
+import numpy as np
+
+
+class ActionPool:
+    """
+    Cache of the environment actions corresponding to the agent's
+    actions. The agent's action i is the environment's do nothing
+    action in which the line extremity i switches to the other node of
+    its substation.
+
+    The environment actions are built the first time they are asked
+    for and then shared: their node splitting subaction is read-only,
+    so they must not be modified. For huge action spaces the pool can
+    be capped, in which case the least recently used actions are
+    forgotten and rebuilt when needed again.
+    """
+
+    def __init__(self, action_space, action_space_size, max_size=None):
+        """
+        Initialize an empty pool.
+
+        :param action_space: The action space of the environment.
+        :param action_space_size: The number of agent's actions.
+        :param max_size: Maximum number of cached actions. None means
+                         all the actions are kept.
+        """
+
+        assert max_size is None or max_size > 0
+
+        self.action_space = action_space
+        self.action_space_size = action_space_size
+        self.max_size = max_size
+        self.actions = collections.OrderedDict()
+
+        self.do_nothing_action_array = np.asarray(action_space.get_do_nothing_action())
+
+    def __getitem__(self, agents_action):
+        action = self.actions.get(agents_action)
+        if action is None:
+            return self.insert(agents_action)
+
+        if self.max_size is not None:
+            self.actions.move_to_end(agents_action)
+
+        return action
+
+    def __len__(self):
+        return len(self.actions)
+
+    def insert(self, agents_action):
+        """
+        Build and cache the environment action of an agent's action.
+
+        :param agents_action: Integer, the index of the line extremity
+                              that will switch to another node.
+        :return: The environment action.
+        """
+
+        assert 0 <= agents_action < self.action_space_size
+
+        if self.max_size is not None and len(self.actions) >= self.max_size:
+            self.actions.popitem(last=False)
+
+        action = self.action_space.array_to_action(self.do_nothing_action_array.copy())
+
+        node_splitting_subaction = np.zeros(len(action.get_node_splitting_subaction()), int)
+        node_splitting_subaction[agents_action] = 1
+        node_splitting_subaction.flags.writeable = False
+        action.set_node_splitting_subaction(node_splitting_subaction)
+
+        self.actions[agents_action] = action
+
+        return action
+
+    def fill(self):
+        """
+        Build all the environment actions the pool can hold.
+
+        :return: void
+        """
+
+        for agents_action in range(min(self.action_space_size, self.max_size or self.action_space_size)):
+            self[agents_action]
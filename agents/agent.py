@@ -1,45 +1,136 @@
-import pypownet.environment
-import pypownet.agent as agent
+import os
+
+import agents.action_mask as action_mask
+import agents.action_pool as action_pool
+import agents.checkpoint as checkpoint
+import agents.encoder as encoder
+import agents.instrumentation as instrumentation
+import agents.lookahead as lookahead
 import agents.model as model
+import agents.network as network
 import agents.policy as policy
+import agents.replay as replay
+import agents.storage as storage
+import agents.tile_coding as tile_coding
 import agents.wrapper as wrapper
+import environments.run_env as run_env
+import environments.surrogate as surrogate
 
 import numpy as np
 
+"""The environments the agents can play in."""
+ENVIRONMENTS = (run_env.RunEnv, surrogate.SurrogateEnvironment)
+
+"""The learning hyperparameters which set_hyperparameters can change."""
+HYPERPARAMETERS = ('alpha', 'gamma', 'epsilon', 'mdp_iteration', 'trace_decay')
 
-class CustomAgent(agent.Agent):
+
+class CustomAgent:
     """
     The template to be used to create an agent.
-    This class overloads the feed_reward function of its mother class.
+    It has the interface of pypownet's Agent, without inheriting from
+    it: pypownet's Agent only accepts its own RunEnv, and pypownet may
+    not be installed when playing in the surrogate environment. Its
+    feed_return replaces the feed_reward of pypownet's Agent.
     """
 
-    def __init__(self, environment):
-        """ Initialize a new agent. """
+    def __init__(self, environment, action_value_dtype='float32', replay_capacity=0, replay_updates=0,
+                 replay_prioritized=False, replay_file_path=None):
+        """ Initialize a new agent, see below the type of the action values and the experience replay settings. """
 
-        super().__init__(environment)
+        assert isinstance(environment, ENVIRONMENTS)
+        self.environment = environment
 
         """List of (state, action, reward) tuples for all states visited during an episode."""
         self.history = list()
         self.last_state = -1
         self.last_action = -1
+        """
+        When set to a list, the observed (state, action, reward,
+        next_state, done) transitions are recorded in it instead of
+        being learned from. Used by rollout workers which leave the
+        learning to another agent.
+        """
+        self.transitions = None
 
         """Learning rate. Used in Monte-Carlo action value learning."""
         self.alpha = 0.1
         """How many iteration to learn the action-value before policy improvement."""
         self.mdp_iteration = 10
+        """Improve the policy after every learning instead of waiting mdp_iteration iterations."""
+        self.improve_after_learning = False
         """Discount factor for total return computing."""
         self.gamma = 0.8
         """The probability to explore a new action instead of exploiting what we now."""
         self.epsilon = 0.1
+        """Decay of the eligibility traces (lambda). Used in TD(lambda) action value learning."""
+        self.trace_decay = 0.8
+
+        """Storage of the action-value function: 'dense', 'sparse' or 'auto'."""
+        self.storage_backend = 'auto'
+        """Memory in bytes the action-value function may use."""
+        self.memory_budget = storage.DEFAULT_MEMORY_BUDGET
+        """Which state a sparse action-value store forgets once the memory budget is reached."""
+        self.eviction = 'lru'
+        """Type of the action values, one of storage.VALUE_DTYPES: 'int16' quantizes them with a scale per state."""
+        assert action_value_dtype in storage.VALUE_DTYPES
+        self.action_value_dtype = action_value_dtype
+
+        """Number of transitions kept for experience replay. 0 disables experience replay."""
+        self.replay_capacity = replay_capacity
+        """Number of transitions replayed after every environment step."""
+        self.replay_updates = replay_updates
+        """Sample the replayed transitions according to their TD error instead of uniformly."""
+        self.replay_prioritized = replay_prioritized
+        """Optional .npy file backing the replay buffer."""
+        self.replay_file_path = replay_file_path
+
+        """Capacity usage thresholds discretizing the lines into the state."""
+        self.usage_thresholds = (1.0,)
 
-        self.state_space_size = np.power(2, environment.observation_space.number_power_lines)
+        self.encoder = encoder.StateEncoder(environment.observation_space.number_power_lines, self.usage_thresholds)
+        self.state_space_size = self.encoder.state_space_size
         self.action_space_size = environment.action_space.prods_switches_subaction_length + \
                                  environment.action_space.loads_switches_subaction_length + \
                                  environment.action_space.lines_or_switches_subaction_length + \
                                  environment.action_space.lines_ex_switches_subaction_length
 
+        """Maximum number of environment actions kept in the action pool."""
+        self.action_pool_size = 1024
+        self.action_pool = action_pool.ActionPool(environment.action_space, self.action_space_size,
+                                                  self.action_pool_size)
+
+        """Legal actions the policy is restricted to, refined from the rejected actions. None to disable."""
+        self.action_mask = action_mask.ActionMask.from_action_space(environment.action_space, self.action_space_size)
+
+        """Number of greedy candidates checked with the environment's simulate before acting. 0 disables it."""
+        self.lookahead_candidates = 0
+        """Time in seconds a step may spend simulating before falling back to the greedy action."""
+        self.lookahead_budget = lookahead.DEFAULT_BUDGET
+        """Maximum number of simulated rewards memoized by the lookahead."""
+        self.lookahead_cache_size = lookahead.DEFAULT_CACHE_SIZE
+
         self.mdp = None
         self.policy = None
+        self.replay_buffer = self.create_replay_buffer()
+        self.lookahead = self.create_lookahead()
+
+        """Timers of the learning phases, shared with the runner. Disabled by default."""
+        self.instrumentation = instrumentation.Instrumentation()
+        """
+        Optional function of a state returning the lock held while
+        learning from a transition in that state, e.g. striped locks
+        when the action values are shared between processes.
+        """
+        self.learning_locks = None
+        """Act greedily without learning nor recording the history, to evaluate the agent. Set by freeze."""
+        self.frozen = False
+        """
+        Datetime of the observation fed to feed_return, set by a runner
+        which already resets the environment in the background. None
+        to read it from the environment.
+        """
+        self.observation_datetime = None
 
     def act(self, observation):
         """
@@ -54,15 +145,254 @@ class CustomAgent(agent.Agent):
 
         observation = self.environment.observation_space.array_to_observation(observation)
 
-        self.last_state = wrapper.observation_to_state(observation)
-        self.last_action = self.policy.get_action(self.last_state)
+        self.last_state = wrapper.observation_to_state(observation, self.encoder)
+        if self.lookahead is None:
+            self.last_action = self.policy.get_action(self.last_state)
+        else:
+            with self.instrumentation.phase('lookahead'):
+                self.last_action = self.lookahead_action(self.last_state)
+
+        return self.action_pool[self.last_action]
+
+    def lookahead_action(self, state):
+        """
+        Explore as the policy does, otherwise play the greedy candidate
+        of highest simulated reward. A state never visited has no
+        action values to rank the candidates: the policy chooses.
+
+        :param state: The encoded current state.
+        :return: The agent's action.
+        """
+
+        if np.random.random_sample() <= self.policy.epsilon:
+            return self.policy.random_actions()
+
+        action_value_fn = self.mdp.get_action_value_function()
+        if storage.is_dense(action_value_fn):
+            action_values = action_value_fn[state]
+        else:
+            action_values = action_value_fn.get(state)
+        if action_values is None:
+            return self.policy.get_action(state)
+
+        return self.lookahead.select(state, action_values, self.action_pool, self.action_mask)
+
+    def observation_to_next_state(self, observation):
+        """
+        :param observation: The observation array following the last
+                            action, None after a game over of
+            pypownet's RunEnv.
+        :return: The encoded state of the observation, or None after a
+                 game over: the episode is over and the next state is
+            worth nothing.
+        """
+
+        if observation is None:
+            return None
+
+        observation = self.environment.observation_space.array_to_observation(observation)
+        return wrapper.observation_to_state(observation, self.encoder)
+
+    @staticmethod
+    def known_next_states(states, next_states):
+        """
+        :param states: The states of some transitions.
+        :param next_states: Their next states, None after a game over.
+        :return: The next states, the state itself standing for the
+                 missing next state of a game over. The transition
+            ends the episode, so its next state is never bootstrapped.
+        """
+
+        return [state if next_state is None else next_state for (state, next_state) in zip(states, next_states)]
+
+    def get_current_datetime(self):
+        """
+        :return: The datetime of the last observation of the
+                 environment.
+        """
+
+        if self.observation_datetime is not None:
+            return self.observation_datetime
+
+        return self.environment.get_current_datetime()
+
+    def set_hyperparameters(self, **hyperparameters):
+        """
+        Change learning hyperparameters of the agent, and of its MDP
+        and policy which got them when the agent was created.
+
+        :param hyperparameters: Values of some of HYPERPARAMETERS.
+        :return: void
+        """
 
-        do_nothing_action_array = self.environment.action_space.get_do_nothing_action()
-        do_nothing_action = self.environment.action_space.array_to_action(do_nothing_action_array)
+        for (name, value) in hyperparameters.items():
+            if name not in HYPERPARAMETERS:
+                raise ValueError('Unknown hyperparameter {}, expected one of {}.'.format(name, HYPERPARAMETERS))
+            setattr(self, name, value)
 
-        split_substation_action = wrapper.agents_action_to_envs_action(do_nothing_action, self.last_action)
+        if self.mdp is not None:
+            self.mdp.alpha = self.alpha
+            self.mdp.gamma = self.gamma
+            self.mdp.maturity_threshold = self.mdp_iteration
+            if hasattr(self.mdp, 'trace_decay'):
+                self.mdp.trace_decay = self.trace_decay
 
-        return split_substation_action
+        if self.policy is not None:
+            self.policy.epsilon = self.epsilon
+
+    def freeze(self):
+        """
+        Freeze the agent to evaluate it: it acts greedily, epsilon is
+        0, and the runner no longer feeds it the returns nor the
+        rejected actions, so that nothing is learned or recorded.
+
+        :return: void
+        """
+
+        self.frozen = True
+        self.epsilon = 0.0
+        if self.policy is not None:
+            self.policy.epsilon = 0.0
+
+    def create_action_value_store(self):
+        """
+        Create the storage of the action-value function according to
+        the storage backend, the memory budget and the eviction policy
+        of the agent.
+
+        :return: A dense array or a sparse store of action values.
+        """
+
+        return storage.create_action_value_store(self.state_space_size, self.action_space_size,
+                                                 self.storage_backend, self.memory_budget, self.eviction,
+                                                 self.action_value_dtype)
+
+    def create_replay_buffer(self):
+        """
+        Create the experience replay buffer according to the replay
+        capacity of the agent.
+
+        :return: A ReplayBuffer or None if experience replay is
+                 disabled.
+        """
+
+        if self.replay_capacity <= 0:
+            return None
+
+        assert type(self).learn_batch is not CustomAgent.learn_batch, \
+            'Experience replay needs an agent learning in batches, e.g. Sarsa or QLearning.'
+        assert not self.encoder.wide, 'Experience replay needs integer states.'
+
+        return replay.ReplayBuffer(self.replay_capacity, np.int64, self.replay_file_path, self.replay_prioritized)
+
+    def create_lookahead(self):
+        """
+        Create the lookahead of the greedy action according to the
+        lookahead settings of the agent.
+
+        :return: A Lookahead or None if the lookahead is disabled.
+        """
+
+        if self.lookahead_candidates <= 0:
+            return None
+
+        return lookahead.Lookahead(self.environment, self.lookahead_candidates, self.lookahead_budget,
+                                   self.lookahead_cache_size)
+
+    def checkpoint_metadata(self):
+        """
+        :return: The description of the agent saved with its
+                 checkpoints, checked when they are restored.
+        """
+
+        return {'agent': type(self).__name__,
+                'alpha': self.alpha,
+                'gamma': self.gamma,
+                'epsilon': self.epsilon,
+                'iteration_count': self.mdp.iteration_count,
+                'state_space_size': str(self.state_space_size),
+                'action_space_size': self.action_space_size,
+                'number_power_lines': self.encoder.number_power_lines,
+                'usage_thresholds': self.encoder.thresholds.tolist()}
+
+    def save_checkpoint(self, checkpoint_dir, **metadata):
+        """
+        Save the action value function and the policy in a new
+        checkpoint of the checkpoint directory.
+
+        :param checkpoint_dir: The checkpoint directory.
+        :param metadata: Additional metadata, e.g. the grid and episode.
+        :return: The path of the new checkpoint.
+        """
+
+        return checkpoint.save(checkpoint_dir, self.mdp.get_action_value_function(), self.policy.policy,
+                               dict(self.checkpoint_metadata(), **metadata))
+
+    def restore_checkpoint(self, checkpoint_dir):
+        """
+        Resume from the last checkpoint of the checkpoint directory, or
+        warm start from the checkpoint of another agent learning the
+        same state and action spaces. The action values and the policy
+        are memory-mapped, so restoring is immediate whatever their
+        size, unless the action values are converted to the
+        action_value_dtype of the agent.
+
+        :param checkpoint_dir: The checkpoint directory.
+        :return: The metadata of the checkpoint.
+        """
+
+        (action_values, policy_actions, metadata) = checkpoint.load(checkpoint_dir)
+
+        expected = self.checkpoint_metadata()
+        for key in ('state_space_size', 'action_space_size', 'number_power_lines', 'usage_thresholds'):
+            if metadata.get(key) != expected[key]:
+                raise ValueError('The checkpoint {} is {} but the agent {}.'.format(key, metadata.get(key),
+                                                                                    expected[key]))
+
+        if metadata['action_value_fn'] == 'dense' and self.action_value_dtype != 'int16':
+            action_value_fn = action_values
+            if action_value_fn.dtype != self.action_value_dtype:
+                action_value_fn = action_value_fn.astype(self.action_value_dtype)
+        elif metadata['action_value_fn'] == 'dense':
+            action_value_fn = storage.QuantizedActionValueStore(self.state_space_size, self.action_space_size)
+            states = np.flatnonzero(np.any(action_values != 0, axis=1))
+            action_value_fn.assign(np.repeat(states, self.action_space_size),
+                                   np.tile(np.arange(self.action_space_size), len(states)),
+                                   action_values[states].ravel())
+        else:
+            action_value_fn = self.create_action_value_store()
+            if storage.is_dense(action_value_fn):
+                action_value_fn = storage.SparseActionValueStore(self.action_space_size)
+            (states, rows) = action_values
+            for (state, row) in zip(states, rows):
+                action_value_fn[state] = row
+
+        self.mdp.action_value_fn = action_value_fn
+        self.mdp.iteration_count = metadata['iteration_count']
+        self.policy.policy = policy_actions
+        self.policy.sparse = isinstance(policy_actions, dict)
+
+        return metadata
+
+    def policy_parameters(self):
+        """
+        :return: What the agent acts from, sent by a learner to the
+                 agents of its rollout workers: the policy array, or
+                 dict for a sparse policy.
+        """
+
+        return self.policy.policy
+
+    def set_policy_parameters(self, parameters):
+        """
+        Act from the policy parameters of another agent.
+
+        :param parameters: The result of its policy_parameters.
+        :return: void
+        """
+
+        self.policy.policy = parameters
+        self.policy.sparse = isinstance(parameters, dict)
 
     def learn(self):
         """
@@ -74,20 +404,56 @@ class CustomAgent(agent.Agent):
         self.mdp.learn(self.history)
         self.history.clear()
 
-        if self.mdp.is_mature():
-            self.policy.improve(self.mdp.get_action_value_function())
+        self.improve_policy()
+
+    def improve_policy(self):
+        """
+        Improve the policy on the states learned since the last
+        improvement once the MDP is mature, or after every learning if
+        improve_after_learning is set.
+
+        :return: void
+        """
+
+        if self.mdp.is_mature() or self.improve_after_learning:
+            with self.instrumentation.phase('improve'):
+                self.policy.improve(self.mdp.get_action_value_function(), self.mdp.pop_touched_states())
+
+    def observe_action_outcome(self, rejected):
+        """
+        Tell the action mask whether the environment rejected the last
+        action.
+
+        :param rejected: True if the action was illegal or lead to an
+                         immediate game over.
+        :return: void
+        """
+
+        if self.action_mask is not None:
+            self.action_mask.observe(self.last_action, rejected)
+
+    def legal_actions(self):
+        """
+        :return: The actions of the action mask, or all of them.
+        """
+
+        if self.action_mask is None:
+            return np.arange(self.action_space_size)
+
+        return self.action_mask.legal_actions
 
     def feed_return(self, action, consequent_observation, rewards_as_list, done):
         """
-        This function has the same purpose as the feed_reward from
-        super class. The reason of this adding is to inform the agent
+        This function has the same purpose as the feed_reward of
+        pypownet's Agent. The reason of this adding is to inform the agent
         about the end of an episode.
         Override this method in order to learn from the reward obtained
         from the environment after the application of the last action.
 
         :param action: The applied action.
         :param consequent_observation: Observation after the
-                 application of the action.
+                 application of the action, None after a game over
+                 of pypownet's RunEnv.
         :param rewards_as_list: A list of rewards for the last step.
         :param done: True if is the end of en episode. False otherwise.
         :return: void
@@ -95,6 +461,92 @@ class CustomAgent(agent.Agent):
 
         pass
 
+    def observe_transition(self, state, action, reward, next_state, done):
+        """
+        Record the transition if the agent collects transitions,
+        otherwise learn from it.
+
+        :param state: The state in which the action was applied.
+        :param action: The applied action.
+        :param reward: The obtained reward.
+        :param next_state: The state after the application of the
+                           action.
+        :param done: True if is the end of en episode. False otherwise.
+        :return: void
+        """
+
+        if self.transitions is not None:
+            self.transitions.append((state, action, reward, next_state, done))
+            return
+
+        with self.instrumentation.phase('learn'):
+            if self.learning_locks is None:
+                self.learn_transition(state, action, reward, next_state, done)
+            else:
+                with self.learning_locks(state):
+                    self.learn_transition(state, action, reward, next_state, done)
+
+    def learn_transition(self, state, action, reward, next_state, done):
+        """
+        Override this method in order to learn from one transition.
+
+        :param state: The state in which the action was applied.
+        :param action: The applied action.
+        :param reward: The obtained reward.
+        :param next_state: The state after the application of the
+                           action.
+        :param done: True if is the end of en episode. False otherwise.
+        :return: void
+        """
+
+        pass
+
+    def learn_transitions(self, transitions):
+        """
+        Learn from transitions collected by another agent, in their
+        order.
+
+        :param transitions: A list of (state, action, reward,
+                            next_state, done) tuples.
+        :return: void
+        """
+
+        for (state, action, reward, next_state, done) in transitions:
+            self.learn_transition(state, action, reward, next_state, done)
+
+    def learn_batch(self, states, actions, rewards, next_states, dones, weights=None):
+        """
+        Override this method in order to learn from transitions given as
+        parallel arrays in one pass. Needed by experience replay, which
+        gives the importance sampling weights of the TD errors.
+
+        :return: The TD errors of the transitions.
+        """
+
+        raise NotImplementedError
+
+    def replay(self, state, action, reward, next_state, done):
+        """
+        Store the transition in the replay buffer, then learn from
+        replay_updates transitions sampled from it.
+
+        :return: void
+        """
+
+        if self.replay_buffer is None:
+            return
+
+        self.replay_buffer.add(state, action, reward, state if next_state is None else next_state, done)
+        if self.replay_updates <= 0:
+            return
+
+        (indices, transitions, weights) = self.replay_buffer.sample(self.replay_updates)
+        td_errors = self.learn_batch(transitions['state'], transitions['action'], transitions['reward'],
+                                     transitions['next_state'], transitions['done'], weights)
+        self.replay_buffer.update_priorities(indices, td_errors)
+
+        self.improve_policy()
+
 
 class PolicyIteration(CustomAgent):
     """
@@ -108,15 +560,17 @@ class PolicyIteration(CustomAgent):
              better than the old one.
     """
 
-    def __init__(self, environment):
-        assert isinstance(environment, pypownet.environment.RunEnv)
-        super().__init__(environment)
+    def __init__(self, environment, **kwargs):
+        assert isinstance(environment, ENVIRONMENTS)
+        super().__init__(environment, **kwargs)
 
         """For this test use MonteCarlo to learn the action-value function."""
         self.mdp = model.MonteCarlo(self.state_space_size, self.action_space_size, self.alpha, self.mdp_iteration,
-                                    self.gamma)
+                                    self.gamma, self.create_action_value_store())
         """For this test use EpsilonGreedy for policy improvement."""
-        self.policy = policy.EpsilonGreedy(self.state_space_size, self.action_space_size, self.epsilon)
+        self.policy = policy.EpsilonGreedy(self.state_space_size, self.action_space_size, self.epsilon,
+                                           storage.is_sparse(self.mdp.get_action_value_function()),
+                                           self.action_mask)
 
     def log_history(self, state, action, reward):
         """
@@ -143,26 +597,51 @@ class PolicyIteration(CustomAgent):
         :return:
         """
 
-        self.log_history(self.last_state, self.last_action, sum(rewards_list) + 5)
+        self.observe_transition(self.last_state, self.last_action, sum(rewards_list) + 5, None, done)
+
+    def learn_transition(self, state, action, reward, next_state, done):
+        """
+        Log the transition and learn from the episode once terminated.
+        """
+
+        self.log_history(state, action, reward)
 
         if done:
             self.learn()
 
+    def learn_transitions(self, transitions):
+        """
+        Learn from all the episodes of the transitions in one batch.
+        The transitions must be made of whole episodes, the last one
+        may have been cut before its end.
+        """
+
+        histories = [[]]
+        for (state, action, reward, _, done) in transitions:
+            histories[-1].insert(0, (state, action, reward))
+            if done:
+                histories.append([])
+
+        self.mdp.learn_episodes(histories)
+        self.improve_policy()
+
 
 class Sarsa(CustomAgent):
     """
     Implement an agent using SARSA algorithm.
     """
 
-    def __init__(self, environment):
-        assert isinstance(environment, pypownet.environment.RunEnv)
-        super().__init__(environment)
+    def __init__(self, environment, **kwargs):
+        assert isinstance(environment, ENVIRONMENTS)
+        super().__init__(environment, **kwargs)
 
         """For this test use TD(0) to learn the action-value function."""
         self.mdp = model.TemporalDifference(self.state_space_size, self.action_space_size, self.alpha,
-                                            self.mdp_iteration, self.gamma)
+                                            self.mdp_iteration, self.gamma, self.create_action_value_store())
         """For this test use EpsilonGreedy for policy improvement."""
-        self.policy = policy.EpsilonGreedy(self.state_space_size, self.action_space_size, self.epsilon)
+        self.policy = policy.EpsilonGreedy(self.state_space_size, self.action_space_size, self.epsilon,
+                                           storage.is_sparse(self.mdp.get_action_value_function()),
+                                           self.action_mask)
 
     def feed_return(self, action, consequent_observation, rewards_as_list, done):
         """
@@ -175,22 +654,49 @@ class Sarsa(CustomAgent):
         :return:
         """
 
-        consequent_observation = self.environment.observation_space.array_to_observation(consequent_observation)
+        state_t1 = self.observation_to_next_state(consequent_observation)
+
+        self.observe_transition(self.last_state, self.last_action, sum(rewards_as_list) + 5, state_t1, done)
+
+    def learn_transition(self, state, action, reward, next_state, done):
+        """
+        Learn from the transition following the policy in the next
+        state, which is worth nothing after a game over.
+        """
 
         # The history follows the format (St, At, Rt1, St1, At1, Rt2, ...)
-        state_t1 = wrapper.observation_to_state(consequent_observation)
-        action_t1 = self.policy.get_action(state_t1)
+        state_t1 = next_state
+        action_t1 = None if state_t1 is None else self.policy.get_action(state_t1)
         reward_t2 = 0
 
         self.history.append((state_t1, action_t1, reward_t2))
+        self.history.append((state, action, reward))
+
+        self.learn()
+        self.replay(state, action, reward, next_state, done)
 
-        state_t = self.last_state
-        action_t = self.last_action
-        reward_t1 = sum(rewards_as_list) + 5
+    def learn_transitions(self, transitions):
+        """
+        Learn from all the transitions in one TD(0) batch.
+        """
 
-        self.history.append((state_t, action_t, reward_t1))
+        if not transitions:
+            return
 
-        self.learn()
+        (states, actions, rewards, next_states, dones) = zip(*transitions)
+        self.learn_batch(states, actions, rewards, self.known_next_states(states, next_states), dones)
+        self.improve_policy()
+
+    def learn_batch(self, states, actions, rewards, next_states, dones, weights=None):
+        """
+        Learn from the transitions in one TD(0) batch, following the
+        policy in the next states. The next state of a transition
+        ending the episode is worth nothing.
+        """
+
+        next_actions = self.policy.get_actions(next_states)
+
+        return self.mdp.learn_batch(states, actions, rewards, next_states, next_actions, dones, weights)
 
 
 class QLearning(CustomAgent):
@@ -201,15 +707,17 @@ class QLearning(CustomAgent):
     deterministically selects the action of highest value.
     """
 
-    def __init__(self, environment):
-        assert isinstance(environment, pypownet.environment.RunEnv)
-        super().__init__(environment)
+    def __init__(self, environment, **kwargs):
+        assert isinstance(environment, ENVIRONMENTS)
+        super().__init__(environment, **kwargs)
 
         """For this test use TD(0) to learn the action-value function."""
         self.mdp = model.TemporalDifference(self.state_space_size, self.action_space_size, self.alpha,
-                                            self.mdp_iteration, self.gamma)
+                                            self.mdp_iteration, self.gamma, self.create_action_value_store())
         """For this test use EpsilonGreedy for policy improvement."""
-        self.policy = policy.EpsilonGreedy(self.state_space_size, self.action_space_size, self.epsilon)
+        self.policy = policy.EpsilonGreedy(self.state_space_size, self.action_space_size, self.epsilon,
+                                           storage.is_sparse(self.mdp.get_action_value_function()),
+                                           self.action_mask)
 
     def feed_return(self, action, consequent_observation, rewards_as_list, done):
         """
@@ -228,24 +736,647 @@ class QLearning(CustomAgent):
         :return: void
         """
 
-        consequent_observation = self.environment.observation_space.array_to_observation(consequent_observation)
+        state_t1 = self.observation_to_next_state(consequent_observation)
+
+        self.observe_transition(self.last_state, self.last_action, sum(rewards_as_list) + 5, state_t1, done)
+
+    def learn_transition(self, state, action, reward, next_state, done):
+        """
+        Learn from the transition following the greedy action in the
+        next state.
+        """
 
         # The history follows the format (St, At, Rt1, St1, At1, Rt2, ...)
         # Find out max Q(St1, At1)
-        state_t1 = wrapper.observation_to_state(consequent_observation)
-        action_t1 = np.argmax(self.mdp.get_action_value_function()[state_t1])
+        state_t1 = next_state
+        action_t1 = None if state_t1 is None else np.argmax(self.mdp.get_action_value_function()[state_t1])
         reward_t2 = 0
 
         self.history.append((state_t1, action_t1, reward_t2))
+        self.history.append((state, action, reward))
 
-        state_t = self.last_state
-        action_t = self.last_action
-        reward_t1 = sum(rewards_as_list) + 5
+        # If we are in terminal state set action-state values to zero
+        if done and state_t1 is not None:
+            self.mdp.reset_action_values(state_t1)
 
-        self.history.append((state_t, action_t, reward_t1))
+        self.learn()
+        self.replay(state, action, reward, next_state, done)
+
+    def learn_transitions(self, transitions):
+        """
+        Learn from all the transitions in one Q-learning batch.
+        """
+
+        if not transitions:
+            return
+
+        (states, actions, rewards, next_states, dones) = zip(*transitions)
 
         # If we are in terminal state set action-state values to zero
+        for (state_t1, done) in zip(next_states, dones):
+            if done and state_t1 is not None:
+                self.mdp.reset_action_values(state_t1)
+        next_states = self.known_next_states(states, next_states)
+
+        self.learn_batch(states, actions, rewards, next_states, dones)
+        self.improve_policy()
+
+    def learn_batch(self, states, actions, rewards, next_states, dones, weights=None):
+        """
+        Learn from the transitions in one Q-learning batch, the next
+        state of a terminal transition being worth nothing.
+        """
+
+        return self.mdp.learn_batch(states, actions, rewards, next_states, dones=dones, weights=weights)
+
+
+class SarsaLambda(CustomAgent):
+    """
+    Implement an agent using Sarsa(lambda) algorithm, i.e. SARSA with
+    eligibility traces which propagate each TD error to the recently
+    visited state, action pairs.
+    """
+
+    def __init__(self, environment, **kwargs):
+        assert isinstance(environment, ENVIRONMENTS)
+        super().__init__(environment, **kwargs)
+
+        """For this test use TD(lambda) to learn the action-value function."""
+        self.mdp = model.TemporalDifferenceLambda(self.state_space_size, self.action_space_size, self.alpha,
+                                                  self.mdp_iteration, self.gamma, self.trace_decay,
+                                                  self.create_action_value_store())
+        """For this test use EpsilonGreedy for policy improvement."""
+        self.policy = policy.EpsilonGreedy(self.state_space_size, self.action_space_size, self.epsilon,
+                                           storage.is_sparse(self.mdp.get_action_value_function()),
+                                           self.action_mask)
+
+    def feed_return(self, action, consequent_observation, rewards_as_list, done):
+        """
+        Process the obtained reward for the last applied action.
+
+        :param action:
+        :param consequent_observation:
+        :param rewards_as_list:
+        :param done:
+        :return:
+        """
+
+        state_t1 = self.observation_to_next_state(consequent_observation)
+
+        self.observe_transition(self.last_state, self.last_action, sum(rewards_as_list) + 5, state_t1, done)
+
+    def learn_transition(self, state, action, reward, next_state, done):
+        """
+        Learn from the transition following the policy in the next
+        state, which is worth nothing after a game over. The traces do
+        not outlive the episode.
+        """
+
+        # The history follows the format (St, At, Rt1, St1, At1, Rt2, ...)
+        state_t1 = next_state
+        action_t1 = None if state_t1 is None else self.policy.get_action(state_t1)
+        reward_t2 = 0
+
+        self.history.append((state_t1, action_t1, reward_t2))
+        self.history.append((state, action, reward))
+
+        self.learn()
+
         if done:
-            (self.mdp.get_action_value_function()[state_t1]).fill(0)
+            self.mdp.reset_traces()
+
+
+class WatkinsQLambda(CustomAgent):
+    """
+    Implement an agent using Watkins's Q(lambda) algorithm: Q-learning
+    with eligibility traces, which are cut whenever an exploratory
+    action is taken since the following rewards do not come from the
+    greedy policy anymore.
+    """
+
+    def __init__(self, environment, **kwargs):
+        assert isinstance(environment, ENVIRONMENTS)
+        super().__init__(environment, **kwargs)
+
+        """For this test use TD(lambda) to learn the action-value function."""
+        self.mdp = model.TemporalDifferenceLambda(self.state_space_size, self.action_space_size, self.alpha,
+                                                  self.mdp_iteration, self.gamma, self.trace_decay,
+                                                  self.create_action_value_store())
+        """For this test use EpsilonGreedy for policy improvement."""
+        self.policy = policy.EpsilonGreedy(self.state_space_size, self.action_space_size, self.epsilon,
+                                           storage.is_sparse(self.mdp.get_action_value_function()),
+                                           self.action_mask)
+
+    def feed_return(self, action, consequent_observation, rewards_as_list, done):
+        """
+        Process the obtained reward for the last applied action.
+
+        :param action:
+        :param consequent_observation:
+        :param rewards_as_list:
+        :param done:
+        :return:
+        """
+
+        state_t1 = self.observation_to_next_state(consequent_observation)
+
+        self.observe_transition(self.last_state, self.last_action, sum(rewards_as_list) + 5, state_t1, done)
+
+    def learn_transition(self, state, action, reward, next_state, done):
+        """
+        Learn from the transition following the greedy action in the
+        next state.
+        """
+
+        action_value_fn = self.mdp.get_action_value_function()
+
+        # An exploratory action, worse than the greedy one, ends the traces of the previous pairs.
+        action_values = action_value_fn[state]
+        if action_values[action] < np.max(action_values):
+            self.mdp.reset_traces()
+
+        # The history follows the format (St, At, Rt1, St1, At1, Rt2, ...)
+        # Find out max Q(St1, At1)
+        state_t1 = next_state
+        action_t1 = None if state_t1 is None else np.argmax(action_value_fn[state_t1])
+        reward_t2 = 0
+
+        self.history.append((state_t1, action_t1, reward_t2))
+        self.history.append((state, action, reward))
 
         self.learn()
+
+        if done:
+            self.mdp.reset_traces()
+
+
+class TileCodingQLearning(CustomAgent):
+    """
+    Implement an agent using Q-learning on a tile coding of the
+    observations instead of a table over the discretized states: the
+    lines capacity usage, lines status, topology and time of day are
+    hashed by overlapping tilings into a fixed number of buckets, and
+    the action values are linear in the active buckets.
+
+    The memory of the action values is tile_coding_memory bytes
+    whatever the size of the grid, and a step costs O(number of lines).
+    """
+
+    def __init__(self, environment, tile_coding_memory=tile_coding.DEFAULT_MEMORY_BUDGET, number_tilings=8,
+                 lines_per_tiling=None, **kwargs):
+        assert isinstance(environment, ENVIRONMENTS)
+        super().__init__(environment, **kwargs)
+
+        """Memory in bytes of the weights of the action values."""
+        self.tile_coding_memory = tile_coding_memory
+        """Number of overlapping tilings of the capacity usage."""
+        self.number_tilings = number_tilings
+
+        number_buckets = max(1, self.tile_coding_memory // (8 * self.action_space_size))
+        self.tile_coder = tile_coding.TileCoder(environment.observation_space.number_power_lines, number_buckets,
+                                                self.number_tilings, lines_per_tiling)
+        self.action_values = tile_coding.LinearActionValues(number_buckets, self.action_space_size, self.alpha,
+                                                            self.gamma)
+
+    def set_hyperparameters(self, **hyperparameters):
+        """
+        Change learning hyperparameters, see CustomAgent.
+        """
+
+        super().set_hyperparameters(**hyperparameters)
+        self.action_values.alpha = self.alpha
+        self.action_values.gamma = self.gamma
+
+    def observation_to_tiles(self, observation):
+        """
+        :param observation: The observation array.
+        :return: The active buckets of the observation.
+        """
+
+        observation = self.environment.observation_space.array_to_observation(observation)
+        features = wrapper.observation_to_features(observation)
+        number_power_lines = self.tile_coder.number_power_lines
+        current_datetime = self.get_current_datetime()
+        minutes = 0 if current_datetime is None else current_datetime.hour * 60 + current_datetime.minute
+
+        return self.tile_coder.features(features[:number_power_lines],
+                                        features[number_power_lines:2 * number_power_lines],
+                                        features[2 * number_power_lines:], minutes)
+
+    def act(self, observation):
+        """
+        Given the observation return an action to apply.
+
+        :param observation: The environment observations.
+        :return: Action to apply to the environment.
+        """
+
+        self.last_state = self.observation_to_tiles(observation)
+
+        legal_actions = self.legal_actions()
+        if np.random.random_sample() <= self.epsilon:
+            self.last_action = int(legal_actions[np.random.randint(len(legal_actions))])
+        else:
+            action_values = self.action_values.action_values(self.last_state)
+            self.last_action = int(legal_actions[np.argmax(action_values[legal_actions])])
+
+        return self.action_pool[self.last_action]
+
+    def feed_return(self, action, consequent_observation, rewards_as_list, done):
+        """
+        Process the obtained reward for the last applied action.
+
+        :param action:
+        :param consequent_observation:
+        :param rewards_as_list:
+        :param done:
+        :return:
+        """
+
+        tiles_t1 = None if consequent_observation is None else self.observation_to_tiles(consequent_observation)
+
+        self.observe_transition(self.last_state, self.last_action, sum(rewards_as_list) + 5, tiles_t1, done)
+
+    def learn_transition(self, state, action, reward, next_state, done):
+        """
+        Learn from the transition following the greedy action in the
+        next state, which is worth nothing if terminal.
+        """
+
+        next_value = None
+        if not done:
+            next_value = np.max(self.action_values.action_values(next_state)[self.legal_actions()])
+
+        self.action_values.learn(state, action, reward, next_value)
+
+    def policy_parameters(self):
+        """
+        :return: The weights of the action values.
+        """
+
+        return self.action_values.weights
+
+    def set_policy_parameters(self, parameters):
+        """
+        Play with the weights of the action values of another agent.
+        """
+
+        self.action_values.weights = parameters
+
+    def checkpoint_metadata(self):
+        """
+        :return: The description of the tile coding saved with the
+                 checkpoints, checked when they are restored.
+        """
+
+        return {'agent': type(self).__name__,
+                'alpha': self.alpha,
+                'gamma': self.gamma,
+                'epsilon': self.epsilon,
+                'number_power_lines': self.tile_coder.number_power_lines,
+                'number_buckets': self.tile_coder.number_buckets,
+                'number_tilings': self.tile_coder.number_tilings,
+                'lines_per_tiling': self.tile_coder.lines_per_tiling,
+                'action_space_size': self.action_space_size}
+
+    def save_checkpoint(self, checkpoint_dir, **metadata):
+        """
+        Save the weights of the action values in a new checkpoint of
+        the checkpoint directory.
+
+        :return: The path of the new checkpoint.
+        """
+
+        def write_files(directory):
+            checkpoint.write_array(os.path.join(directory, 'tile_coding_weights.npy'), self.action_values.weights)
+
+        return checkpoint.save_files(checkpoint_dir, write_files, dict(self.checkpoint_metadata(), **metadata))
+
+    def restore_checkpoint(self, checkpoint_dir):
+        """
+        Resume from the weights of the last checkpoint of the checkpoint
+        directory. They are read in memory, since they are updated at
+        every step.
+
+        :return: The metadata of the checkpoint.
+        """
+
+        (checkpoint_path, metadata) = checkpoint.load_metadata(checkpoint_dir)
+
+        expected = self.checkpoint_metadata()
+        for key in ('number_power_lines', 'number_buckets', 'number_tilings', 'lines_per_tiling', 'action_space_size'):
+            if metadata.get(key) != expected[key]:
+                raise ValueError('The checkpoint {} is {} but the agent {}.'.format(key, metadata.get(key),
+                                                                                    expected[key]))
+
+        self.action_values.weights = np.load(os.path.join(checkpoint_path, 'tile_coding_weights.npy'))
+
+        return metadata
+
+
+class DQN(CustomAgent):
+    """
+    Implement an agent using Deep Q-Network: Q-learning where the
+    action-value function is a neural network of the raw observation
+    features (lines capacity usage, lines status and topology) instead
+    of a table over the discretized states. The network learns from
+    minibatches sampled from an experience replay buffer, its targets
+    being computed by a target network updated periodically.
+
+    The memory is fixed whatever the size of the grid: the network and
+    the replay buffer of replay_capacity transitions.
+    """
+
+    def __init__(self, environment, replay_capacity=50000, **kwargs):
+        assert isinstance(environment, ENVIRONMENTS)
+        assert replay_capacity > 0, 'DQN learns from its experience replay buffer, replay_capacity must be positive.'
+        super().__init__(environment, **kwargs)
+
+        """Number of units of the hidden layers."""
+        self.hidden_sizes = (128, 128)
+        """Learning rate of the Adam optimizer."""
+        self.learning_rate = 1e-3
+        """Number of transitions of a training minibatch."""
+        self.batch_size = 32
+        """Number of environment steps between two training steps."""
+        self.train_interval = 1
+        """Number of stored transitions before the first training step."""
+        self.learning_starts = 1000
+        """Number of training steps between two updates of the target network."""
+        self.target_update_interval = 500
+
+        # The replay buffer of the features is built once their size is known.
+        self.replay_capacity = replay_capacity
+        self.features_size = 2 * environment.observation_space.number_power_lines + self.action_space_size
+        self.replay_buffer = self.create_replay_buffer()
+
+        self.q_network = network.Network.random([self.features_size] + list(self.hidden_sizes) +
+                                                [self.action_space_size], 'relu')
+        self.target_network = self.q_network.copy()
+        self.optimizer = network.Adam(self.q_network, self.learning_rate)
+        self.steps = 0
+        self.training_steps = 0
+
+    def create_replay_buffer(self):
+        """
+        Create the experience replay buffer of the observation
+        features.
+        """
+
+        if self.replay_capacity <= 0:
+            return None
+
+        return replay.ReplayBuffer(self.replay_capacity, (np.float32, (self.features_size,)), self.replay_file_path,
+                                   self.replay_prioritized)
+
+    def act(self, observation):
+        """
+        Given the observation return an action to apply.
+
+        :param observation: The environment observations.
+        :return: Action to apply to the environment.
+        """
+
+        observation = self.environment.observation_space.array_to_observation(observation)
+        self.last_state = wrapper.observation_to_features(observation)
+
+        if np.random.random_sample() <= self.epsilon:
+            self.last_action = int(self.legal_actions()[np.random.randint(len(self.legal_actions()))])
+        else:
+            action_values = self.q_network.logits(self.last_state)
+            self.last_action = int(self.legal_actions()[np.argmax(action_values[self.legal_actions()])])
+
+        return self.action_pool[self.last_action]
+
+    def feed_return(self, action, consequent_observation, rewards_as_list, done):
+        """
+        Process the obtained reward for the last applied action.
+
+        :param action:
+        :param consequent_observation:
+        :param rewards_as_list:
+        :param done:
+        :return:
+        """
+
+        features_t1 = None
+        if consequent_observation is not None:
+            consequent_observation = self.environment.observation_space.array_to_observation(consequent_observation)
+            features_t1 = wrapper.observation_to_features(consequent_observation)
+
+        self.observe_transition(self.last_state, self.last_action, sum(rewards_as_list) + 5, features_t1, done)
+
+    def learn_transition(self, state, action, reward, next_state, done):
+        """
+        Store the transition, then train on a minibatch every
+        train_interval steps once learning_starts transitions are
+        stored. The features of the state stand for the missing next
+        features of a game over, which are never bootstrapped.
+        """
+
+        self.replay_buffer.add(state, action, reward, state if next_state is None else next_state, done)
+        self.steps += 1
+
+        if len(self.replay_buffer) < self.learning_starts or self.steps % self.train_interval != 0:
+            return
+
+        (indices, transitions, weights) = self.replay_buffer.sample(self.batch_size)
+        td_errors = self.learn_batch(transitions['state'], transitions['action'], transitions['reward'],
+                                     transitions['next_state'], transitions['done'], weights)
+        self.replay_buffer.update_priorities(indices, td_errors)
+
+    def learn_batch(self, states, actions, rewards, next_states, dones, weights=None):
+        """
+        One training step of the Q-network on a minibatch, with the
+        Huber loss of the TD errors, weighted by the optional importance
+        sampling weights. The target network is updated every
+        target_update_interval training steps.
+
+        :return: The TD errors of the transitions.
+        """
+
+        states = np.asarray(states, np.float32)
+        actions = np.asarray(actions, np.int64)
+        rows = np.arange(len(actions))
+
+        next_action_values = self.target_network.logits(np.asarray(next_states, np.float32))
+        next_values = np.max(next_action_values[:, self.legal_actions()], axis=1)
+        targets = np.asarray(rewards) + self.gamma * next_values * ~np.asarray(dones, bool)
+
+        (action_values, layer_inputs) = self.q_network.forward(states)
+        td_errors = action_values[rows, actions] - targets
+
+        output_gradients = np.zeros_like(action_values)
+        output_gradients[rows, actions] = np.clip(td_errors, -1.0, 1.0) / len(actions)
+        if weights is not None:
+            output_gradients[rows, actions] *= weights
+        self.optimizer.step(*self.q_network.backward(layer_inputs, output_gradients))
+
+        self.training_steps += 1
+        if self.training_steps % self.target_update_interval == 0:
+            self.target_network.assign(self.q_network)
+
+        return td_errors
+
+    def policy_parameters(self):
+        """
+        :return: The weights and biases of the Q-network.
+        """
+
+        return self.q_network.weights, self.q_network.biases
+
+    def set_policy_parameters(self, parameters):
+        """
+        Play with the weights and biases of another Q-network.
+        """
+
+        (weights, biases) = parameters
+        self.q_network.assign(network.Network(weights, biases, self.q_network.activation_name))
+
+    def save_checkpoint(self, checkpoint_dir, **metadata):
+        """
+        Save the Q-network in a new checkpoint of the checkpoint
+        directory. The network is exported as q_network.npz, which
+        agent.ExportedPolicy can play.
+
+        :return: The path of the new checkpoint.
+        """
+
+        metadata = dict(metadata, agent=type(self).__name__, gamma=self.gamma, training_steps=self.training_steps)
+
+        def write_files(directory):
+            self.q_network.save(os.path.join(directory, 'q_network.npz'), metadata)
+
+        return checkpoint.save_files(checkpoint_dir, write_files, metadata)
+
+    def restore_checkpoint(self, checkpoint_dir):
+        """
+        Resume from the Q-network of the last checkpoint of the
+        checkpoint directory.
+
+        :return: The metadata of the checkpoint.
+        """
+
+        (checkpoint_path, metadata) = checkpoint.load_metadata(checkpoint_dir)
+        exported = network.load(os.path.join(checkpoint_path, 'q_network.npz'))
+        if [kernel.shape for kernel in exported.weights] != [kernel.shape for kernel in self.q_network.weights]:
+            raise ValueError('The checkpoint network has layers {} but the agent {}.'.format(
+                [kernel.shape for kernel in exported.weights], [kernel.shape for kernel in self.q_network.weights]))
+
+        self.q_network.assign(exported)
+        self.target_network.assign(exported)
+        self.training_steps = metadata.get('training_steps', 0)
+
+        return metadata
+
+
+class ExportedPolicy(CustomAgent):
+    """
+    Play a policy network trained by agents/PolicyGradient.py and
+    exported with its export_path, with a NumPy forward pass: neither
+    TensorFlow nor a session is needed. The observation arrays are the
+    inputs of the network and its outputs the logits of the agent's
+    actions. The agent does not learn.
+    """
+
+    def __init__(self, environment, **kwargs):
+        assert isinstance(environment, ENVIRONMENTS)
+        super().__init__(environment, **kwargs)
+
+        """The exported network, loaded from network_file_path when first needed."""
+        self.network_file_path = 'policy.npz'
+        self.network = None
+        """Sample the actions from the softmax of the logits instead of playing the greedy ones."""
+        self.sample_actions = False
+
+    def load_network(self, file_path=None):
+        """
+        Load an exported policy network.
+
+        :param file_path: The .npz export, by default network_file_path.
+        :return: void
+        """
+
+        if file_path is not None:
+            self.network_file_path = file_path
+
+        exported = network.load(self.network_file_path)
+        if exported.output_size != self.action_space_size:
+            raise ValueError('The network has {} actions but the agent {}.'.format(exported.output_size,
+                                                                                  self.action_space_size))
+
+        self.network = exported
+
+    def get_actions(self, observations):
+        """
+        :param observations: An observation array, or a 2D array of
+                             observation arrays.
+        :return: The agent's action of every observation.
+        """
+
+        if self.network is None:
+            self.load_network()
+
+        legal = None if self.action_mask is None else self.action_mask.legal
+        if self.sample_actions:
+            return self.network.sample_actions(observations, legal)
+
+        return self.network.greedy_actions(observations, legal)
+
+    def act(self, observation):
+        """
+        Given the observation return an action to apply.
+
+        :param observation: The environment observations.
+        :return: Action to apply to the environment.
+        """
+
+        self.last_action = int(self.get_actions(observation))
+
+        return self.action_pool[self.last_action]
+
+    def freeze(self):
+        """
+        Freeze the agent to evaluate it, playing the greedy actions.
+        """
+
+        super().freeze()
+        self.sample_actions = False
+
+    def policy_parameters(self):
+        """
+        :return: The weights, biases and activation of the exported
+                 network.
+        """
+
+        if self.network is None:
+            self.load_network()
+
+        return self.network.weights, self.network.biases, self.network.activation_name
+
+    def set_policy_parameters(self, parameters):
+        """
+        Play the exported network of another agent.
+        """
+
+        (weights, biases, activation_name) = parameters
+        self.network = network.Network(weights, biases, activation_name)
+
+    def save_checkpoint(self, checkpoint_dir, **metadata):
+        """
+        Nothing to save: the agent does not learn, its network is
+        exported by agents/PolicyGradient.py.
+
+        :return: None, no checkpoint is written.
+        """
+
+        return None
+
+    def restore_checkpoint(self, checkpoint_dir):
+        """
+        Nothing to restore: load_network loads the exported network.
+
+        :return: None, no checkpoint is read.
+        """
+
+        return None
@@ -0,0 +1,222 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import agents.storage as storage
+
+"""Version of the checkpoint layout, stored in the metadata."""
+FORMAT_VERSION = 1
+
+"""Name of the file pointing to the last complete checkpoint of a checkpoint directory."""
+LATEST_FILE_NAME = 'LATEST'
+
+METADATA_FILE_NAME = 'metadata.json'
+
+
+def save(checkpoint_dir, action_value_fn, policy, metadata, keep=2):
+    """
+    Save an action value function and a policy in a new checkpoint of
+    the checkpoint directory, see save_files.
+
+    :param checkpoint_dir: The checkpoint directory.
+    :param action_value_fn: A dense array or a sparse store.
+    :param policy: The policy array, or dict for a sparse policy.
+    :param metadata: A JSON serializable dict, e.g. the
+                     hyperparameters of the agent.
+    :param keep: Number of checkpoints kept in the directory.
+    :return: The path of the new checkpoint.
+    """
+
+    metadata = dict(metadata)
+
+    def write_files(directory):
+        if storage.is_dense(action_value_fn):
+            metadata['action_value_fn'] = 'dense'
+            write_array(os.path.join(directory, 'action_values.npy'), action_value_fn)
+        else:
+            metadata['action_value_fn'] = 'sparse'
+            states = list(action_value_fn)
+            rows = np.array([action_value_fn.get(state) for state in states], action_value_fn.dtype)
+            write_array(os.path.join(directory, 'states.npy'), keys_to_array(states))
+            write_array(os.path.join(directory, 'action_values.npy'),
+                        rows.reshape(len(states), action_value_fn.action_space_size))
+
+        if isinstance(policy, dict):
+            metadata['policy'] = 'sparse'
+            write_array(os.path.join(directory, 'policy_states.npy'), keys_to_array(list(policy)))
+            write_array(os.path.join(directory, 'policy.npy'), np.fromiter(policy.values(), np.int64, len(policy)))
+        else:
+            metadata['policy'] = 'dense'
+            write_array(os.path.join(directory, 'policy.npy'), np.asarray(policy))
+
+    return save_files(checkpoint_dir, write_files, metadata, keep)
+
+
+def save_files(checkpoint_dir, write_files, metadata, keep=2):
+    """
+    Save files written by a function in a new checkpoint of the
+    checkpoint directory.
+
+    Each checkpoint is a sub directory holding the files and a
+    metadata.json header. It is written under a temporary name and
+    renamed once complete, then the LATEST file is atomically replaced
+    to point to it. A crash while saving leaves the previous checkpoint
+    untouched.
+
+    :param checkpoint_dir: The checkpoint directory.
+    :param write_files: Function of the directory of the new
+                        checkpoint writing its files, flushed to the
+                        disk. It may complete the metadata.
+    :param metadata: A JSON serializable dict, written once the files
+                     are.
+    :param keep: Number of checkpoints kept in the directory.
+    :return: The path of the new checkpoint.
+    """
+
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    previous = latest(checkpoint_dir)
+    number = 0 if previous is None else int(os.path.basename(previous).split('-')[1]) + 1
+    name = 'checkpoint-{:08d}'.format(number)
+
+    temporary_dir = tempfile.mkdtemp(prefix='.' + name, dir=checkpoint_dir)
+    write_files(temporary_dir)
+
+    with open(os.path.join(temporary_dir, METADATA_FILE_NAME), 'w') as metadata_file:
+        json.dump(dict(metadata, format_version=FORMAT_VERSION), metadata_file, indent=2, sort_keys=True)
+        metadata_file.flush()
+        os.fsync(metadata_file.fileno())
+
+    checkpoint_path = os.path.join(checkpoint_dir, name)
+    os.rename(temporary_dir, checkpoint_path)
+
+    latest_path = os.path.join(checkpoint_dir, LATEST_FILE_NAME)
+    with open(latest_path + '.tmp', 'w') as latest_file:
+        latest_file.write(name)
+        latest_file.flush()
+        os.fsync(latest_file.fileno())
+    os.replace(latest_path + '.tmp', latest_path)
+
+    remove_old_checkpoints(checkpoint_dir, keep)
+
+    return checkpoint_path
+
+
+def load(checkpoint_dir, mmap_mode='c'):
+    """
+    Load the last checkpoint of a checkpoint directory. The arrays are
+    memory-mapped, by default copy-on-write: nothing is read until it
+    is used and the checkpoint files are never modified.
+
+    :param checkpoint_dir: The checkpoint directory.
+    :param mmap_mode: The numpy memory-map mode, None to read the
+                      arrays in memory.
+    :return: (action_values, policy, metadata) where action_values is
+             either the dense array or a (states, rows) pair for a
+        sparse store, and policy is an array or a dict.
+    """
+
+    (checkpoint_path, metadata) = load_metadata(checkpoint_dir)
+
+    action_values = np.load(os.path.join(checkpoint_path, 'action_values.npy'), mmap_mode=mmap_mode)
+    if metadata['action_value_fn'] == 'sparse':
+        states = array_to_keys(np.load(os.path.join(checkpoint_path, 'states.npy')))
+        action_values = (states, action_values)
+
+    policy = np.load(os.path.join(checkpoint_path, 'policy.npy'), mmap_mode=mmap_mode)
+    if metadata['policy'] == 'sparse':
+        states = array_to_keys(np.load(os.path.join(checkpoint_path, 'policy_states.npy')))
+        policy = dict(zip(states, policy.tolist()))
+
+    return action_values, policy, metadata
+
+
+def load_metadata(checkpoint_dir):
+    """
+    :param checkpoint_dir: The checkpoint directory.
+    :return: (path, metadata) of its last checkpoint, whose files are
+             read by the caller.
+    """
+
+    checkpoint_path = latest(checkpoint_dir)
+    if checkpoint_path is None:
+        raise FileNotFoundError('No checkpoint in {}.'.format(checkpoint_dir))
+
+    with open(os.path.join(checkpoint_path, METADATA_FILE_NAME)) as metadata_file:
+        metadata = json.load(metadata_file)
+
+    if metadata.get('format_version') != FORMAT_VERSION:
+        raise ValueError('Unsupported checkpoint format version {}.'.format(metadata.get('format_version')))
+
+    return checkpoint_path, metadata
+
+
+def latest(checkpoint_dir):
+    """
+    :param checkpoint_dir: The checkpoint directory.
+    :return: The path of its last complete checkpoint or None.
+    """
+
+    latest_path = os.path.join(checkpoint_dir, LATEST_FILE_NAME)
+    if not os.path.isfile(latest_path):
+        return None
+
+    with open(latest_path) as latest_file:
+        return os.path.join(checkpoint_dir, latest_file.read().strip())
+
+
+def remove_old_checkpoints(checkpoint_dir, keep):
+    """
+    Remove all but the last keep checkpoints and any leftover of an
+    interrupted save.
+
+    :return: void
+    """
+
+    names = sorted(name for name in os.listdir(checkpoint_dir) if name.startswith('checkpoint-'))
+    for name in names[:-keep]:
+        shutil.rmtree(os.path.join(checkpoint_dir, name), ignore_errors=True)
+
+    for name in os.listdir(checkpoint_dir):
+        if name.startswith('.checkpoint-'):
+            shutil.rmtree(os.path.join(checkpoint_dir, name), ignore_errors=True)
+
+
+def write_array(file_path, array):
+    """
+    Write an array in a .npy file and flush it to the disk.
+
+    :return: void
+    """
+
+    with open(file_path, 'wb') as array_file:
+        np.save(array_file, array)
+        array_file.flush()
+        os.fsync(array_file.fileno())
+
+
+def keys_to_array(states):
+    """
+    :param states: A list of integer or bytes states.
+    :return: An int64 array, or an array of raw bytes for bytes states.
+    """
+
+    if states and isinstance(states[0], bytes):
+        return np.array(states, np.dtype((np.void, len(states[0]))))
+
+    return np.asarray(states, np.int64)
+
+
+def array_to_keys(array):
+    """
+    :param array: An array written by keys_to_array.
+    :return: The list of states.
+    """
+
+    if array.dtype.kind == 'V':
+        return [key.tobytes() for key in array]
+
+    return array.tolist()
@@ -0,0 +1,97 @@
+import numpy as np
+
+"""Largest state space whose states fit in a signed 64 bits integer."""
+MAX_INTEGER_STATE_SPACE_SIZE = 2 ** 63
+
+
+class StateEncoder:
+    """
+    Encode the capacity usage of the power lines into a state.
+
+    The usage of each line is discretized into levels by the given
+    thresholds: a line is at level k if its usage is greater than k
+    thresholds. With the default single threshold of 1.0 a line is 1
+    if it is overflowed and 0 otherwise. The levels are then read as
+    the digits of a number whose most significant digit is the first
+    line.
+
+    When the state space does not fit in a 64 bits integer the states
+    are returned as bytes keys instead, which are only usable with a
+    sparse action value store.
+    """
+
+    def __init__(self, number_power_lines, thresholds=(1.0,)):
+        """
+        Initialize the encoder.
+
+        :param number_power_lines: The number of lines of the grid.
+        :param thresholds: Increasing capacity usage thresholds, e.g.
+                           (0.7,) or (0.5, 0.8, 1.0).
+        """
+
+        assert len(thresholds) > 0
+        assert np.all(np.diff(thresholds) > 0)
+
+        self.number_power_lines = number_power_lines
+        self.thresholds = np.asarray(thresholds, float)
+        self.levels = len(thresholds) + 1
+        self.state_space_size = self.levels ** number_power_lines
+        self.wide = self.state_space_size > MAX_INTEGER_STATE_SPACE_SIZE
+
+        self.weights = None
+        if not self.wide:
+            self.weights = np.power(self.levels, np.arange(number_power_lines - 1, -1, -1), dtype=np.int64)
+
+    def digitize(self, lines_usage):
+        """
+        :param lines_usage: Capacity usage of the lines, a vector or a
+                            2-D batch with one vector per row.
+        :return: Level of each line, with the shape of lines_usage.
+        """
+
+        return np.searchsorted(self.thresholds, lines_usage, side='left').astype(np.uint8)
+
+    def encode(self, lines_usage):
+        """
+        Encode the capacity usage of the lines of one observation.
+
+        :param lines_usage: Vector of capacity usage of the lines.
+        :return: The state as an integer, or bytes for a wide encoder.
+        """
+
+        levels = self.digitize(np.asarray(lines_usage))
+        if self.wide:
+            return self.levels_to_keys(levels[np.newaxis, :])[0]
+
+        return int(np.dot(levels, self.weights))
+
+    def encode_batch(self, lines_usage):
+        """
+        Encode the capacity usage of the lines of many observations.
+
+        :param lines_usage: 2-D array with one observation per row.
+        :return: An int64 array of states, or a list of bytes keys for
+                 a wide encoder.
+        """
+
+        levels = self.digitize(np.asarray(lines_usage))
+        assert levels.ndim == 2
+
+        if self.wide:
+            return self.levels_to_keys(levels)
+
+        return levels.astype(np.int64) @ self.weights
+
+    def levels_to_keys(self, levels):
+        """
+        Pack 2-D levels into bytes keys, eight lines per byte for the
+        binary encoding and one line per byte otherwise.
+
+        :param levels: 2-D array of levels, one observation per row.
+        :return: List of bytes keys.
+        """
+
+        if self.levels == 2:
+            levels = np.packbits(levels, axis=1)
+
+        return [row.tobytes() for row in np.ascontiguousarray(levels)]
@@ -0,0 +1,406 @@
+import cProfile
+import collections
+import json
+import math
+import sys
+import threading
+import time
+import tracemalloc
+
+"""Number of buckets of the latency histograms. Bucket i counts the latencies in [2^(i-31), 2^(i-30)) seconds."""
+HISTOGRAM_BUCKETS = 33
+HISTOGRAM_OFFSET = 30
+
+PROFILERS = ('cprofile', 'sampling')
+
+
+def bucket_upper_bound(bucket):
+    """
+    :return: The upper bound in seconds of the latencies of a bucket.
+    """
+
+    return math.ldexp(1.0, bucket - HISTOGRAM_OFFSET)
+
+
+class PhaseTimer:
+    """
+    Monotonic clock timer of a phase, e.g. the action selection, used
+    as a context manager around each occurrence of the phase. It keeps
+    the count, total, minimum and maximum durations and a log2
+    histogram of the durations.
+    """
+
+    __slots__ = ('name', 'count', 'total', 'minimum', 'maximum', 'histogram', 'start_time')
+
+    def __init__(self, name):
+        self.name = name
+        self.start_time = 0.0
+        self.reset()
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.record(time.perf_counter() - self.start_time)
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float('inf')
+        self.maximum = 0.0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def record(self, duration):
+        """
+        Record one occurrence of the phase.
+
+        :param duration: Its duration in seconds.
+        :return: void
+        """
+
+        self.count += 1
+        self.total += duration
+        self.minimum = min(self.minimum, duration)
+        self.maximum = max(self.maximum, duration)
+        bucket = math.frexp(duration)[1] + HISTOGRAM_OFFSET if duration > 0.0 else 0
+        self.histogram[min(max(bucket, 0), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def percentile(self, percentage):
+        """
+        :param percentage: e.g. 99.
+        :return: The upper bound of the histogram bucket holding the
+                 percentile, in seconds.
+        """
+
+        rank = math.ceil(self.count * percentage / 100.0)
+        cumulative_count = 0
+        for (bucket, count) in enumerate(self.histogram):
+            cumulative_count += count
+            if cumulative_count >= rank:
+                return min(bucket_upper_bound(bucket), self.maximum)
+
+        return self.maximum
+
+    def summary(self):
+        """
+        :return: A JSON serializable dict of the statistics.
+        """
+
+        if self.count == 0:
+            return {'count': 0, 'total': 0.0}
+
+        return {'count': self.count,
+                'total': self.total,
+                'mean': self.total / self.count,
+                'min': self.minimum,
+                'max': self.maximum,
+                'p50': self.percentile(50),
+                'p99': self.percentile(99),
+                'histogram': {'{:.3g}'.format(bucket_upper_bound(bucket)): count
+                              for (bucket, count) in enumerate(self.histogram) if count}}
+
+
+class NullTimer:
+    """
+    Timer of the phases while the instrumentation is off: it does
+    nothing.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class SamplingProfiler:
+    """
+    Minimal statistical profiler: a thread samples the stack of the
+    profiled thread at a fixed interval. The samples are written as
+    collapsed stacks ("a;b;c count" lines), the input format of flame
+    graph tools.
+    """
+
+    def __init__(self, interval=0.001):
+        """
+        :param interval: The sampling interval in seconds.
+        """
+
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.thread_id = None
+        self.running = threading.Event()
+        self.thread = None
+
+    def enable(self):
+        self.thread_id = threading.get_ident()
+        self.running.set()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+
+    def disable(self):
+        self.running.clear()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def sample(self):
+        while self.running.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            stack = list()
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{}:{}'.format(code.co_filename, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def dump_stats(self, file_path):
+        with open(file_path, 'w') as profile_file:
+            for (stack, count) in self.samples.most_common():
+                profile_file.write('{} {}\n'.format(stack, count))
+
+
+class Instrumentation:
+    """
+    Per phase timing and memory instrumentation of a runner and its
+    agent. Disabled, phase returns a timer doing nothing, so the
+    instrumented code only pays a method call per phase. It can be
+    enabled and disabled at any time.
+
+    Every summary_interval steps, a summary of the interval is logged
+    and appended as a JSON line to the instrumentation file: the
+    steps/s, the statistics of every phase, the size of the action
+    value function and, if traced, the memory allocated by python.
+    The phases are nested: e.g. the learning is part of feed_return.
+
+    A profiler, cProfile or a sampling profiler, can also run for a
+    fixed window of steps.
+    """
+
+    def __init__(self, enabled=False, summary_interval=1000, file_path=None, trace_memory=False, logger=None,
+                 profiler=None, profile_start=0, profile_steps=1000, profile_file_path='runner.prof'):
+        """
+        :param enabled: Instrument from the start.
+        :param summary_interval: Number of steps between two summaries.
+        :param file_path: Optional JSON lines file of the summaries.
+        :param trace_memory: Trace the python memory allocations with
+                             tracemalloc, which slows everything down.
+        :param logger: The logger of the summary lines.
+        :param profiler: None, 'cprofile' or 'sampling'.
+        :param profile_start: The number of steps before the profiled
+                              window.
+        :param profile_steps: The number of profiled steps.
+        :param profile_file_path: Where the profile is written: pstats
+            data for cProfile, collapsed stacks for the sampling
+            profiler.
+        """
+
+        assert summary_interval > 0
+        assert profiler is None or profiler in PROFILERS
+
+        self.enabled = False
+        self.summary_interval = summary_interval
+        self.file_path = file_path
+        self.trace_memory = trace_memory
+        self.logger = logger
+        self.timers = dict()
+
+        self.profiler_name = profiler
+        self.profiler = None
+        self.profile_start = profile_start
+        self.profile_steps = profile_steps
+        self.profile_file_path = profile_file_path
+
+        self.steps = 0
+        self.interval_steps = 0
+        self.interval_start_time = time.perf_counter()
+
+        if enabled:
+            self.enable()
+
+        if profiler is not None and profile_start == 0:
+            self.start_profiler()
+
+    def enable(self):
+        """
+        Start instrumenting. The current interval starts now.
+
+        :return: void
+        """
+
+        self.enabled = True
+        self.interval_steps = 0
+        self.interval_start_time = time.perf_counter()
+        for timer in self.timers.values():
+            timer.reset()
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        """
+        Stop instrumenting. The profiler is not affected.
+
+        :return: void
+        """
+
+        self.enabled = False
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def phase(self, name):
+        """
+        :param name: The name of the phase.
+        :return: The timer of the phase, to be used as a context
+                 manager.
+        """
+
+        if not self.enabled:
+            return NULL_TIMER
+
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = PhaseTimer(name)
+
+        return timer
+
+    def end_step(self, agent=None):
+        """
+        Count a step, start or stop the profiler and write the summary
+        at the end of an interval.
+
+        :param agent: The agent of the runner, whose action value
+                      function is summarized.
+        :return: void
+        """
+
+        self.steps += 1
+
+        if self.profiler_name is not None:
+            self.update_profiler()
+
+        if not self.enabled:
+            return
+
+        self.interval_steps += 1
+        if self.interval_steps >= self.summary_interval:
+            self.write_summary(agent)
+
+    def update_profiler(self):
+        """
+        Start the profiler once profile_start steps are done and stop
+        it profile_steps steps later.
+
+        :return: void
+        """
+
+        if self.steps == self.profile_start:
+            self.start_profiler()
+        elif self.steps == self.profile_start + self.profile_steps:
+            self.stop_profiler()
+
+    def start_profiler(self):
+        """
+        Start the profiler.
+
+        :return: void
+        """
+
+        self.profiler = cProfile.Profile() if self.profiler_name == 'cprofile' else SamplingProfiler()
+        self.profiler.enable()
+
+    def stop_profiler(self):
+        """
+        Stop the profiler, if running, and write the profile.
+
+        :return: void
+        """
+
+        if self.profiler is None:
+            return
+
+        self.profiler.disable()
+        self.profiler.dump_stats(self.profile_file_path)
+        self.profiler = None
+        if self.logger is not None:
+            self.logger.info('profile of steps %d to %d written in %s' % (self.profile_start, self.steps,
+                                                                          self.profile_file_path))
+
+    def summary(self, agent=None):
+        """
+        :param agent: Optional agent whose action value function is
+                      summarized.
+        :return: The JSON serializable summary of the current interval.
+        """
+
+        elapsed = time.perf_counter() - self.interval_start_time
+        summary = {'steps': self.steps,
+                   'interval_steps': self.interval_steps,
+                   'elapsed': elapsed,
+                   'steps_per_second': self.interval_steps / elapsed if elapsed > 0.0 else 0.0,
+                   'phases': {name: timer.summary() for (name, timer) in self.timers.items()}}
+
+        mdp = getattr(agent, 'mdp', None)
+        if mdp is not None:
+            action_value_fn = mdp.get_action_value_function()
+            summary['action_values'] = {'states': action_value_fn.shape[0], 'bytes': action_value_fn.nbytes}
+
+        lookahead = getattr(agent, 'lookahead', None)
+        if lookahead is not None:
+            summary['lookahead'] = lookahead.summary()
+
+        if tracemalloc.is_tracing():
+            (current, peak) = tracemalloc.get_traced_memory()
+            summary['memory'] = {'current': current, 'peak': peak}
+
+        return summary
+
+    def write_summary(self, agent=None):
+        """
+        Log the summary of the current interval, append it to the
+        instrumentation file and start a new interval.
+
+        :param agent: Optional agent whose action value function is
+                      summarized.
+        :return: void
+        """
+
+        summary = self.summary(agent)
+
+        if self.logger is not None:
+            phases = ' - '.join('%s %.1fus (p99 %.1fus)' % (name, phase['mean'] * 1e6, phase['p99'] * 1e6)
+                                for (name, phase) in summary['phases'].items() if phase['count'])
+            self.logger.info('step %d - %.1f steps/s - %s' % (summary['steps'], summary['steps_per_second'], phases))
+
+        if self.file_path is not None:
+            with open(self.file_path, 'a') as instrumentation_file:
+                instrumentation_file.write(json.dumps(summary) + '\n')
+
+        self.interval_steps = 0
+        self.interval_start_time = time.perf_counter()
+        for timer in self.timers.values():
+            timer.reset()
+        # Before Python 3.9 the peak cannot be reset, it is the peak since the tracing started.
+        if tracemalloc.is_tracing() and hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+    def close(self, agent=None):
+        """
+        Write the summary of the last, partial interval and stop the
+        profiler.
+
+        :return: void
+        """
+
+        if self.enabled and self.interval_steps > 0:
+            self.write_summary(agent)
+
+        self.stop_profiler()
@@ -0,0 +1,154 @@
+import collections
+import time
+
+import numpy as np
+
+"""Default number of greedy candidates checked with the environment's simulate."""
+DEFAULT_CANDIDATES = 3
+"""Default time in seconds the lookahead of a step may spend simulating."""
+DEFAULT_BUDGET = 0.05
+"""Default number of simulated rewards kept in the cache."""
+DEFAULT_CACHE_SIZE = 100000
+
+
+def timestep_key(environment):
+    """
+    :param environment: The environment, RunEnv or a surrogate.
+    :return: The time of day of the current timestep of the
+             environment, so that the same situation in two chronics
+             shares its simulations.
+    """
+
+    current_datetime = environment.get_current_datetime()
+
+    return current_datetime.time() if current_datetime is not None else None
+
+
+class Lookahead:
+    """
+    One step lookahead of the greedy action: the candidates of highest
+    action value are simulated by the environment and the one of
+    highest simulated reward is played, which avoids the actions
+    leading to an immediate game over.
+
+    The simulated rewards are memoized in a bounded LRU cache keyed by
+    (state, action, timestep), the same situation coming back across
+    chronics. Simulating is stopped once the latency budget of the step
+    is exceeded: the best candidate simulated so far is then played,
+    or the next candidate if every simulated one leads to a game over.
+    """
+
+    def __init__(self, environment, candidates=DEFAULT_CANDIDATES, budget=DEFAULT_BUDGET,
+                 cache_size=DEFAULT_CACHE_SIZE):
+        """
+        :param environment: The environment whose simulate is called.
+        :param candidates: The number of greedy candidates checked.
+        :param budget: The time in seconds a step may spend simulating,
+                       None for no limit.
+        :param cache_size: The maximum number of cached rewards.
+        """
+
+        assert candidates > 0
+        assert budget is None or budget > 0
+        assert cache_size > 0
+
+        self.environment = environment
+        self.candidates = candidates
+        self.budget = budget
+        self.cache_size = cache_size
+
+        """Simulated reward of (state, action, timestep) keys, in least recently used order."""
+        self.cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        """Number of steps whose budget ran out before any candidate was simulated."""
+        self.fallbacks = 0
+
+    def get_candidates(self, action_values, action_mask=None):
+        """
+        :param action_values: The action values of a state.
+        :param action_mask: Optional ActionMask of the legal actions.
+        :return: The candidate actions by decreasing action value, the
+                 greedy action first.
+        """
+
+        actions = np.arange(len(action_values)) if action_mask is None else action_mask.legal_actions
+        values = action_values[actions]
+        count = min(self.candidates, len(actions))
+        if count < len(actions):
+            top = np.argpartition(-values, count - 1)[:count]
+        else:
+            top = np.arange(len(actions))
+        # A stable sort keeps the lowest action first among equal values, as argmax.
+        top = np.sort(top)
+        top = top[np.argsort(-values[top], kind='stable')]
+
+        return actions[top]
+
+    def simulated_reward(self, key, environment_action):
+        """
+        :param key: The (state, action, timestep) key of the simulation.
+        :param environment_action: The action given to simulate.
+        :return: The cached or simulated reward, -inf if the action
+                 leads to a game over.
+        """
+
+        reward = self.cache.get(key)
+        if reward is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return reward
+
+        self.misses += 1
+        (_, reward, done, _) = self.environment.simulate(environment_action, do_sum=True)
+        reward = float('-inf') if done else float(reward)
+
+        if len(self.cache) >= self.cache_size:
+            self.cache.popitem(last=False)
+        self.cache[key] = reward
+
+        return reward
+
+    def select(self, state, action_values, action_pool, action_mask=None):
+        """
+        Choose the candidate of highest simulated reward, ties going to
+        the highest action value.
+
+        :param state: The encoded current state.
+        :param action_values: The action values of the state.
+        :param action_pool: The ActionPool of the environment actions.
+        :param action_mask: Optional ActionMask of the legal actions.
+        :return: The chosen action.
+        """
+
+        candidates = self.get_candidates(action_values, action_mask)
+        if len(candidates) == 1:
+            return int(candidates[0])
+
+        deadline = None if self.budget is None else time.perf_counter() + self.budget
+        timestep = timestep_key(self.environment)
+
+        best_action = int(candidates[0])
+        best_reward = float('-inf')
+        simulated = False
+        for action in candidates.tolist():
+            key = (state, action, timestep)
+            if key not in self.cache and deadline is not None and time.perf_counter() > deadline:
+                if not simulated:
+                    self.fallbacks += 1
+                # A candidate not simulated yet is better than a known game over.
+                return best_action if best_reward > float('-inf') else action
+
+            reward = self.simulated_reward(key, action_pool[action])
+            simulated = True
+            if reward > best_reward:
+                (best_action, best_reward) = (action, reward)
+
+        return best_action
+
+    def summary(self):
+        """
+        :return: A JSON serializable dict of the cache statistics.
+        """
+
+        return {'cached': len(self.cache), 'hits': self.hits, 'misses': self.misses, 'fallbacks': self.fallbacks}
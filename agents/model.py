@@ -1,5 +1,71 @@
 import numpy as np
 
+import agents.storage as storage
+
+
+"""Number of rewards discounted together by discounted_returns, small enough to keep discount^k finite."""
+RETURNS_BLOCK_SIZE = 64
+
+
+def discounted_returns(rewards, discount):
+    """
+    Backward computing of the total reward obtained from each step of
+    an episode:
+
+        Gt = Rt + discount*Gt1
+
+    The rewards are processed by blocks. Within a block the sum is
+    vectorized as a reversed cumulative sum of discount^k * Rk.
+
+    :param rewards: The rewards of the episode in chronological order.
+    :param discount: The discount applied to the next total reward.
+    :return: An array of total rewards parallel to rewards.
+    """
+
+    rewards = np.asarray(rewards, float)
+    returns = np.empty_like(rewards)
+    if discount == 0:
+        returns[:] = rewards
+        return returns
+
+    powers = np.power(float(discount), np.arange(RETURNS_BLOCK_SIZE + 1))
+    next_return = 0.0
+    for end in range(len(rewards), 0, -RETURNS_BLOCK_SIZE):
+        start = max(0, end - RETURNS_BLOCK_SIZE)
+        length = end - start
+        weighted = rewards[start:end] * powers[:length]
+        returns[start:end] = np.cumsum(weighted[::-1])[::-1] / powers[:length] + \
+            next_return * powers[length:0:-1]
+        next_return = returns[start]
+
+    return returns
+
+
+def first_visits(states, actions, integer_states=True):
+    """
+    Find the first visit of every state, action pair in an episode.
+
+    :param states: The visited states in chronological order.
+    :param actions: The applied actions, parallel to states.
+    :param integer_states: True if states are integers which can be
+                           handled as a numpy array.
+    :return: Sorted array of indices of first visits.
+    """
+
+    if integer_states:
+        pairs = np.stack((np.asarray(states, np.int64), np.asarray(actions, np.int64)), axis=1)
+        (_, indices) = np.unique(pairs, axis=0, return_index=True)
+        return np.sort(indices)
+
+    visited = set()
+    indices = []
+    for (index, pair) in enumerate(zip(states, actions)):
+        if pair not in visited:
+            visited.add(pair)
+            indices.append(index)
+
+    return np.asarray(indices, np.int64)
+
 
 class MDP:
     """
@@ -8,8 +74,15 @@ class MDP:
     (TD(lambda))
     """
 
-    def __init__(self, state_space_size, action_space_size, learning_rate, maturity_threshold, discount):
-        """ Initialize action value function with zeros values. """
+    def __init__(self, state_space_size, action_space_size, learning_rate, maturity_threshold, discount,
+                 action_value_fn=None):
+        """
+        Initialize action value function with zeros values.
+
+        :param action_value_fn: Optional storage of the action value
+            function, as created by storage.create_action_value_store.
+            By default a dense array of zeros is used.
+        """
 
         self.iteration_count = 0
         self.maturity_threshold = maturity_threshold
@@ -18,7 +91,13 @@ class MDP:
         self.alpha = learning_rate
         self.gamma = discount
 
-        self.action_value_fn = np.zeros((state_space_size, action_space_size), np.float)
+        if action_value_fn is None:
+            action_value_fn = np.zeros((state_space_size, action_space_size), float)
+
+        self.action_value_fn = action_value_fn
+
+        """States whose action values changed since the last call to pop_touched_states."""
+        self.touched_states = set()
 
     def learn(self, history):
         """
@@ -46,11 +125,38 @@ class MDP:
     def get_action_value_function(self):
         return self.action_value_fn
 
+    def pop_touched_states(self) -> set:
+        """
+        Get the states whose action values changed since the last call
+        and start tracking again from an empty set. A policy only needs
+        to be improved on these states.
+
+        :return: A set of states.
+        """
+
+        touched_states = self.touched_states
+        self.touched_states = set()
+
+        return touched_states
+
+    def reset_action_values(self, state):
+        """
+        Set to zero the action values of a state, e.g. a terminal one.
+
+        :param state: The state to reset.
+        :return: void
+        """
+
+        self.action_value_fn[state].fill(0)
+        self.touched_states.add(state)
+
 
 class MonteCarlo(MDP):
-    def __init__(self, state_space_size, action_space_size, learning_rate, maturity_threshold, discount):
+    def __init__(self, state_space_size, action_space_size, learning_rate, maturity_threshold, discount,
+                 action_value_fn=None):
         """Initialize the MDP."""
-        super().__init__(state_space_size, action_space_size, learning_rate, maturity_threshold, discount)
+        super().__init__(state_space_size, action_space_size, learning_rate, maturity_threshold, discount,
+                         action_value_fn)
 
     def learn(self, history):
         """
@@ -76,21 +182,51 @@ class MonteCarlo(MDP):
         if not history:
             return
 
-        total_rewards = np.zeros((self.state_space_size, self.action_space_size), np.float)
-        cumulative_reward = 0
+        self.learn_episodes([history])
 
+    def learn_episodes(self, histories):
         """
-        Backward computing of the total reward obtained from a state.
-        
-        Gt = Rt + gamma*Gt1
+        Learn from a batch of episodes at once. The result is the same
+        as calling learn on each of them in order, but only the visited
+        state, action pairs are updated and all of them in one pass.
+
+        :param histories: A list of episode histories, each one in the
+                          format expected by learn.
+        :return: void
         """
-        for (state, action, reward) in history:
-            cumulative_reward += reward + self.gamma * cumulative_reward
-            total_rewards[state][action] = cumulative_reward
 
-        self.action_value_fn = self.action_value_fn + (self.alpha * (total_rewards - self.action_value_fn))
+        assert histories is not None
+
+        batch_states = []
+        batch_actions = []
+        batch_returns = []
+        for history in histories:
+            assert history is not None
+            if not history:
+                continue
+
+            # Chronological order, the oldest event first.
+            (states, actions, rewards) = zip(*reversed(history))
+            # The total reward has always been accumulated as G <-- G + R + gamma*G.
+            returns = discounted_returns(rewards, 1 + self.gamma)
+
+            """
+            Every visit of a pair overwrites its total reward in the
+            backward pass, so the first visit of the episode is kept.
+            """
+            visits = first_visits(states, actions, storage.is_dense(self.action_value_fn) or
+                                  storage.is_quantized(self.action_value_fn))
+            batch_states.extend(states[i] for i in visits)
+            batch_actions.extend(actions[i] for i in visits)
+            batch_returns.append(returns[visits])
+
+            self.iteration_count += 1
+
+        if not batch_returns:
+            return
 
-        self.iteration_count += 1
+        storage.blend(self.action_value_fn, batch_states, batch_actions, np.concatenate(batch_returns), self.alpha)
+        self.touched_states.update(batch_states)
 
 
 class TemporalDifference(MDP):
@@ -98,9 +234,11 @@ class TemporalDifference(MDP):
     Implement Temporal Difference algorithm or TD(0)
     """
 
-    def __init__(self, state_space_size, action_space_size, learning_rate, maturity_threshold, discount):
+    def __init__(self, state_space_size, action_space_size, learning_rate, maturity_threshold, discount,
+                 action_value_fn=None):
         """Initialize the MDP."""
-        super().__init__(state_space_size, action_space_size, learning_rate, maturity_threshold, discount)
+        super().__init__(state_space_size, action_space_size, learning_rate, maturity_threshold, discount,
+                         action_value_fn)
 
     def learn(self, history):
         """
@@ -116,7 +254,8 @@ class TemporalDifference(MDP):
                         in the tuple is the state, the second is the
                         action and the third one is the
             reward obtained from that state after one step. The first
-            element on the list is the most recent one.
+            element on the list is the most recent one. The state of
+            the most recent one is None after a game over.
         :return void
         """
 
@@ -126,21 +265,164 @@ class TemporalDifference(MDP):
         # Remember the order of the list. The most recent event is first on the list.
         (state_t, action_t, reward_t1) = history[1]
         (state_t1, action_t1, reward_t2) = history[0]
-        q = self.action_value_fn[state_t][action_t]
-        q1 = self.action_value_fn[state_t1][action_t1]
+        # Accumulate in float64 whatever the type of the action values.
+        q = float(self.action_value_fn[state_t][action_t])
+        # There is no next state after a game over: it is worth nothing.
+        q1 = 0.0 if state_t1 is None else float(self.action_value_fn[state_t1][action_t1])
 
         self.action_value_fn[state_t][action_t] = q + self.alpha * (reward_t1 + (self.gamma * q1) - q)
+        self.touched_states.add(state_t)
 
         self.iteration_count += 1
 
+    def learn_batch(self, states, actions, rewards, next_states, next_actions=None, dones=None, weights=None):
+        """
+        Learn from a batch of transitions in one vectorized pass. The
+        target of each transition is
+
+            Rt1 + gamma*Q(st1, at1)       if the next actions are given,
+            Rt1 + gamma*max_a Q(st1, a)   otherwise, as in Q-learning,
+
+        and only Rt1 if the transition ends the episode. All targets
+        are computed from the action values before the batch; then the
+        updates are applied in order, a pair appearing many times in
+        the batch being updated as many times. Weighted transitions
+        move their action values by their weight times the TD error,
+        e.g. the importance sampling weights of prioritized replay.
+
+        :param states: Array of states st.
+        :param actions: Array of actions at.
+        :param rewards: Array of rewards Rt1.
+        :param next_states: Array of states st1.
+        :param next_actions: Optional array of actions at1.
+        :param dones: Optional array of booleans, True for the
+                      transitions ending an episode.
+        :param weights: Optional array of weights of the TD errors.
+        :return: The TD errors of the transitions, i.e. their targets
+                 minus their action values before the batch.
+        """
+
+        assert len(states) == len(actions) == len(rewards) == len(next_states)
+        if len(states) == 0:
+            return np.zeros(0)
+
+        next_values = storage.gather_rows(self.action_value_fn, next_states)
+        if next_actions is None:
+            next_values = np.max(next_values, axis=1)
+        else:
+            next_values = next_values[np.arange(len(next_states)), np.asarray(next_actions, np.int64)]
+
+        if dones is not None:
+            next_values = np.where(dones, 0.0, next_values)
+
+        targets = np.asarray(rewards, float) + self.gamma * next_values
+        action_values = storage.gather(self.action_value_fn, states, actions)
+        td_errors = targets - action_values
+        if weights is not None:
+            targets = action_values + np.asarray(weights, float) * td_errors
+        storage.blend(self.action_value_fn, states, actions, targets, self.alpha)
+
+        self.touched_states.update(states)
+        self.iteration_count += len(states)
+
+        return td_errors
+
 
 class TemporalDifferenceLambda(MDP):
-    def __init__(self, state_space_size):
-        """Initialize the state space."""
-        super().__init__()
+    """
+    Implement TD(lambda) with eligibility traces, which is the learning
+    of Sarsa(lambda) and, when the traces are reset after exploratory
+    actions, of Watkins's Q(lambda).
+
+    The eligibility traces are kept only for the recently visited
+    state, action pairs: a trace is dropped once it decays below the
+    cutoff, and at most max_traces traces are kept, the least recently
+    visited pair being dropped first. The cost of a step is
+    proportional to the number of active traces.
+    """
+
+    def __init__(self, state_space_size, action_space_size, learning_rate, maturity_threshold, discount,
+                 trace_decay, action_value_fn=None, trace_cutoff=1e-3, max_traces=1000, replacing_traces=False):
+        """
+        Initialize the MDP.
+
+        :param trace_decay: The lambda parameter, how fast the traces
+                            decay in addition to the discount.
+        :param trace_cutoff: Traces smaller than this are dropped.
+        :param max_traces: Maximum number of active traces.
+        :param replacing_traces: Set the trace of a visited pair to 1
+                                 instead of adding 1 to it.
+        """
+
+        super().__init__(state_space_size, action_space_size, learning_rate, maturity_threshold, discount,
+                         action_value_fn)
+
+        assert max_traces > 0
+
+        self.trace_decay = trace_decay
+        self.trace_cutoff = trace_cutoff
+        self.max_traces = max_traces
+        self.replacing_traces = replacing_traces
+
+        """Eligibility of the (state, action) pairs, ordered from the least recently visited."""
+        self.traces = dict()
 
     def learn(self, history):
-        """Do something"""
+        """
+        Learning the action value function in TD(lambda) follows this:
 
-    def is_mature(self) -> bool:
-        return False
+        delta <-- Rt1 + gamma*Q(st1, at1) - Q(st, at)
+        e(st, at) <-- e(st, at) + 1
+        Q(s, a) <-- Q(s, a) + alpha*delta*e(s, a)   for all traced (s, a)
+        e(s, a) <-- gamma*lambda*e(s, a)            for all traced (s, a)
+
+        :param history: History is a list of two tuples as in TD(0).
+                        The first element on the list is the most
+            recent one.
+        :return void
+        """
+
+        assert history is not None
+        assert len(history) == 2
+
+        # Remember the order of the list. The most recent event is first on the list.
+        (state_t, action_t, reward_t1) = history[1]
+        (state_t1, action_t1, reward_t2) = history[0]
+        q = float(self.action_value_fn[state_t][action_t])
+        # There is no next state after a game over: it is worth nothing.
+        q1 = 0.0 if state_t1 is None else float(self.action_value_fn[state_t1][action_t1])
+        delta = reward_t1 + (self.gamma * q1) - q
+
+        # Move the visited pair at the end, as the most recently visited.
+        eligibility = self.traces.pop((state_t, action_t), 0.0)
+        self.traces[(state_t, action_t)] = 1.0 if self.replacing_traces else eligibility + 1.0
+        if len(self.traces) > self.max_traces:
+            del self.traces[next(iter(self.traces))]
+
+        pairs = list(self.traces)
+        traces = np.fromiter(self.traces.values(), float, len(pairs))
+        (states, actions) = zip(*pairs)
+
+        if storage.is_dense(self.action_value_fn):
+            # The pairs are unique so the fancy indexed update is safe.
+            self.action_value_fn[np.asarray(states, np.int64), np.asarray(actions, np.int64)] += \
+                self.alpha * delta * traces
+        else:
+            for (state, action, trace) in zip(states, actions, traces):
+                self.action_value_fn[state][action] += self.alpha * delta * trace
+
+        traces *= self.gamma * self.trace_decay
+        self.traces = {pair: trace for (pair, trace) in zip(pairs, traces) if trace >= self.trace_cutoff}
+
+        self.touched_states.update(states)
+        self.iteration_count += 1
+
+    def reset_traces(self):
+        """
+        Forget all the eligibility traces, at the end of an episode or
+        after an exploratory action in Watkins's Q(lambda).
+
+        :return: void
+        """
+
+        self.traces.clear()
@@ -0,0 +1,265 @@
+import json
+import os
+
+import numpy as np
+
+"""Version of the exported network layout, stored in its metadata."""
+FORMAT_VERSION = 1
+
+"""Hidden layer activations the NumPy forward pass supports, by name."""
+ACTIVATIONS = {'tanh': np.tanh,
+               'relu': lambda x: np.maximum(x, 0.0),
+               'identity': lambda x: x}
+
+"""Derivatives of the activations, as functions of their outputs."""
+ACTIVATION_DERIVATIVES = {'tanh': lambda y: 1.0 - y * y,
+                          'relu': lambda y: (y > 0.0).astype(y.dtype),
+                          'identity': lambda y: np.ones_like(y)}
+
+
+def save(file_path, weights, biases, activation='tanh', metadata=None):
+    """
+    Export the dense layers of a multilayer perceptron in a compressed
+    .npz file, readable without TensorFlow.
+
+    :param file_path: The .npz file, overwritten.
+    :param weights: The (inputs, outputs) kernel of every layer.
+    :param biases: The bias of every layer.
+    :param activation: The name of the hidden layers activation, one of
+                       ACTIVATIONS. The output layer has none.
+    :param metadata: Optional JSON serializable dict, e.g. the
+                     environment the network was trained on.
+    :return: void
+    """
+
+    assert len(weights) == len(biases) > 0
+    assert activation in ACTIVATIONS
+
+    metadata = dict(metadata or {}, format_version=FORMAT_VERSION, activation=activation, layers=len(weights))
+    arrays = {'metadata': np.array(json.dumps(metadata))}
+    for (i, (kernel, bias)) in enumerate(zip(weights, biases)):
+        arrays['kernel_{}'.format(i)] = np.asarray(kernel, np.float32)
+        arrays['bias_{}'.format(i)] = np.asarray(bias, np.float32)
+
+    with open(file_path, 'wb') as network_file:
+        np.savez_compressed(network_file, **arrays)
+        network_file.flush()
+        os.fsync(network_file.fileno())
+
+
+def load(file_path):
+    """
+    :param file_path: A .npz file written by save.
+    :return: The exported Network.
+    """
+
+    with np.load(file_path) as arrays:
+        metadata = json.loads(str(arrays['metadata']))
+        if metadata.get('format_version') != FORMAT_VERSION:
+            raise ValueError('Unsupported network format {} in {}.'.format(metadata.get('format_version'),
+                                                                           file_path))
+
+        weights = [arrays['kernel_{}'.format(i)] for i in range(metadata['layers'])]
+        biases = [arrays['bias_{}'.format(i)] for i in range(metadata['layers'])]
+
+    return Network(weights, biases, metadata['activation'], metadata)
+
+
+class Network:
+    """
+    Multilayer perceptron in NumPy. The layers are applied to a batch
+    of inputs at once, a single input being a batch of one. Small
+    networks can also be trained on the CPU with backward and Adam.
+    """
+
+    def __init__(self, weights, biases, activation='tanh', metadata=None):
+        """
+        :param weights: The (inputs, outputs) kernel of every layer.
+        :param biases: The bias of every layer.
+        :param activation: The name of the hidden layers activation.
+        :param metadata: The metadata of the export.
+        """
+
+        assert len(weights) == len(biases) > 0
+        assert activation in ACTIVATIONS
+        for (kernel, bias) in zip(weights, biases):
+            assert kernel.shape[1] == bias.shape[0]
+
+        self.weights = [np.ascontiguousarray(kernel, np.float32) for kernel in weights]
+        self.biases = [np.ascontiguousarray(bias, np.float32) for bias in biases]
+        self.activation_name = activation
+        self.activation = ACTIVATIONS[activation]
+        self.metadata = dict() if metadata is None else metadata
+
+        self.input_size = self.weights[0].shape[0]
+        self.output_size = self.weights[-1].shape[1]
+
+    @staticmethod
+    def random(sizes, activation='tanh', random_state=np.random):
+        """
+        :param sizes: The number of inputs then the number of outputs of
+                      every layer.
+        :param activation: The name of the hidden layers activation.
+        :param random_state: The random generator of the weights.
+        :return: A Network initialized as Glorot, with zero biases.
+        """
+
+        assert len(sizes) >= 2
+
+        weights = [random_state.uniform(-1.0, 1.0, (n_in, n_out)) * np.sqrt(6.0 / (n_in + n_out))
+                   for (n_in, n_out) in zip(sizes[:-1], sizes[1:])]
+        biases = [np.zeros(n_out) for n_out in sizes[1:]]
+
+        return Network(weights, biases, activation)
+
+    def copy(self):
+        """
+        :return: A Network with copies of the weights, e.g. a target
+                 network.
+        """
+
+        return Network([kernel.copy() for kernel in self.weights], [bias.copy() for bias in self.biases],
+                       self.activation_name, dict(self.metadata))
+
+    def assign(self, other):
+        """
+        Copy the weights of a network of the same shape.
+
+        :return: void
+        """
+
+        for (kernel, other_kernel) in zip(self.weights + self.biases, other.weights + other.biases):
+            kernel[...] = other_kernel
+
+    def save(self, file_path, metadata=None):
+        """
+        Export the network, see save.
+
+        :return: void
+        """
+
+        save(file_path, self.weights, self.biases, self.activation_name, dict(self.metadata, **(metadata or {})))
+
+    def forward(self, inputs):
+        """
+        Forward pass keeping the input of every layer, for backward.
+
+        :param inputs: A 2D array of inputs.
+        :return: (outputs, layer_inputs).
+        """
+
+        layer_inputs = [np.asarray(inputs, np.float32)]
+        for kernel, bias in zip(self.weights[:-1], self.biases[:-1]):
+            layer_inputs.append(self.activation(layer_inputs[-1] @ kernel + bias))
+
+        return layer_inputs[-1] @ self.weights[-1] + self.biases[-1], layer_inputs
+
+    def backward(self, layer_inputs, output_gradients):
+        """
+        Backpropagate the gradient of a loss.
+
+        :param layer_inputs: The layer inputs returned by forward.
+        :param output_gradients: The gradient of the loss with respect
+                                 to the outputs.
+        :return: (weights_gradients, biases_gradients).
+        """
+
+        derivative = ACTIVATION_DERIVATIVES[self.activation_name]
+        weights_gradients = [None] * len(self.weights)
+        biases_gradients = [None] * len(self.biases)
+
+        gradients = np.asarray(output_gradients, np.float32)
+        for layer in reversed(range(len(self.weights))):
+            weights_gradients[layer] = layer_inputs[layer].T @ gradients
+            biases_gradients[layer] = gradients.sum(axis=0)
+            if layer > 0:
+                gradients = (gradients @ self.weights[layer].T) * derivative(layer_inputs[layer])
+
+        return weights_gradients, biases_gradients
+
+    def logits(self, inputs):
+        """
+        :param inputs: An input, or a 2D array of inputs.
+        :return: The output of the network for every input.
+        """
+
+        x = np.asarray(inputs, np.float32)
+        for kernel, bias in zip(self.weights[:-1], self.biases[:-1]):
+            x = self.activation(x @ kernel + bias)
+
+        return x @ self.weights[-1] + self.biases[-1]
+
+    def masked_logits(self, inputs, legal=None):
+        """
+        :param inputs: An input, or a 2D array of inputs.
+        :param legal: Optional boolean array of the legal actions.
+        :return: The logits, -inf for the illegal actions.
+        """
+
+        logits = self.logits(inputs)
+        if legal is not None:
+            logits[..., ~legal] = -np.inf
+
+        return logits
+
+    def greedy_actions(self, inputs, legal=None):
+        """
+        :param inputs: An input, or a 2D array of inputs.
+        :param legal: Optional boolean array of the legal actions.
+        :return: The action of highest logit of every input.
+        """
+
+        return np.argmax(self.masked_logits(inputs, legal), axis=-1)
+
+    def sample_actions(self, inputs, legal=None):
+        """
+        Sample the actions from the softmax of the logits, as the
+        multinomial sampling of the trained policy, with the Gumbel-max
+        trick.
+
+        :param inputs: An input, or a 2D array of inputs.
+        :param legal: Optional boolean array of the legal actions.
+        :return: A sampled action for every input.
+        """
+
+        logits = self.masked_logits(inputs, legal)
+        gumbel = -np.log(-np.log(np.random.random_sample(logits.shape) + np.finfo(np.float32).tiny))
+
+        return np.argmax(logits + gumbel, axis=-1)
+
+
+class Adam:
+    """
+    Adam optimizer of the weights of a Network, updated in place.
+    """
+
+    def __init__(self, network, learning_rate=1e-3, beta1=0.9, beta2=0.999, epsilon=1e-8):
+        self.parameters = network.weights + network.biases
+        self.learning_rate = learning_rate
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.epsilon = epsilon
+        self.steps = 0
+        self.first_moments = [np.zeros_like(parameter) for parameter in self.parameters]
+        self.second_moments = [np.zeros_like(parameter) for parameter in self.parameters]
+
+    def step(self, weights_gradients, biases_gradients):
+        """
+        Apply one update.
+
+        :param weights_gradients: The gradients returned by
+                                  Network.backward.
+        :param biases_gradients: Idem.
+        :return: void
+        """
+
+        self.steps += 1
+        step_size = self.learning_rate * np.sqrt(1.0 - self.beta2 ** self.steps) / (1.0 - self.beta1 ** self.steps)
+        for (parameter, gradient, first_moment, second_moment) in zip(self.parameters,
+                                                                      weights_gradients + biases_gradients,
+                                                                      self.first_moments, self.second_moments):
+            first_moment *= self.beta1
+            first_moment += (1.0 - self.beta1) * gradient
+            second_moment *= self.beta2
+            second_moment += (1.0 - self.beta2) * gradient * gradient
+            parameter -= step_size * first_moment / (np.sqrt(second_moment) + self.epsilon)
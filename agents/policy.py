@@ -1,5 +1,7 @@
 import numpy as np
 
+import agents.storage as storage
+
 
 class Policy:
     def __init__(self):
@@ -15,12 +17,15 @@ class Policy:
                  substation.
         """
 
-    def improve(self, action_value_fn):
+    def improve(self, action_value_fn, states=None):
         """
         Returns another instance of Policy class which is at least
         as good as this one.
 
         :param action_value_fn: The action value array.
+        :param states: Optional collection of the states whose action
+                       values changed since the last improvement. If
+            given, the policy is only improved on these states.
         :return: void
         """
 
@@ -40,7 +45,7 @@ class EpsilonGreedy(Policy):
     An implementation of epsilon greedy policy.
     """
 
-    def __init__(self, state_space_size, action_space_size, epsilon):
+    def __init__(self, state_space_size, action_space_size, epsilon, sparse=False, action_mask=None):
         """
         Initialize the policy randomly. As a MDP has at least one
         deterministic optimal policy we map each state to only one
@@ -50,14 +55,27 @@ class EpsilonGreedy(Policy):
         :param state_space_size: The size of the state space.
         :param action_space_size:  The size of the action space.
         :param epsilon: The exploration probability.
+        :param sparse: If True, only the improved states are mapped to
+                       an action and the others act randomly. Use it
+            together with a sparse action value store when the state
+            space is too large to be allocated.
+        :param action_mask: Optional ActionMask. Both the exploration
+                            and the greedy actions are restricted to
+            its legal actions.
         """
 
         super().__init__()
 
-        self.policy = np.random.randint(0, action_space_size, state_space_size)
+        self.sparse = sparse
         self.state_space_size = state_space_size
         self.action_space_size = action_space_size
         self.epsilon = epsilon
+        self.action_mask = action_mask
+
+        if sparse:
+            self.policy = dict()
+        else:
+            self.policy = self.random_actions(state_space_size)
 
     def get_action(self, state: int) -> int:
         """
@@ -69,21 +87,116 @@ class EpsilonGreedy(Policy):
                  factor.
         """
         if np.random.random_sample() > self.epsilon:
-            return self.policy[state]
+            if not self.sparse:
+                action = self.policy[state]
+            else:
+                action = self.policy.get(state)
+            # The mask may have changed since the policy was improved.
+            if action is not None and (self.action_mask is None or self.action_mask.legal[action]):
+                return action
+
+        return self.random_actions()
+
+    def random_actions(self, size=None):
+        """
+        :param size: None for one action, or the number of actions.
+        :return: Actions drawn uniformly among the legal actions.
+        """
+
+        if self.action_mask is None:
+            return np.random.randint(self.action_space_size, size=size)
+
+        return self.action_mask.random_actions(size)
 
-        return np.random.randint(self.action_space_size)
+    def greedy_actions(self, action_values):
+        """
+        :param action_values: A row, or a 2D array of rows, of action
+                              values.
+        :return: The legal action of highest value of every row.
+        """
+
+        if self.action_mask is None:
+            return np.argmax(action_values, axis=-1)
+
+        return self.action_mask.greedy_actions(action_values)
 
-    def improve(self, action_value_fn):
+    def get_actions(self, states):
+        """
+        Get the actions of many states at once, exploring
+        independently for each of them.
+
+        :param states: Array of states.
+        :return: Array of actions.
+        """
+
+        if self.sparse:
+            return np.array([self.get_action(state) for state in states], np.int64)
+
+        actions = self.policy[np.asarray(states, np.int64)]
+        explore = np.random.random_sample(len(actions)) <= self.epsilon
+        if self.action_mask is not None:
+            explore |= ~self.action_mask.legal[actions]
+        actions[explore] = self.random_actions(np.count_nonzero(explore))
+
+        return actions
+
+    def improve(self, action_value_fn, states=None):
         """
         Given the action value array choose the action with the maximum
-        value for each state.
+        value for each state. The policy acts as a cache of the argmax
+        of each state, so when the states whose values changed are
+        given only their greedy action is recomputed.
 
         :param action_value_fn: An array of size state_space_size by
                                 action_space_size containing the value
-            of each action state pair. Normally this array comes from
-            the model which can evaluate it using Monte Carlo or other
-            learning algorithm.
+            of each action state pair, or a sparse store of the visited
+            states. Normally this array comes from the model which can
+            evaluate it using Monte Carlo or other learning algorithm.
+        :param states: Optional collection of the states whose action
+                       values changed since the last improvement.
         :return: void
         """
 
-        self.policy = np.argmax(action_value_fn, axis=1)
+        if states is not None:
+            self.improve_states(action_value_fn, states)
+            return
+
+        if storage.is_dense(action_value_fn) and not self.sparse:
+            self.policy = self.greedy_actions(action_value_fn)
+            return
+
+        if storage.is_quantized(action_value_fn) and not self.sparse:
+            # The scale of a row is positive: its greedy action is the one of the quantized values.
+            self.policy = self.greedy_actions(action_value_fn.values)
+            return
+
+        for (state, row) in storage.visited_rows(action_value_fn):
+            self.policy[state] = self.greedy_actions(row)
+
+    def improve_states(self, action_value_fn, states):
+        """
+        Recompute the greedy action of the given states only.
+
+        :param action_value_fn: The action value array or sparse store.
+        :param states: Collection of states to improve.
+        :return: void
+        """
+
+        if not states:
+            return
+
+        if storage.is_dense(action_value_fn) and not self.sparse:
+            states = np.fromiter(states, np.int64, len(states))
+            self.policy[states] = self.greedy_actions(action_value_fn[states])
+            return
+
+        if storage.is_quantized(action_value_fn) and not self.sparse:
+            states = np.fromiter(states, np.int64, len(states))
+            self.policy[states] = self.greedy_actions(action_value_fn.values[states])
+            return
+
+        dense = storage.is_dense(action_value_fn)
+        for state in states:
+            row = action_value_fn[state] if dense else action_value_fn.get(state)
+            if row is not None:
+                self.policy[state] = self.greedy_actions(row)
@@ -0,0 +1,255 @@
+import numpy as np
+
+
+def transition_dtype(state_dtype=np.int64):
+    """
+    :param state_dtype: The type of the encoded states.
+    :return: The structured type of a transition record.
+    """
+
+    return np.dtype([('state', state_dtype),
+                     ('action', np.int64),
+                     ('reward', np.float64),
+                     ('next_state', state_dtype),
+                     ('done', np.bool_)])
+
+
+class SumTree:
+    """
+    Binary tree whose leaves are the priorities of the transitions and
+    whose other nodes are the sums of their two children. Setting
+    priorities and finding the transitions at cumulative priorities
+    walk one path from the leaves to the root, O(log n) instead of the
+    O(n) of a cumulative sum over the buffer.
+
+    The tree is stored as one array: the root is the node 1, the
+    children of node i are the nodes 2i and 2i + 1, and the leaves are
+    the last half of the array.
+    """
+
+    def __init__(self, capacity):
+        """
+        Initialize a tree of zero priorities.
+
+        :param capacity: Number of leaves, rounded up to a power of 2.
+        """
+
+        self.leaf_count = 1 << (capacity - 1).bit_length()
+        self.depth = self.leaf_count.bit_length() - 1
+        self.nodes = np.zeros(2 * self.leaf_count, float)
+
+    def total(self):
+        """
+        :return: The sum of all priorities.
+        """
+
+        return self.nodes[1]
+
+    def get(self, indices):
+        """
+        :param indices: Array of leaf indices.
+        :return: The priorities of the leaves.
+        """
+
+        return self.nodes[self.leaf_count + np.asarray(indices, np.int64)]
+
+    def update(self, indices, priorities):
+        """
+        Set the priorities of leaves, then the sums of their ancestors,
+        level by level.
+
+        :param indices: Array of leaf indices. The last priority of an
+                        index appearing many times is kept.
+        :param priorities: Array of priorities, or one priority for
+                           all leaves.
+        :return: void
+        """
+
+        nodes = self.leaf_count + np.asarray(indices, np.int64)
+        self.nodes[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.nodes[nodes] = self.nodes[2 * nodes] + self.nodes[2 * nodes + 1]
+
+    def find(self, targets):
+        """
+        Find the leaves at cumulative priorities, going down from the
+        root to the left child if the target is below its sum, else to
+        the right child after removing the sum of the left one.
+
+        :param targets: Array of cumulative priorities in [0, total).
+        :return: The indices of the leaves.
+        """
+
+        targets = np.array(targets, float)
+        nodes = np.ones(len(targets), np.int64)
+        for _ in range(self.depth):
+            left_sums = self.nodes[2 * nodes]
+            right = targets >= left_sums
+            targets = np.where(right, targets - left_sums, targets)
+            nodes = 2 * nodes + right
+
+        return nodes - self.leaf_count
+
+
+class ReplayBuffer:
+    """
+    Fixed capacity ring buffer of (state, action, reward, next_state,
+    done) transitions, stored as one structured numpy array. Once full
+    the oldest transitions are overwritten.
+
+    The array can be backed by a memory-mapped .npy file to hold more
+    transitions than the memory, and the transitions can be sampled
+    uniformly or proportionally to their priority:
+
+        P(i) = p_i^alpha / sum_k p_k^alpha
+
+    where p_i is the absolute TD error of the transition when it was
+    last replayed. New transitions get the highest priority seen so
+    far so that they are replayed at least once. The priorities are
+    kept in a SumTree, so that sampling and updating them take
+    O(log n) per transition.
+
+    Prioritized sampling biases the learning toward the transitions of
+    high priority, which is corrected by the importance sampling
+    weights returned with the samples:
+
+        w_i = (N * P(i))^-beta / max_j w_j
+
+    the maximum being over the sampled transitions.
+    """
+
+    def __init__(self, capacity, state_dtype=np.int64, file_path=None, prioritized=False, alpha=0.6,
+                 min_priority=1e-6, beta=0.4):
+        """
+        Initialize an empty buffer.
+
+        :param capacity: Maximum number of stored transitions.
+        :param state_dtype: The type of the encoded states.
+        :param file_path: Optional .npy file backing the buffer.
+        :param prioritized: True for prioritized sampling, False for
+                            uniform sampling.
+        :param alpha: How much the priorities matter, 0 being uniform.
+        :param min_priority: Priority of the transitions without TD
+                             error, so they can still be sampled.
+        :param beta: How much the importance sampling weights correct
+                     the prioritized sampling, 1 correcting it fully.
+        """
+
+        assert capacity > 0
+
+        dtype = transition_dtype(state_dtype)
+        if file_path is None:
+            self.transitions = np.zeros(capacity, dtype)
+        else:
+            self.transitions = np.lib.format.open_memmap(file_path, mode='w+', dtype=dtype, shape=(capacity,))
+
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.min_priority = min_priority
+        self.beta = beta
+        self.position = 0
+        self.size = 0
+
+        """The priorities to the power alpha."""
+        self.priorities = SumTree(capacity) if prioritized else None
+        self.max_priority = 1.0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done):
+        """
+        Store a transition, overwriting the oldest one if the buffer is
+        full.
+
+        :return: void
+        """
+
+        self.transitions[self.position] = (state, action, reward, next_state, done)
+        if self.prioritized:
+            self.priorities.update([self.position], self.max_priority ** self.alpha)
+
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        """
+        Store many transitions given as parallel arrays.
+
+        :return: void
+        """
+
+        count = len(states)
+        if count > self.capacity:
+            (states, actions, rewards, next_states, dones) = [np.asarray(column)[-self.capacity:] for column in
+                                                              (states, actions, rewards, next_states, dones)]
+            count = self.capacity
+
+        indices = (self.position + np.arange(count)) % self.capacity
+        self.transitions['state'][indices] = states
+        self.transitions['action'][indices] = actions
+        self.transitions['reward'][indices] = rewards
+        self.transitions['next_state'][indices] = next_states
+        self.transitions['done'][indices] = dones
+        if self.prioritized:
+            self.priorities.update(indices, self.max_priority ** self.alpha)
+
+        self.position = (self.position + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+
+    def sample(self, batch_size):
+        """
+        Sample transitions with replacement.
+
+        :param batch_size: The number of transitions to sample.
+        :return: (indices, transitions, weights) where transitions is a
+                 structured array with the columns state, action,
+            reward, next_state and done, and weights are the importance
+            sampling weights of the transitions, all 1 if the sampling
+            is uniform.
+        """
+
+        assert self.size > 0
+
+        if not self.prioritized:
+            indices = np.random.randint(self.size, size=batch_size)
+            return indices, self.transitions[indices], np.ones(batch_size)
+
+        total = self.priorities.total()
+        targets = np.random.random_sample(batch_size) * total
+        # Rounding errors may reach the empty leaves after the last transition.
+        indices = np.minimum(self.priorities.find(targets), self.size - 1)
+
+        weights = np.power(self.size * self.priorities.get(indices) / total, -self.beta)
+        if batch_size > 0:
+            weights /= np.max(weights)
+
+        return indices, self.transitions[indices], weights
+
+    def update_priorities(self, indices, td_errors):
+        """
+        Set the priorities of replayed transitions.
+
+        :param indices: The indices returned by sample.
+        :param td_errors: The TD errors of the transitions.
+        :return: void
+        """
+
+        if not self.prioritized:
+            return
+
+        priorities = np.maximum(np.abs(td_errors), self.min_priority)
+        self.priorities.update(indices, np.power(priorities, self.alpha))
+        self.max_priority = max(self.max_priority, float(np.max(priorities)))
+
+    def flush(self):
+        """
+        Write a memory-mapped buffer to its file.
+
+        :return: void
+        """
+
+        if isinstance(self.transitions, np.memmap):
+            self.transitions.flush()
@@ -0,0 +1,49 @@
+import numpy as np
+
+
+def episode_weights(rewards, dones, reward_to_go=False):
+    """
+    Policy gradient weights of the samples collected by environments
+    stepped in lockstep, computed without looping over the samples.
+
+    The samples of an environment are its column, in time order; its
+    episodes are the runs of samples ended by a done flag. The last
+    episode of an environment is usually cut by the end of the
+    collection: its return is unknown, so its samples are not valid.
+
+    :param rewards: (T, M) array of the rewards of M environments
+                    during T steps.
+    :param dones: (T, M) boolean array of the ends of episodes.
+    :param reward_to_go: Weight a sample with the rewards following it
+                         in its episode instead of the whole return of
+                         the episode.
+    :return: (weights, valid, returns, lengths) where weights and valid
+             are flat arrays in environment major order, i.e. the order
+        of rewards.T.ravel(), and returns and lengths are the return
+        and length of every finished episode.
+    """
+
+    rewards = np.asarray(rewards, np.float64).T.ravel()
+    ends = np.asarray(dones, bool).T.copy()
+    finished = ends.ravel().copy()
+    # The collection cuts the last episode of every environment.
+    ends[:, -1] = True
+    ends = ends.ravel()
+
+    starts = np.concatenate(([True], ends[:-1]))
+    segments = np.cumsum(starts) - 1
+    end_indices = np.flatnonzero(ends)
+    finished_segments = finished[end_indices]
+    valid = finished_segments[segments]
+
+    returns = np.add.reduceat(rewards, np.flatnonzero(starts))
+    if reward_to_go:
+        # Suffix sums, minus the suffix sum following the end of the episode.
+        suffix_sums = np.append(np.cumsum(rewards[::-1])[::-1], 0.0)
+        weights = suffix_sums[:-1] - suffix_sums[end_indices + 1][segments]
+    else:
+        weights = returns[segments]
+
+    lengths = np.diff(np.append(np.flatnonzero(starts), len(rewards)))
+
+    return weights, valid, returns[finished_segments], lengths[finished_segments]
@@ -0,0 +1,496 @@
+import collections
+
+import numpy as np
+
+"""Default amount of memory, in bytes, an action-value function may use."""
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+
+"""Supported policies to choose the state to forget once the memory budget is reached."""
+EVICTION_POLICIES = ('lru', 'fifo', 'none')
+
+"""Rough per-row bookkeeping cost of the sparse store (ndarray header and dictionary entry)."""
+SPARSE_ROW_OVERHEAD = 200
+
+"""
+Supported types of the action values. 'int16' quantizes them with a
+scale per state, see QuantizedActionValueStore.
+"""
+VALUE_DTYPES = ('float64', 'float32', 'float16', 'int16')
+
+"""Largest magnitude of a quantized action value."""
+QUANTIZATION_LEVELS = 32767
+"""Initial scale of the quantized rows, i.e. their precision until a larger value is written."""
+DEFAULT_MIN_SCALE = 1e-4
+"""Factor by which the scale of a row exceeds the one its largest value needs, when it grows."""
+SCALE_HEADROOM = 1.25
+
+
+class SparseActionValueStore:
+    """
+    Action-value function storage which holds only the rows of the
+    visited states. It keeps the row indexing semantics of a dense
+    (state_space_size, action_space_size) array:
+
+        store[state]          -> array of action_space_size values
+        store[state][action]  -> value of the (state, action) pair
+
+    A row is created, filled with zeros, the first time its state is
+    indexed. Once max_states rows are stored, inserting a new state
+    evicts another one according to the eviction policy:
+
+        'lru'  - forget the least recently indexed state,
+        'fifo' - forget the oldest inserted state,
+        'none' - refuse the insertion by raising MemoryError.
+    """
+
+    def __init__(self, action_space_size, max_states=None, eviction='lru', dtype=float):
+        """
+        Initialize an empty store.
+
+        :param action_space_size: The size of the action space.
+        :param max_states: Maximum number of stored states. None means
+                           unbounded.
+        :param eviction: One of EVICTION_POLICIES.
+        :param dtype: The type of the stored action values.
+        """
+
+        assert eviction in EVICTION_POLICIES
+        assert max_states is None or max_states > 0
+
+        self.action_space_size = action_space_size
+        self.max_states = max_states
+        self.eviction = eviction
+        self.dtype = np.dtype(dtype)
+        self.evictions = 0
+
+        self.rows = collections.OrderedDict()
+
+    def __getitem__(self, state):
+        row = self.rows.get(state)
+        if row is None:
+            return self.insert(state)
+
+        if self.eviction == 'lru':
+            self.rows.move_to_end(state)
+
+        return row
+
+    def __setitem__(self, state, values):
+        self[state][:] = values
+
+    def __contains__(self, state):
+        return state in self.rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    @property
+    def shape(self):
+        return len(self.rows), self.action_space_size
+
+    @property
+    def nbytes(self):
+        return len(self.rows) * self.action_space_size * self.dtype.itemsize
+
+    def get(self, state, default=None):
+        """
+        Look up the row of a state without inserting it nor changing
+        its eviction order.
+
+        :param state: The state to look up.
+        :param default: Returned if the state was never visited.
+        :return: The row of the state or default.
+        """
+
+        return self.rows.get(state, default)
+
+    def items(self):
+        """
+        :return: An iterable of (state, row) pairs for all stored
+                 states.
+        """
+
+        return self.rows.items()
+
+    def insert(self, state):
+        """
+        Store a zero row for the state, evicting another state if the
+        store is full.
+
+        :param state: The state to insert.
+        :return: The new row.
+        """
+
+        if self.max_states is not None and len(self.rows) >= self.max_states:
+            if self.eviction == 'none':
+                raise MemoryError('The action-value store is full ({} states).'.format(self.max_states))
+
+            self.rows.popitem(last=False)
+            self.evictions += 1
+
+        row = np.zeros(self.action_space_size, self.dtype)
+        self.rows[state] = row
+
+        return row
+
+
+class QuantizedActionValueStore:
+    """
+    Dense action-value function storage quantized to int16, with a
+    scale per state:
+
+        Q(s, a) = values[s, a] * scales[s]
+
+    It keeps the row indexing semantics of a dense array: store[state]
+    is a QuantizedRow which reads and writes the action values. The
+    scale of a row starts at min_scale and grows when a value out of its
+    range is written, the row being then requantized. The precision of
+    a row is relative to its largest value, max |Q(s, .)| / 32767, and a
+    table takes a quarter of the memory of a float64 one.
+
+    As a sparse store, it iterates over the states written at least
+    once only.
+    """
+
+    def __init__(self, state_space_size, action_space_size, min_scale=DEFAULT_MIN_SCALE):
+        """
+        :param state_space_size: The size of the state space.
+        :param action_space_size: The size of the action space.
+        :param min_scale: The initial scale of the rows.
+        """
+
+        assert min_scale > 0
+
+        self.action_space_size = action_space_size
+        """Type of the dequantized action values."""
+        self.dtype = np.dtype(float)
+
+        self.values = np.zeros((state_space_size, action_space_size), np.int16)
+        self.scales = np.full(state_space_size, min_scale)
+        self.written = np.zeros(state_space_size, bool)
+
+    def __getitem__(self, state):
+        return QuantizedRow(self, state)
+
+    def __setitem__(self, state, values):
+        self[state][:] = values
+
+    def __contains__(self, state):
+        return bool(self.written[state])
+
+    def __len__(self):
+        return int(np.count_nonzero(self.written))
+
+    def __iter__(self):
+        return iter(np.flatnonzero(self.written).tolist())
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.scales.nbytes + self.written.nbytes
+
+    def get(self, state, default=None):
+        """
+        :param state: The state to look up.
+        :param default: Returned if the state was never written.
+        :return: The action values of the state or default.
+        """
+
+        return self.row(state) if self.written[state] else default
+
+    def items(self):
+        """
+        :return: An iterable of (state, action values) pairs for the
+                 written states.
+        """
+
+        return ((state, self.row(state)) for state in self)
+
+    def row(self, state):
+        """
+        :return: The action values of a state.
+        """
+
+        return self.values[state] * self.scales[state]
+
+    def gather_rows(self, states):
+        """
+        :param states: Array of states.
+        :return: 2-D array with the action values of each state.
+        """
+
+        states = np.asarray(states, np.int64)
+        return self.values[states] * self.scales[states, np.newaxis]
+
+    def gather(self, states, actions):
+        """
+        :param states: Array of states.
+        :param actions: Array of actions, parallel to states.
+        :return: Array of the action values of the (state, action) pairs.
+        """
+
+        states = np.asarray(states, np.int64)
+        return self.values[states, np.asarray(actions, np.int64)] * self.scales[states]
+
+    def assign(self, states, actions, action_values):
+        """
+        Write the action values of (state, action) pairs. The rows too
+        small for their new values are first requantized with larger
+        scales.
+
+        :param states: Array of states.
+        :param actions: Array of actions, parallel to states.
+        :param action_values: Array of action values, parallel to states.
+        :return: void
+        """
+
+        states = np.asarray(states, np.int64)
+        actions = np.asarray(actions, np.int64)
+        action_values = np.asarray(action_values, float)
+
+        required_scales = np.abs(action_values) / QUANTIZATION_LEVELS
+        grow = required_scales > self.scales[states]
+        if np.any(grow):
+            (grown_states, inverse) = np.unique(states[grow], return_inverse=True)
+            scales = self.scales[grown_states].copy()
+            np.maximum.at(scales, inverse, SCALE_HEADROOM * required_scales[grow])
+            self.values[grown_states] = np.rint(self.values[grown_states] *
+                                                (self.scales[grown_states] / scales)[:, np.newaxis])
+            self.scales[grown_states] = scales
+
+        self.values[states, actions] = np.clip(np.rint(action_values / self.scales[states]),
+                                               -QUANTIZATION_LEVELS, QUANTIZATION_LEVELS)
+        self.written[states] = True
+
+
+class QuantizedRow:
+    """
+    The row of a state of a QuantizedActionValueStore, read and written
+    like an array of action values:
+
+        row[action], row[action] = value, row.fill(0), np.argmax(row)
+    """
+
+    def __init__(self, store, state):
+        self.store = store
+        self.state = state
+
+    def __getitem__(self, actions):
+        return self.store.row(self.state)[actions]
+
+    def __setitem__(self, actions, values):
+        actions = np.atleast_1d(np.arange(self.store.action_space_size)[actions])
+        values = np.broadcast_to(np.asarray(values, float), actions.shape)
+        self.store.assign(np.full(actions.shape, self.state, np.int64), actions, values)
+
+    def __len__(self):
+        return self.store.action_space_size
+
+    def __array__(self, dtype=None, copy=None):
+        row = self.store.row(self.state)
+        return row if dtype is None else row.astype(dtype)
+
+    def fill(self, value):
+        self[:] = value
+
+
+def create_action_value_store(state_space_size, action_space_size, backend='auto',
+                              memory_budget=DEFAULT_MEMORY_BUDGET, eviction='lru', dtype=float):
+    """
+    Create the storage of an action-value function.
+
+    :param state_space_size: The size of the state space.
+    :param action_space_size: The size of the action space.
+    :param backend: 'dense' for a numpy array, 'sparse' for a
+                    SparseActionValueStore or 'auto' to choose the dense
+        array only if it fits in the memory budget.
+    :param memory_budget: Maximum memory in bytes. None means unbounded.
+    :param eviction: Eviction policy of the sparse store.
+    :param dtype: The type of the stored action values, one of
+                  VALUE_DTYPES. A dense int16 table is a
+        QuantizedActionValueStore, a sparse store keeps float32 rows
+        instead.
+    :return: An object indexable by state then by action.
+    """
+
+    assert backend in ('auto', 'dense', 'sparse')
+    assert np.dtype(dtype).name in VALUE_DTYPES
+
+    quantized = np.dtype(dtype) == np.int16
+    itemsize = np.dtype(dtype).itemsize
+    if backend == 'auto':
+        dense_bytes = state_space_size * action_space_size * itemsize
+        backend = 'dense' if memory_budget is None or dense_bytes <= memory_budget else 'sparse'
+
+    if backend == 'dense' and quantized:
+        return QuantizedActionValueStore(state_space_size, action_space_size)
+
+    if backend == 'dense':
+        return np.zeros((state_space_size, action_space_size), dtype)
+
+    if quantized:
+        dtype = np.float32
+        itemsize = np.dtype(dtype).itemsize
+
+    max_states = None
+    if memory_budget is not None:
+        max_states = max(1, memory_budget // (action_space_size * itemsize + SPARSE_ROW_OVERHEAD))
+
+    return SparseActionValueStore(action_space_size, max_states, eviction, dtype)
+
+
+def is_dense(action_value_fn) -> bool:
+    """
+    :param action_value_fn: An action-value function storage.
+    :return: True if it is a dense numpy array.
+    """
+
+    return isinstance(action_value_fn, np.ndarray)
+
+
+def is_sparse(action_value_fn) -> bool:
+    """
+    :param action_value_fn: An action-value function storage.
+    :return: True if it is a SparseActionValueStore, which holds the
+             visited states only.
+    """
+
+    return isinstance(action_value_fn, SparseActionValueStore)
+
+
+def is_quantized(action_value_fn) -> bool:
+    """
+    :param action_value_fn: An action-value function storage.
+    :return: True if it is a QuantizedActionValueStore.
+    """
+
+    return isinstance(action_value_fn, QuantizedActionValueStore)
+
+
+def saturate(action_values, dtype):
+    """
+    :param action_values: Array of action values.
+    :param dtype: The type they are stored in.
+    :return: The action values clipped to the finite range of a float
+             type, e.g. the exploding Monte-Carlo returns in float16.
+    """
+
+    dtype = np.dtype(dtype)
+    if dtype.kind != 'f' or dtype.itemsize >= 8:
+        return action_values
+
+    largest = np.finfo(dtype).max
+    return np.clip(action_values, -largest, largest)
+
+
+def visited_rows(action_value_fn):
+    """
+    Iterate over the (state, row) pairs of an action-value function
+    storage. For a dense array every state is returned.
+
+    :param action_value_fn: An action-value function storage.
+    :return: An iterable of (state, row) pairs.
+    """
+
+    if is_dense(action_value_fn):
+        return enumerate(action_value_fn)
+
+    return action_value_fn.items()
+
+
+def blend(action_value_fn, states, actions, targets, learning_rate):
+    """
+    Move the action values toward their targets:
+
+        Q(s, a) <-- Q(s, a) + alpha(target - Q(s, a))
+
+    The updates are applied as if one after the other in the given
+    order, so a (state, action) pair appearing k times is updated k
+    times. On a dense array all updates are done in one vectorized
+    pass, using the closed form of k successive updates:
+
+        Q <-- (1 - alpha)^k Q + sum_j alpha(1 - alpha)^(k - j) target_j
+
+    :param action_value_fn: A dense array or a sparse store.
+    :param states: Array of states.
+    :param actions: Array of actions, parallel to states.
+    :param targets: Array of targets, parallel to states.
+    :param learning_rate: The learning rate alpha.
+    :return: void
+    """
+
+    if len(targets) == 0:
+        return
+
+    if not is_dense(action_value_fn) and not is_quantized(action_value_fn):
+        for (state, action, target) in zip(states, actions, targets):
+            row = action_value_fn[state]
+            row[action] += learning_rate * (target - row[action])
+        return
+
+    # The updates are computed in float64 whatever the type of the action values.
+    action_space_size = action_value_fn.shape[1]
+    keys = np.asarray(states, np.int64) * action_space_size + np.asarray(actions, np.int64)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    sorted_targets = np.asarray(targets, float)[order]
+
+    starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+    counts = np.diff(np.append(starts, len(sorted_keys)))
+    # Number of later updates of the same pair, for each update.
+    remaining = np.repeat(starts + counts, counts) - np.arange(len(sorted_keys)) - 1
+
+    decay = 1 - learning_rate
+    weighted_targets = np.add.reduceat(learning_rate * np.power(decay, remaining) * sorted_targets, starts)
+
+    unique_keys = sorted_keys[starts]
+    unique_states = unique_keys // action_space_size
+    unique_actions = unique_keys % action_space_size
+    if is_quantized(action_value_fn):
+        action_value_fn.assign(unique_states, unique_actions, np.power(decay, counts) *
+                               action_value_fn.gather(unique_states, unique_actions) + weighted_targets)
+        return
+
+    action_value_fn[unique_states, unique_actions] = saturate(np.power(decay, counts) *
+                                                              action_value_fn[unique_states, unique_actions] +
+                                                              weighted_targets, action_value_fn.dtype)
+
+
+def gather_rows(action_value_fn, states):
+    """
+    :param action_value_fn: A dense array or a sparse store.
+    :param states: Array of states.
+    :return: 2-D array with the action values of each state, one row
+             per state.
+    """
+
+    if is_dense(action_value_fn):
+        return action_value_fn[np.asarray(states, np.int64)]
+
+    if is_quantized(action_value_fn):
+        return action_value_fn.gather_rows(states)
+
+    return np.array([action_value_fn[state] for state in states]).reshape(len(states), -1)
+
+
+def gather(action_value_fn, states, actions):
+    """
+    :param action_value_fn: A dense array or a sparse store.
+    :param states: Array of states.
+    :param actions: Array of actions, parallel to states.
+    :return: Array of the action values of the (state, action) pairs.
+    """
+
+    if is_dense(action_value_fn):
+        return action_value_fn[np.asarray(states, np.int64), np.asarray(actions, np.int64)]
+
+    if is_quantized(action_value_fn):
+        return action_value_fn.gather(states, actions)
+
+    return np.array([action_value_fn[state][action] for (state, action) in zip(states, actions)], float)
@@ -0,0 +1,171 @@
+import zlib
+
+import numpy as np
+
+"""Default memory in bytes of the weights of a tile coded action-value function."""
+DEFAULT_MEMORY_BUDGET = 32 * 1024 * 1024
+
+"""Minimum number of lines of a tiling, when not given."""
+MIN_LINES_PER_TILING = 4
+
+"""Odd constant of the final mixing of the hashes (splitmix64)."""
+MIX_MULTIPLIER = np.uint64(0xbf58476d1ce4e5b9)
+
+
+def mix(hashes):
+    """
+    :param hashes: A uint64 array.
+    :return: The hashes with their bits mixed, so that their low bits
+             depend on all the bits.
+    """
+
+    hashes = hashes ^ (hashes >> np.uint64(31))
+    hashes = hashes * MIX_MULTIPLIER
+
+    return hashes ^ (hashes >> np.uint64(29))
+
+
+class TileCoder:
+    """
+    Hash the features of an observation into a fixed number of buckets
+    with overlapping tilings.
+
+    Every tiling looks at its own subset of lines, a window of a random
+    order of the lines, the windows of the tilings being spread over
+    all the lines so that each of them is seen by a tiling: their
+    capacity usage, discretized in bins of usage_bin_width shifted by
+    the offset of the tiling, their status and the time of day in bins
+    of time_bin_minutes, also shifted. A tiling activates the bucket of
+    the hash of these features. Two observations close to each other
+    share the buckets of most tilings, which generalizes the learning.
+    One more feature hashes the topology of the substations with the
+    status of all the lines.
+
+    A step costs O(number_tilings * lines_per_tiling) whatever the size
+    of the state space.
+    """
+
+    def __init__(self, number_power_lines, number_buckets, number_tilings=8, lines_per_tiling=None,
+                 usage_bin_width=0.1, max_usage=2.0, time_bin_minutes=60, seed=0):
+        """
+        :param number_power_lines: The number of lines of the grid.
+        :param number_buckets: The number of buckets hashed into.
+        :param number_tilings: The number of usage tilings.
+        :param lines_per_tiling: The number of lines of a tiling, by
+            default enough for the tilings to see all the lines, and at
+            least MIN_LINES_PER_TILING.
+        :param usage_bin_width: The width of the capacity usage bins.
+        :param max_usage: Capacity usage above which the usages are
+                          all in the same bin.
+        :param time_bin_minutes: The width of the time of day bins.
+        :param seed: Seed of the subsets of lines and of the hashes.
+        """
+
+        assert number_buckets > 0
+        assert number_tilings > 0
+        assert usage_bin_width > 0
+        assert time_bin_minutes > 0
+
+        random_state = np.random.RandomState(seed)
+        if lines_per_tiling is None:
+            lines_per_tiling = max(MIN_LINES_PER_TILING, -(-number_power_lines // number_tilings))
+        lines_per_tiling = min(lines_per_tiling, number_power_lines)
+
+        self.number_power_lines = number_power_lines
+        self.number_buckets = number_buckets
+        self.number_tilings = number_tilings
+        self.usage_bin_width = usage_bin_width
+        self.max_usage = max_usage
+        self.time_bin_minutes = time_bin_minutes
+        """Number of active features of an observation, i.e. of buckets activated."""
+        self.number_features = number_tilings + 1
+
+        self.lines_per_tiling = lines_per_tiling
+        """(number_tilings, lines_per_tiling) lines of every tiling, windows of a random cyclic order of the lines."""
+        order = random_state.permutation(number_power_lines)
+        starts = np.arange(number_tilings) * number_power_lines // number_tilings
+        self.tiling_lines = order[(starts[:, np.newaxis] + np.arange(lines_per_tiling)) % number_power_lines]
+        """Offset of every tiling, a fraction of a bin."""
+        self.offsets = np.arange(number_tilings) / number_tilings
+
+        """Odd multipliers of the features of the hashes, one row per tiling."""
+        self.multipliers = random_state.randint(0, 2 ** 62, (number_tilings, 2 * lines_per_tiling + 2),
+                                                dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+        self.topology_multiplier = np.uint64(random_state.randint(0, 2 ** 62)) * np.uint64(2) + np.uint64(1)
+
+    def features(self, lines_usage, lines_status, topology, minutes=0):
+        """
+        :param lines_usage: Capacity usage of the lines.
+        :param lines_status: Status of the lines, 1 if connected.
+        :param topology: Node of the elements of the substations.
+        :param minutes: Number of minutes since midnight.
+        :return: The number_features buckets activated, an int64
+                 array.
+        """
+
+        usage = np.minimum(np.asarray(lines_usage, float), self.max_usage)[self.tiling_lines]
+        usage_bins = np.floor(usage / self.usage_bin_width + self.offsets[:, np.newaxis])
+        status = np.asarray(lines_status)[self.tiling_lines]
+        time_bins = np.floor(minutes / self.time_bin_minutes + self.offsets)
+
+        codes = np.concatenate((usage_bins, status, time_bins[:, np.newaxis],
+                                np.arange(self.number_tilings)[:, np.newaxis]), axis=1).astype(np.int64)
+        hashes = mix(np.sum(codes.astype(np.uint64) * self.multipliers, axis=1, dtype=np.uint64))
+
+        topology_codes = np.concatenate((np.asarray(topology), np.asarray(lines_status))).astype(np.int8)
+        topology_hash = mix(np.array([zlib.crc32(topology_codes.tobytes())], np.uint64) * self.topology_multiplier)
+
+        return (np.concatenate((hashes, topology_hash)) % np.uint64(self.number_buckets)).astype(np.int64)
+
+
+class LinearActionValues:
+    """
+    Linear action-value function of the active features of a
+    TileCoder: the value of an action is the sum of its weights in the
+    active buckets. The weights are a fixed (number_buckets,
+    action_space_size) array.
+    """
+
+    def __init__(self, number_buckets, action_space_size, learning_rate, discount, dtype=np.float64):
+        """
+        :param number_buckets: The number of buckets of the tile coder.
+        :param action_space_size: The size of the action space.
+        :param learning_rate: The learning rate, shared by the active
+                              features of an update.
+        :param discount: The discount of the next action values.
+        :param dtype: The type of the weights.
+        """
+
+        self.weights = np.zeros((number_buckets, action_space_size), dtype)
+        self.alpha = learning_rate
+        self.gamma = discount
+
+    def action_values(self, features):
+        """
+        :param features: The active buckets of an observation.
+        :return: The value of every action.
+        """
+
+        return self.weights[features].sum(axis=0)
+
+    def learn(self, features, action, reward, next_value=None):
+        """
+        Q-learning or Sarsa update of the weights of the active
+        features towards
+
+            R + gamma*next_value    or    R if next_value is None.
+
+        :param features: The active buckets of the state.
+        :param action: The applied action.
+        :param reward: The obtained reward.
+        :param next_value: The value of the next state, None if the
+                           transition ends the episode.
+        :return: The TD error.
+        """
+
+        target = reward if next_value is None else reward + self.gamma * next_value
+        td_error = target - self.weights[features, action].sum()
+        # Buckets may collide within a state: every occurrence gets the update.
+        np.add.at(self.weights, (features, action), self.alpha / len(features) * td_error)
+
+        return td_error
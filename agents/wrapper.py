@@ -1,26 +1,65 @@
-import pypownet.environment
+import functools
+
 import numpy as np
 
+import agents.encoder as encoder
+import environments.run_env as run_env
+import environments.surrogate as surrogate
+
+
+@functools.lru_cache(maxsize=None)
+def default_encoder(number_power_lines) -> encoder.StateEncoder:
+    """
+    :param number_power_lines: The number of lines of the grid.
+    :return: The encoder used when none is given, which considers a
+             line as 1 if its capacity usage is greater than 100%.
+    """
+
+    return encoder.StateEncoder(number_power_lines)
 
-def observation_to_state(observation: pypownet.environment.Observation) -> int:
+
+def observation_to_state(observation: run_env.Observation, state_encoder=None):
     """
-    Given the observations on environment, deduct the state. In this
-    implementation all lines with a charge level greater than 70%
-    is considered as 1 and others as 0.
+    Given the observations on environment, deduct the state. By
+    default all lines with a charge level greater than 100% are
+    considered as 1 and others as 0. Give a state encoder to use other
+    thresholds or more levels.
 
     :param observation: Observations of the environment.
-    :return: The state as an integer.
+    :param state_encoder: Optional StateEncoder.
+    :return: The state as an integer, or bytes for wide encoders.
     """
 
-    assert isinstance(observation, pypownet.environment.Observation)
+    assert isinstance(observation, (run_env.Observation, surrogate.SurrogateObservation))
     lines_usage = observation.get_lines_capacity_usage()
-    binary_lines_usage = np.greater(lines_usage, 1.0)
 
-    state = 0
-    for bit in binary_lines_usage:
-        state = (state << 1) | bit
+    if state_encoder is None:
+        state_encoder = default_encoder(len(lines_usage))
+
+    return state_encoder.encode(lines_usage)
+
+
+def observation_to_features(observation):
+    """
+    The raw features of an observation for function approximation:
+    the lines capacity usage, the lines status and the nodes of the
+    elements of the substations.
+
+    :param observation: Observations of the environment.
+    :return: A float32 array.
+    """
+
+    assert isinstance(observation, (run_env.Observation, surrogate.SurrogateObservation))
+
+    if isinstance(observation, surrogate.SurrogateObservation):
+        lines_status = observation.get_lines_status()
+        topology = observation.get_topology()
+    else:
+        lines_status = observation.lines_status
+        topology = np.concatenate((observation.productions_nodes, observation.loads_nodes,
+                                   observation.lines_or_nodes, observation.lines_ex_nodes))
 
-    return state
+    return np.concatenate((observation.get_lines_capacity_usage(), lines_status, topology)).astype(np.float32)
 
 
 def agents_action_to_envs_action(action, agents_action):
@@ -34,7 +73,7 @@ def agents_action_to_envs_action(action, agents_action):
     :return: An instance of pypownet.game.Action
     """
 
-    act = np.zeros(len(action.get_node_splitting_subaction()), np.int)
+    act = np.zeros(len(action.get_node_splitting_subaction()), int)
     act[agents_action] = 1
 
     action.set_node_splitting_subaction(act)
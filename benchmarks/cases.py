@@ -0,0 +1,200 @@
+import itertools
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+import agents.agent
+import agents.encoder as encoder
+import agents.model as model
+import agents.policy as policy
+import agents.wrapper as wrapper
+import environments.surrogate as surrogate
+from runners.runner import CustomRunner
+
+"""Number of lines of the IEEE 14, 30 and 118 bus grids."""
+NUMBER_POWER_LINES = (20, 41, 186)
+"""Number of (substations, productions, loads) of the random grids standing in for the IEEE 30 and 118 bus grids."""
+RANDOM_GRIDS = {41: (30, 6, 21), 186: (118, 54, 99)}
+STATE_SPACE_SIZES = (1024, 65536)
+ACTION_SPACE_SIZES = (56, 512)
+EPISODE_LENGTHS = (10, 100, 1000)
+
+"""Number of states or observations processed by one run of the per state cases."""
+BATCH_SIZE = 1000
+
+
+def surrogate_environment(number_power_lines):
+    """
+    :return: A surrogate environment of the IEEE 14 bus grid, or of a
+             random grid of the size of the IEEE 30 or 118 bus grid.
+    """
+
+    if number_power_lines == 20:
+        return surrogate.SurrogateEnvironment()
+
+    (number_substations, number_prods, number_loads) = RANDOM_GRIDS[number_power_lines]
+    return surrogate.SurrogateEnvironment(surrogate.Grid.random(number_substations, number_power_lines, number_prods,
+                                                                number_loads))
+
+
+def observations(environment, count=BATCH_SIZE, seed=0):
+    """
+    :return: A list of observation arrays of the surrogate environment,
+             whose lines capacity usage is drawn at random around 100%.
+    """
+
+    random = np.random.RandomState(seed)
+    observation = environment.reset()
+    usage_slice = environment.observation_space.lines_capacity_usage_slice
+
+    observation_arrays = list()
+    for _ in range(count):
+        observation_array = observation.copy()
+        observation_array[usage_slice] = random.uniform(0.5, 1.5, environment.grid.number_power_lines)
+        observation_arrays.append(observation_array)
+
+    return observation_arrays
+
+
+def observation_to_state(number_power_lines):
+    state_encoder = encoder.StateEncoder(number_power_lines)
+    environment = surrogate_environment(number_power_lines)
+    surrogate_observations = [environment.observation_space.array_to_observation(observation) for observation in
+                              observations(environment)]
+
+    def run():
+        for observation in surrogate_observations:
+            wrapper.observation_to_state(observation, state_encoder)
+
+    return run, len(surrogate_observations)
+
+
+def act(number_power_lines):
+    environment = surrogate_environment(number_power_lines)
+    agent = agents.agent.QLearning(environment)
+    observation_arrays = observations(environment)
+
+    def run():
+        for observation in observation_arrays:
+            agent.act(observation)
+
+    return run, len(observation_arrays)
+
+
+def monte_carlo_learn(state_space_size, action_space_size, episode_length):
+    mdp = model.MonteCarlo(state_space_size, action_space_size, 0.1, 10, 0.8)
+    random = np.random.RandomState(0)
+    history = list(zip(random.randint(state_space_size, size=episode_length).tolist(),
+                       random.randint(action_space_size, size=episode_length).tolist(),
+                       random.uniform(-1.0, 5.0, episode_length).tolist()))
+
+    def run():
+        mdp.learn(history)
+
+    return run, episode_length
+
+
+def temporal_difference_learn(state_space_size, action_space_size, episode_length):
+    mdp = model.TemporalDifference(state_space_size, action_space_size, 0.1, 10, 0.8)
+    random = np.random.RandomState(0)
+    events = list(zip(random.randint(state_space_size, size=episode_length + 1).tolist(),
+                      random.randint(action_space_size, size=episode_length + 1).tolist(),
+                      random.uniform(-1.0, 5.0, episode_length + 1).tolist()))
+    histories = [[events[i + 1], events[i]] for i in range(episode_length)]
+
+    def run():
+        for history in histories:
+            mdp.learn(history)
+
+    return run, episode_length
+
+
+def epsilon_greedy_get_action(state_space_size, action_space_size):
+    epsilon_greedy = policy.EpsilonGreedy(state_space_size, action_space_size, 0.1)
+    states = np.random.RandomState(0).randint(state_space_size, size=BATCH_SIZE).tolist()
+
+    def run():
+        for state in states:
+            epsilon_greedy.get_action(state)
+
+    return run, len(states)
+
+
+def epsilon_greedy_improve(state_space_size, action_space_size, touched_states):
+    epsilon_greedy = policy.EpsilonGreedy(state_space_size, action_space_size, 0.1)
+    action_value_fn = np.random.RandomState(0).random_sample((state_space_size, action_space_size))
+    if touched_states == 'all':
+        states = None
+        operations = state_space_size
+    else:
+        states = set(np.random.RandomState(1).randint(state_space_size, size=touched_states).tolist())
+        operations = len(states)
+
+    def run():
+        epsilon_greedy.improve(action_value_fn, states)
+
+    return run, operations
+
+
+def runner_step(number_power_lines, agent):
+    logging.getLogger('pypownet').setLevel(logging.ERROR)
+    log_dir = tempfile.mkdtemp(prefix='l2rpn_benchmark')
+
+    environment = surrogate_environment(number_power_lines)
+    runner = CustomRunner(environment, getattr(agents.agent, agent)(environment),
+                          log_file_path=os.path.join(log_dir, 'runner.log'), machine_log_file_path=None)
+    state = {'observation': environment.reset()}
+
+    def run():
+        observation = state['observation']
+        for _ in range(BATCH_SIZE // 10):
+            observation = runner.step(observation)[0]
+        state['observation'] = observation
+
+    return run, BATCH_SIZE // 10
+
+
+def surrogate_step_batch(batch_size):
+    surrogate_environment = surrogate.SurrogateEnvironment(batch_size=batch_size)
+    surrogate_environment.reset_batch()
+    actions = np.zeros((batch_size, surrogate_environment.action_space.action_length), int)
+
+    def run():
+        for _ in range(10):
+            (_, _, done, _) = surrogate_environment.step_batch(actions)
+            if np.any(done):
+                surrogate_environment.reset_batch(done)
+
+    return run, 10 * batch_size
+
+
+def grid(**values):
+    """
+    :return: The list of the params dicts of all the combinations of
+             the given values.
+    """
+
+    return [dict(zip(values, combination)) for combination in itertools.product(*values.values())]
+
+
+"""The benchmark cases: (name, setup, list of params)."""
+CASES = [
+    ('observation_to_state', observation_to_state, grid(number_power_lines=NUMBER_POWER_LINES)),
+    ('CustomAgent.act', act, grid(number_power_lines=NUMBER_POWER_LINES)),
+    ('MonteCarlo.learn', monte_carlo_learn, grid(state_space_size=STATE_SPACE_SIZES,
+                                                 action_space_size=ACTION_SPACE_SIZES,
+                                                 episode_length=EPISODE_LENGTHS)),
+    ('TemporalDifference.learn', temporal_difference_learn, grid(state_space_size=STATE_SPACE_SIZES,
+                                                                 action_space_size=ACTION_SPACE_SIZES,
+                                                                 episode_length=EPISODE_LENGTHS)),
+    ('EpsilonGreedy.get_action', epsilon_greedy_get_action, grid(state_space_size=STATE_SPACE_SIZES,
+                                                                 action_space_size=ACTION_SPACE_SIZES)),
+    ('EpsilonGreedy.improve', epsilon_greedy_improve, grid(state_space_size=STATE_SPACE_SIZES,
+                                                           action_space_size=ACTION_SPACE_SIZES,
+                                                           touched_states=('all', 100))),
+    ('CustomRunner.step', runner_step, grid(number_power_lines=NUMBER_POWER_LINES,
+                                            agent=('PolicyIteration', 'Sarsa', 'QLearning'))),
+    ('SurrogateEnvironment.step_batch', surrogate_step_batch, grid(batch_size=(1, 64, 1024))),
+]
@@ -0,0 +1,133 @@
+import json
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+
+"""Relative change of throughput or peak memory flagged as a regression."""
+DEFAULT_THRESHOLD = 0.2
+
+"""Peak memory growth in bytes below which a case never regresses, whatever its relative change."""
+MIN_MEMORY_GROWTH = 64 * 1024
+
+
+def case_key(name, params):
+    """
+    :return: The identifier of a benchmark case in the results, e.g.
+             'MonteCarlo.learn[action_space_size=56,episode_length=100]'.
+    """
+
+    return '{}[{}]'.format(name, ','.join('{}={}'.format(key, params[key]) for key in sorted(params)))
+
+
+def measure(setup, repeat=5, min_time=0.2):
+    """
+    Time and trace a benchmark case.
+
+    The setup returns (run, operations): run performs operations
+    operations, e.g. one learn over an episode of 100 steps is 100
+    operations. run is called in a loop for at least min_time seconds
+    and the best of repeat loops gives the throughput. The peak memory
+    is the highest memory traced while setting the case up and
+    running it once, after a first untraced warm up run.
+
+    :param setup: A function building the case.
+    :param repeat: The number of timed loops.
+    :param min_time: The minimum duration of a timed loop in seconds.
+    :return: A dict with the throughput in operations per second, the
+             best time per operation in seconds and the peak memory in
+        bytes.
+    """
+
+    # Warm up first, so that lazy imports and caches are not traced.
+    (run, operations) = setup()
+    run()
+    del run
+
+    tracemalloc.start()
+    try:
+        (run, operations) = setup()
+        run()
+        (_, peak_memory) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    best_time = float('inf')
+    for _ in range(repeat):
+        calls = 0
+        start_time = time.perf_counter()
+        while True:
+            run()
+            calls += 1
+            elapsed = time.perf_counter() - start_time
+            if elapsed >= min_time:
+                break
+        best_time = min(best_time, elapsed / (calls * operations))
+
+    return {'throughput': 1.0 / best_time,
+            'time_per_operation': best_time,
+            'peak_memory': peak_memory}
+
+
+def environment_info():
+    """
+    :return: A description of the machine the benchmarks ran on.
+    """
+
+    return {'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'system': platform.system()}
+
+
+def save(file_path, results):
+    """
+    Write benchmark results in a JSON file.
+
+    :param results: A dict of the results by case key.
+    :return: void
+    """
+
+    with open(file_path, 'w') as results_file:
+        json.dump({'environment': environment_info(), 'results': results}, results_file, indent=2, sort_keys=True)
+
+
+def load(file_path):
+    """
+    :return: The dict of the results by case key of a JSON file
+             written by save.
+    """
+
+    with open(file_path) as results_file:
+        return json.load(results_file)['results']
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare results to a baseline. A case regresses if its throughput
+    dropped, or its peak memory grew, by more than the threshold.
+    Peak memory growths under MIN_MEMORY_GROWTH bytes are ignored, as
+    well as the cases missing from the baseline.
+
+    :param results: A dict of the results by case key.
+    :param baseline: A dict of the baseline results by case key.
+    :param threshold: The tolerated relative change.
+    :return: A list of (case key, metric, baseline value, value)
+             tuples, one per regression.
+    """
+
+    regressions = list()
+    for (key, result) in sorted(results.items()):
+        if key not in baseline:
+            continue
+
+        reference = baseline[key]
+        if result['throughput'] < reference['throughput'] * (1.0 - threshold):
+            regressions.append((key, 'throughput', reference['throughput'], result['throughput']))
+        if result['peak_memory'] > max(reference['peak_memory'] * (1.0 + threshold),
+                                       reference['peak_memory'] + MIN_MEMORY_GROWTH):
+            regressions.append((key, 'peak_memory', reference['peak_memory'], result['peak_memory']))
+
+    return regressions
@@ -0,0 +1,56 @@
+import argparse
+import fnmatch
+import sys
+
+import benchmarks.cases as cases
+import benchmarks.harness as harness
+
+parser = argparse.ArgumentParser(description='Benchmark the hot paths of the agents, models, policies and runner.')
+parser.add_argument('-k', '--filter', metavar='PATTERN', type=str, default='*',
+                    help='only run the cases whose key matches this shell pattern, e.g. "MonteCarlo.*" (default all)')
+parser.add_argument('-o', '--output', metavar='RESULTS_FILE', type=str, default=None,
+                    help='JSON file where the results are written, e.g. to be used later as a baseline')
+parser.add_argument('-b', '--baseline', metavar='BASELINE_FILE', type=str, default=None,
+                    help='JSON results file to compare against; exits with status 1 if a case regresses')
+parser.add_argument('-t', '--threshold', type=float, default=harness.DEFAULT_THRESHOLD,
+                    help='relative throughput drop or peak memory growth reported as a regression (default %.2f)' %
+                         harness.DEFAULT_THRESHOLD)
+parser.add_argument('-r', '--repeat', type=int, default=5,
+                    help='number of timed loops of each case, the best one is kept (default 5)')
+parser.add_argument('--min-time', type=float, default=0.2,
+                    help='minimum duration of a timed loop in seconds (default 0.2)')
+
+
+def main():
+    args = parser.parse_args()
+
+    results = dict()
+    for (name, setup, params_list) in cases.CASES:
+        for params in params_list:
+            key = harness.case_key(name, params)
+            if not fnmatch.fnmatchcase(key, args.filter):
+                continue
+
+            result = harness.measure(lambda: setup(**params), args.repeat, args.min_time)
+            results[key] = result
+            print('{:<90} {:>14,.0f} ops/s {:>10.1f} us/op {:>12,} B peak'.format(
+                key, result['throughput'], result['time_per_operation'] * 1e6, result['peak_memory']), flush=True)
+
+    if args.output is not None:
+        harness.save(args.output, results)
+
+    if args.baseline is None:
+        return 0
+
+    regressions = harness.compare(results, harness.load(args.baseline), args.threshold)
+    for (key, metric, reference, value) in regressions:
+        print('REGRESSION {} {}: {:,.1f} -> {:,.1f} ({:+.0%})'.format(key, metric, reference, value,
+                                                                     value / reference - 1.0))
+    if not regressions:
+        print('No regression against {}.'.format(args.baseline))
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""
+pypownet's RunEnv and Observation, imported only if pypownet is
+installed. Otherwise placeholder classes take their place, so that the
+agents and runners can still be imported and play in the surrogate
+environment.
+"""
+
+try:
+    from pypownet.environment import RunEnv, Observation
+except ImportError:
+    RunEnv = None
+    Observation = None
+
+"""Whether pypownet is installed. Without it, only the surrogate environment can be played."""
+INSTALLED = RunEnv is not None
+
+if not INSTALLED:
+    class RunEnv:
+        """Placeholder of pypownet's RunEnv, which is not installed."""
+
+        def __init__(self, *args, **kwargs):
+            raise ImportError('pypownet is not installed, see the README; --surrogate plays without it')
+
+    class Observation:
+        """Placeholder of pypownet's Observation, never instantiated."""
+
+        pass
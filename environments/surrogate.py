@@ -0,0 +1,545 @@
+import datetime
+
+import numpy as np
+
+"""Reward of a game over, in the loads cut reward."""
+GAME_OVER_REWARD = -10.0
+"""Cost of every switched element or line status of an action."""
+ACTION_COST = 0.1
+"""Cost of every disconnected line."""
+LINE_CUT_COST = 0.5
+"""Cost of every element not on the first node of its substation."""
+DISTANCE_REFERENCE_GRID_COST = 0.05
+
+"""Number of timesteps of a day, a timestep being 5 minutes."""
+TIMESTEPS_PER_DAY = 288
+
+
+class Grid:
+    """
+    Static description of a power grid for the DC power flow: the
+    substations, each one made of two nodes, the lines between them
+    with their reactance and thermal limit, and the productions and
+    loads connected to them.
+
+    The first production is the slack: it produces whatever the other
+    productions do not, and its node is the angle reference.
+    """
+
+    def __init__(self, number_substations, lines_or, lines_ex, reactances, prods_substations, loads_substations,
+                 nominal_prods, nominal_loads, thermal_limits=None, reference_usage=0.85):
+        """
+        :param number_substations: The number of substations.
+        :param lines_or: The substation of the origin of every line.
+        :param lines_ex: The substation of the extremity of every line.
+        :param reactances: The reactance of every line.
+        :param prods_substations: The substation of every production.
+        :param loads_substations: The substation of every load.
+        :param nominal_prods: The nominal production of every
+                              production, the first one is the slack.
+        :param nominal_loads: The nominal consumption of every load.
+        :param thermal_limits: The maximum flow of every line. By
+            default the flows of the nominal grid use reference_usage
+            of the thermal limits, the limits of the least used lines
+            being raised to 10% of the largest flow.
+        :param reference_usage: See thermal_limits.
+        """
+
+        self.number_substations = number_substations
+        self.lines_or = np.asarray(lines_or, int)
+        self.lines_ex = np.asarray(lines_ex, int)
+        self.reactances = np.asarray(reactances, float)
+        self.prods_substations = np.asarray(prods_substations, int)
+        self.loads_substations = np.asarray(loads_substations, int)
+        self.nominal_prods = np.asarray(nominal_prods, float)
+        self.nominal_loads = np.asarray(nominal_loads, float)
+
+        assert len(self.lines_or) == len(self.lines_ex) == len(self.reactances)
+        assert len(self.prods_substations) == len(self.nominal_prods) > 0
+        assert len(self.loads_substations) == len(self.nominal_loads)
+        assert np.all(self.lines_or != self.lines_ex)
+
+        self.number_power_lines = len(self.lines_or)
+        self.number_prods = len(self.prods_substations)
+        self.number_loads = len(self.loads_substations)
+        self.number_nodes = 2 * number_substations
+        self.susceptances = 1.0 / self.reactances
+
+        """The substation of every element, in the order of the node splitting subaction."""
+        self.elements_substations = np.concatenate((self.prods_substations, self.loads_substations,
+                                                    self.lines_or, self.lines_ex))
+        self.number_elements = len(self.elements_substations)
+
+        if thermal_limits is None:
+            flows = np.abs(dc_power_flow(self, np.zeros((1, self.number_elements), np.int8),
+                                         np.ones((1, self.number_power_lines), bool),
+                                         self.nominal_prods[np.newaxis], self.nominal_loads[np.newaxis])[0][0])
+            thermal_limits = np.maximum(flows, 0.1 * flows.max()) / reference_usage
+        self.thermal_limits = np.asarray(thermal_limits, float)
+
+    @staticmethod
+    def ieee14():
+        """
+        :return: The IEEE 14 bus grid: 14 substations, 20 lines, 5
+                 productions and 11 loads.
+        """
+
+        branches = [(1, 2, 0.05917), (1, 5, 0.22304), (2, 3, 0.19797), (2, 4, 0.17632), (2, 5, 0.17388),
+                    (3, 4, 0.17103), (4, 5, 0.04211), (4, 7, 0.20912), (4, 9, 0.55618), (5, 6, 0.25202),
+                    (6, 11, 0.19890), (6, 12, 0.25581), (6, 13, 0.13027), (7, 8, 0.17615), (7, 9, 0.11001),
+                    (9, 10, 0.08450), (9, 14, 0.27038), (10, 11, 0.19207), (12, 13, 0.19988), (13, 14, 0.34802)]
+        loads = [(2, 21.7), (3, 94.2), (4, 47.8), (5, 7.6), (6, 11.2), (9, 29.5), (10, 9.0), (11, 3.5), (12, 6.1),
+                 (13, 13.5), (14, 14.9)]
+        prods = [(1, 150.0), (2, 40.0), (3, 30.0), (6, 20.0), (8, 19.0)]
+
+        return Grid(14,
+                    [origin - 1 for (origin, _, _) in branches],
+                    [extremity - 1 for (_, extremity, _) in branches],
+                    [reactance for (_, _, reactance) in branches],
+                    [substation - 1 for (substation, _) in prods],
+                    [substation - 1 for (substation, _) in loads],
+                    [value for (_, value) in prods],
+                    [value for (_, value) in loads])
+
+    @staticmethod
+    def random(number_substations, number_power_lines, number_prods, number_loads, seed=0):
+        """
+        Build a random connected grid, e.g. to benchmark large grids.
+
+        :param number_substations: The number of substations.
+        :param number_power_lines: The number of lines, at least
+                                   number_substations - 1.
+        :param number_prods: The number of productions.
+        :param number_loads: The number of loads.
+        :param seed: The seed of the random grid.
+        :return: A Grid.
+        """
+
+        assert number_power_lines >= number_substations - 1
+
+        random = np.random.RandomState(seed)
+
+        # A random spanning tree keeps the grid connected.
+        lines_or = [random.randint(substation) for substation in range(1, number_substations)]
+        lines_ex = list(range(1, number_substations))
+        while len(lines_or) < number_power_lines:
+            (origin, extremity) = random.choice(number_substations, 2, replace=False)
+            lines_or.append(origin)
+            lines_ex.append(extremity)
+
+        nominal_loads = random.uniform(5.0, 50.0, number_loads)
+        nominal_prods = random.uniform(0.5, 1.5, number_prods)
+        nominal_prods *= nominal_loads.sum() / nominal_prods.sum()
+
+        return Grid(number_substations, lines_or, lines_ex, random.uniform(0.05, 0.3, number_power_lines),
+                    random.randint(number_substations, size=number_prods),
+                    random.randint(number_substations, size=number_loads), nominal_prods, nominal_loads)
+
+
+def dc_power_flow(grid, topologies, lines_status, prods, loads):
+    """
+    Solve the DC power flow of a batch of topologies of a grid in one
+    vectorized call.
+
+    The nodes not connected to the node of the slack production are
+    left out of the power flow. There is a game over when a production
+    or a load is on such a node, since it cannot be served.
+
+    :param grid: The Grid.
+    :param topologies: (N, number_elements) array of the node, 0 or 1,
+                       of every element in its substation.
+    :param lines_status: (N, number_power_lines) boolean array, True
+                         for the connected lines.
+    :param prods: (N, number_prods) array of the productions.
+    :param loads: (N, number_loads) array of the loads.
+    :return: (flows, game_over) where flows is the (N,
+             number_power_lines) array of the lines flows and game_over
+        a (N,) boolean array.
+    """
+
+    batch_size = len(topologies)
+    number_nodes = grid.number_nodes
+    nodes = 2 * grid.elements_substations + topologies
+    rows = np.arange(batch_size)[:, np.newaxis]
+
+    injection_elements = grid.number_prods + grid.number_loads
+    lines_or_nodes = nodes[:, injection_elements:injection_elements + grid.number_power_lines]
+    lines_ex_nodes = nodes[:, injection_elements + grid.number_power_lines:]
+    susceptances = lines_status * grid.susceptances
+
+    # Susceptance matrix of every grid, built from flat indices.
+    offsets = rows * number_nodes * number_nodes
+    susceptance_matrices = np.bincount(
+        np.concatenate(((offsets + lines_or_nodes * (number_nodes + 1)).ravel(),
+                        (offsets + lines_ex_nodes * (number_nodes + 1)).ravel(),
+                        (offsets + lines_or_nodes * number_nodes + lines_ex_nodes).ravel(),
+                        (offsets + lines_ex_nodes * number_nodes + lines_or_nodes).ravel())),
+        np.concatenate((susceptances.ravel(), susceptances.ravel(), -susceptances.ravel(), -susceptances.ravel())),
+        batch_size * number_nodes * number_nodes).reshape(batch_size, number_nodes, number_nodes)
+
+    adjacency = (susceptance_matrices < 0.0).astype(np.float64)
+    slack_nodes = nodes[:, 0]
+    connected = np.zeros((batch_size, number_nodes), bool)
+    connected[np.arange(batch_size), slack_nodes] = True
+    for _ in range(number_nodes):
+        next_connected = connected | (np.einsum('ni,nij->nj', connected, adjacency) > 0.0)
+        if np.array_equal(next_connected, connected):
+            break
+        connected = next_connected
+
+    game_over = ~np.all(connected[rows, nodes[:, :injection_elements]], axis=1)
+
+    injections = np.bincount((rows * number_nodes + nodes[:, :injection_elements]).ravel(),
+                             np.concatenate((prods, -loads), axis=1).ravel(),
+                             batch_size * number_nodes).reshape(batch_size, number_nodes)
+
+    # The slack node and the disconnected nodes get a fixed zero angle.
+    fixed = ~connected
+    fixed[np.arange(batch_size), slack_nodes] = True
+    free = ~fixed
+    matrices = susceptance_matrices * free[:, :, np.newaxis] * free[:, np.newaxis, :]
+    matrices[:, np.arange(number_nodes), np.arange(number_nodes)] += fixed
+    angles = np.linalg.solve(matrices, (injections * free)[:, :, np.newaxis])[:, :, 0]
+
+    flows = susceptances * (angles[rows, lines_or_nodes] - angles[rows, lines_ex_nodes])
+
+    return flows, game_over
+
+
+class SurrogateObservation:
+    """
+    Observation of the surrogate environment. Its array is the
+    concatenation of the lines capacity usage, the lines status, the
+    productions, the loads and the topology.
+    """
+
+    def __init__(self, array, observation_space):
+        self.array = array
+        self.observation_space = observation_space
+
+    def get_lines_capacity_usage(self):
+        return self.array[self.observation_space.lines_capacity_usage_slice]
+
+    def get_lines_status(self):
+        return self.array[self.observation_space.lines_status_slice]
+
+    def get_active_productions(self):
+        return self.array[self.observation_space.productions_slice]
+
+    def get_active_loads(self):
+        return self.array[self.observation_space.loads_slice]
+
+    def get_topology(self):
+        return self.array[self.observation_space.topology_slice]
+
+
+class SurrogateObservationSpace:
+    def __init__(self, grid):
+        self.number_power_lines = grid.number_power_lines
+        self.number_productions = grid.number_prods
+        self.number_loads = grid.number_loads
+
+        lengths = [grid.number_power_lines, grid.number_power_lines, grid.number_prods, grid.number_loads,
+                   grid.number_elements]
+        bounds = np.cumsum([0] + lengths)
+        (self.lines_capacity_usage_slice, self.lines_status_slice, self.productions_slice, self.loads_slice,
+         self.topology_slice) = [slice(start, stop) for (start, stop) in zip(bounds[:-1], bounds[1:])]
+        self.shape = (int(bounds[-1]),)
+
+    def array_to_observation(self, array):
+        return SurrogateObservation(array, self)
+
+
+class SurrogateAction:
+    """
+    Action of the surrogate environment: the node splitting subaction,
+    1 switching an element to the other node of its substation, then
+    the lines status subaction, 1 switching the status of a line.
+    """
+
+    def __init__(self, node_splitting_subaction, lines_status_subaction):
+        self.node_splitting_subaction = node_splitting_subaction
+        self.lines_status_subaction = lines_status_subaction
+
+    def get_node_splitting_subaction(self):
+        return self.node_splitting_subaction
+
+    def set_node_splitting_subaction(self, new_subaction):
+        self.node_splitting_subaction = new_subaction
+
+    def get_lines_status_subaction(self):
+        return self.lines_status_subaction
+
+    def set_lines_status_subaction(self, new_subaction):
+        self.lines_status_subaction = new_subaction
+
+    def as_array(self):
+        return np.concatenate((self.node_splitting_subaction, self.lines_status_subaction))
+
+
+class SurrogateActionSpace:
+    """
+    Same layout as pypownet's action space: the node splitting
+    subaction is made of the switches of the productions, the loads,
+    the lines origins and the lines extremities.
+    """
+
+    def __init__(self, grid):
+        self.prods_switches_subaction_length = grid.number_prods
+        self.loads_switches_subaction_length = grid.number_loads
+        self.lines_or_switches_subaction_length = grid.number_power_lines
+        self.lines_ex_switches_subaction_length = grid.number_power_lines
+        self.lines_status_subaction_length = grid.number_power_lines
+        self.node_splitting_subaction_length = grid.number_elements
+        self.action_length = grid.number_elements + grid.number_power_lines
+
+        self.prods_subs_ids = grid.prods_substations
+        self.loads_subs_ids = grid.loads_substations
+        self.lines_or_subs_id = grid.lines_or
+        self.lines_ex_subs_id = grid.lines_ex
+
+    def get_do_nothing_action(self, as_class_Action=False):
+        array = np.zeros(self.action_length, int)
+        return self.array_to_action(array) if as_class_Action else array
+
+    def array_to_action(self, array):
+        assert len(array) == self.action_length
+        return SurrogateAction(array[:self.node_splitting_subaction_length],
+                               array[self.node_splitting_subaction_length:])
+
+
+class SurrogateInfo:
+    def __init__(self, text):
+        self.text = text
+
+
+class SurrogateEnvironment:
+    """
+    Cheap stand-in of pypownet's RunEnv: the power flow is a DC
+    approximation, solved for a batch of independent grids in one
+    vectorized call by step_batch. The loads follow a daily sine
+    with noise, the productions follow the total load, the slack
+    production absorbing the difference.
+
+    Like pypownet with its default parameters, a line in hard overflow
+    is disconnected at once, possibly in cascade, and a line in
+    overflow for soft_overflow_timesteps consecutive timesteps is
+    disconnected. There is a game over when a production or a load
+    gets isolated from the slack production.
+
+    step, reset and the spaces have the RunEnv interface used by the
+    agents and runners, for a batch of one grid. The environment is
+    deterministic for a given start id.
+    """
+
+    def __init__(self, grid=None, batch_size=1, start_id=0, load_amplitude=0.15, load_noise=0.02,
+                 hard_overflow_threshold=1.5, soft_overflow_timesteps=10, **kwargs):
+        """
+        :param grid: The Grid, by default the IEEE 14 bus grid.
+        :param batch_size: The number of independent grids.
+        :param start_id: Seed of the load variations, named after the
+                         chronic start id of RunEnv.
+        :param load_amplitude: Relative amplitude of the daily load
+                               variations.
+        :param load_noise: Relative standard deviation of the loads
+                           noise.
+        :param hard_overflow_threshold: Capacity usage above which a
+                                        line is disconnected at once.
+        :param soft_overflow_timesteps: Number of consecutive timesteps
+            in overflow after which a line is disconnected.
+        :param kwargs: Other RunEnv keyword arguments, ignored.
+        """
+
+        assert batch_size > 0
+
+        self.grid = Grid.ieee14() if grid is None else grid
+        self.batch_size = batch_size
+        self.start_id = start_id
+        self.load_amplitude = load_amplitude
+        self.load_noise = load_noise
+        self.hard_overflow_threshold = hard_overflow_threshold
+        self.soft_overflow_timesteps = soft_overflow_timesteps
+
+        self.observation_space = SurrogateObservationSpace(self.grid)
+        self.action_space = SurrogateActionSpace(self.grid)
+
+        self.random = np.random.RandomState(start_id)
+        self.phases = self.random.uniform(0.0, TIMESTEPS_PER_DAY, batch_size)
+        self.phases[0] = 0.0
+        self.start_datetime = datetime.datetime(2019, 1, 1)
+
+        self.timesteps = np.zeros(batch_size, int)
+        self.topologies = np.zeros((batch_size, self.grid.number_elements), np.int8)
+        self.lines_status = np.ones((batch_size, self.grid.number_power_lines), bool)
+        self.overflow_timesteps = np.zeros((batch_size, self.grid.number_power_lines), int)
+        self.observations = None
+
+    def injections(self, grids):
+        """
+        :param grids: The indices of some grids.
+        :return: (prods, loads) of the grids at their timestep.
+        """
+
+        daily = 1.0 + self.load_amplitude * np.sin(2.0 * np.pi * (self.timesteps[grids] + self.phases[grids]) /
+                                                   TIMESTEPS_PER_DAY)
+        noise = 1.0 + self.load_noise * self.random.standard_normal((len(grids), self.grid.number_loads))
+        loads = self.grid.nominal_loads * daily[:, np.newaxis] * noise
+
+        prods = np.tile(self.grid.nominal_prods, (len(grids), 1))
+        prods[:, 1:] *= (loads.sum(axis=1) / self.grid.nominal_loads.sum())[:, np.newaxis]
+        prods[:, 0] = loads.sum(axis=1) - prods[:, 1:].sum(axis=1)
+
+        return prods, loads
+
+    def power_flow(self, grids):
+        """
+        Run the power flow of some grids at their timestep, then
+        disconnect their lines in overflow.
+
+        :param grids: The indices of the simulated grids.
+        :return: (observations, lines_cut, game_over) of the simulated
+                 grids, where lines_cut is the number of lines
+            disconnected by overflows.
+        """
+
+        (prods, loads) = self.injections(grids)
+        topologies = self.topologies[grids]
+        lines_status = self.lines_status[grids]
+        lines_status_before = lines_status.copy()
+
+        (flows, game_over) = dc_power_flow(self.grid, topologies, lines_status, prods, loads)
+        usage = np.abs(flows) / self.grid.thermal_limits
+
+        overflow_timesteps = np.where(usage > 1.0, self.overflow_timesteps[grids] + 1, 0)
+        broken = (overflow_timesteps >= self.soft_overflow_timesteps) | (usage > self.hard_overflow_threshold)
+        for _ in range(self.grid.number_power_lines):
+            if not np.any(broken):
+                break
+            lines_status &= ~broken
+            (flows, game_over) = dc_power_flow(self.grid, topologies, lines_status, prods, loads)
+            usage = np.abs(flows) / self.grid.thermal_limits
+            broken = lines_status & (usage > self.hard_overflow_threshold)
+        overflow_timesteps[~lines_status] = 0
+
+        self.lines_status[grids] = lines_status
+        self.overflow_timesteps[grids] = overflow_timesteps
+
+        lines_cut = np.count_nonzero(lines_status_before & ~lines_status, axis=1)
+        observations = np.concatenate((usage, lines_status, prods, loads, topologies), axis=1)
+
+        return observations, lines_cut, game_over
+
+    def reset_batch(self, mask=None):
+        """
+        Restore the reference topology with all the lines connected, the
+        timesteps go on. Used at the beginning of an episode or after a
+        game over.
+
+        :param mask: Boolean array of the grids to reset, by default
+                     all.
+        :return: The (batch_size, observation length) observations.
+        """
+
+        mask = np.ones(self.batch_size, bool) if mask is None else np.asarray(mask, bool)
+        grids = np.flatnonzero(mask)
+        self.topologies[grids] = 0
+        self.lines_status[grids] = True
+        self.overflow_timesteps[grids] = 0
+
+        (observations, _, _) = self.power_flow(grids)
+        if self.observations is None:
+            self.observations = np.zeros((self.batch_size, observations.shape[1]))
+        self.observations[grids] = observations
+
+        return self.observations.copy()
+
+    def step_batch(self, actions):
+        """
+        Apply one action to every grid and simulate the next timestep.
+        The grids in game over should be reset with reset_batch.
+
+        :param actions: A (batch_size, action length) array, or a list
+                        of actions.
+        :return: (observations, rewards, done, infos) where rewards is a
+                 (batch_size, 5) array of the loads cut, action cost,
+            lines cut, distance to the reference grid and lines usage
+            rewards, done a boolean array and infos a list of
+            SurrogateInfo or None.
+        """
+
+        if self.observations is None:
+            self.reset_batch()
+
+        if isinstance(actions, np.ndarray):
+            actions = actions.reshape(self.batch_size, self.action_space.action_length)
+        else:
+            actions = np.array([action.as_array() if isinstance(action, SurrogateAction) else action
+                                for action in actions])
+
+        node_splitting = actions[:, :self.grid.number_elements] != 0
+        lines_switches = actions[:, self.grid.number_elements:] != 0
+        self.topologies ^= node_splitting.astype(np.int8)
+        self.lines_status ^= lines_switches
+        self.timesteps += 1
+
+        (observations, lines_cut, done) = self.power_flow(np.arange(self.batch_size))
+        self.observations = observations
+
+        usage = observations[:, self.observation_space.lines_capacity_usage_slice]
+        rewards = np.stack((np.where(done, GAME_OVER_REWARD, 0.0),
+                            -ACTION_COST * (np.count_nonzero(node_splitting, axis=1) +
+                                            np.count_nonzero(lines_switches, axis=1)),
+                            -LINE_CUT_COST * lines_cut,
+                            -DISTANCE_REFERENCE_GRID_COST * np.count_nonzero(self.topologies, axis=1),
+                            -np.sum(np.maximum(usage - 1.0, 0.0), axis=1)), axis=1)
+        infos = [SurrogateInfo('a production or a load is isolated') if game_over else None for game_over in done]
+
+        return observations.copy(), rewards, done, infos
+
+    def reset(self):
+        assert self.batch_size == 1
+        return self.reset_batch()[0]
+
+    def step(self, action, do_sum=True):
+        """
+        Same as RunEnv.step, for a batch of one grid: there is no
+        observation after a game over.
+        """
+
+        assert self.batch_size == 1
+
+        (observations, rewards, done, infos) = self.step_batch([action])
+        reward = float(rewards[0].sum()) if do_sum else rewards[0].tolist()
+
+        return None if done[0] else observations[0], reward, bool(done[0]), infos[0]
+
+    def simulate(self, action, do_sum=True):
+        """
+        Same as RunEnv.simulate: the observation, reward, game over
+        and info of the action at the next timestep, the environment
+        being left unchanged. There is no observation after a game
+        over.
+        """
+
+        assert self.batch_size == 1
+
+        if self.observations is None:
+            self.reset_batch()
+
+        state = (self.timesteps.copy(), self.topologies.copy(), self.lines_status.copy(),
+                 self.overflow_timesteps.copy(), self.observations, self.random.get_state())
+        (observations, rewards, done, infos) = self.step_batch([action])
+        (self.timesteps, self.topologies, self.lines_status, self.overflow_timesteps, self.observations) = state[:5]
+        self.random.set_state(state[5])
+        reward = float(rewards[0].sum()) if do_sum else rewards[0].tolist()
+
+        return None if done[0] else observations[0], reward, bool(done[0]), infos[0]
+
+    def render(self):
+        pass
+
+    def get_current_chronic_name(self):
+        return 'surrogate_{}'.format(self.start_id)
+
+    def get_current_datetime(self):
+        return self.start_datetime + datetime.timedelta(minutes=5 * int(self.timesteps[0]))
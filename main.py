@@ -1,8 +1,14 @@
 import argparse
 
-from pypownet.environment import RunEnv
+import environments.run_env as run_env
+from environments.surrogate import SurrogateEnvironment
 from runners.runner import CustomRunner
+from runners.parallel_runner import ParallelRunner
+from runners.hogwild_runner import HogwildRunner
 import agents.agent
+import agents.checkpoint as checkpoint
+import agents.storage as storage
+from agents.instrumentation import Instrumentation, PROFILERS
 
 parser = argparse.ArgumentParser(description='CLI tool to run experiments using PyPowNet.')
 parser.add_argument('-a', '--agent', metavar='AGENT_CLASS', default='agent.QLearning', type=str,
@@ -34,6 +40,71 @@ parser.add_argument('-r', '--render', action='store_true',
 parser.add_argument('-la', '--latency', type=float, default=None,
                     help='time to sleep after each frame plot of the renderer (in seconds); note: there are multiple'
                          ' frame plots per timestep (at least 2, varies)')
+parser.add_argument('--surrogate', action='store_true',
+                    help='play in the DC power flow surrogate of the IEEE 14 bus grid instead of pypownet, e.g. to '
+                         'pretrain an agent cheaply; --start-id seeds its load variations')
+parser.add_argument('-w', '--workers', type=int, default=1,
+                    help='number of rollout worker processes, each with its own environment playing its own chronics; '
+                         'the agent learns from all of them (default 1, no worker process)')
+parser.add_argument('--hogwild', action='store_true',
+                    help='with --workers, every worker learns asynchronously in one action-value table shared through '
+                         'memory-mapped files, instead of sending its transitions to a central learner')
+parser.add_argument('--lock-stripes', metavar='LOCKS', type=int, default=0,
+                    help='with --hogwild, number of locks striped over the states serializing the learning in a '
+                         'state (default 0, lock-free)')
+parser.add_argument('--action-value-dtype', choices=storage.VALUE_DTYPES, default='float32',
+                    help='type of the action values of the tabular agents: "int16" quantizes them with a scale per '
+                         'state, in half the memory of "float32" (default "float32")')
+parser.add_argument('--replay-capacity', metavar='TRANSITIONS', type=int, default=None,
+                    help='number of transitions kept for experience replay, replayed by agent.Sarsa and '
+                         'agent.QLearning (default 0, off; 50000 for agent.DQN)')
+parser.add_argument('--replay-updates', metavar='TRANSITIONS', type=int, default=1,
+                    help='with --replay-capacity, number of transitions replayed after every step (default 1)')
+parser.add_argument('--replay-prioritized', action='store_true',
+                    help='with --replay-capacity, replay the transitions of highest TD error more often')
+parser.add_argument('--checkpoint-dir', metavar='CHECKPOINT_DIR', type=str, default=None,
+                    help='directory where the action values and the policy of the agent are periodically saved '
+                         '(default no checkpoint)')
+parser.add_argument('--checkpoint-interval', metavar='EPISODES', type=int, default=10,
+                    help='number of episodes between two checkpoints (default 10)')
+parser.add_argument('--resume', action='store_true',
+                    help='resume from the last checkpoint of --checkpoint-dir, if any')
+parser.add_argument('--machine-log-format', choices=('csv', 'binary'), default='csv',
+                    help='format of the machine logs: "csv" writes a row per timestep, "binary" writes the timesteps '
+                         'of an episode in bulk at its end, see runners/machine_log.py to convert them (default "csv")')
+parser.add_argument('--prewarm-reset', action='store_true',
+                    help='reset the environment for the next episode in the background while the agent learns')
+parser.add_argument('--lookahead', metavar='CANDIDATES', type=int, default=0,
+                    help='simulate the given number of greedy candidate actions before acting and play the one of '
+                         'highest simulated reward; only the agent of the main process looks ahead (default 0, off)')
+parser.add_argument('--lookahead-budget', metavar='SECONDS', type=float, default=0.05,
+                    help='time a step may spend simulating before playing the plain greedy action (default 0.05)')
+parser.add_argument('--lookahead-cache-size', metavar='SIMULATIONS', type=int, default=100000,
+                    help='number of simulated rewards memoized by (state, action, time of day) (default 100000)')
+parser.add_argument('--policy-file', metavar='NETWORK_FILE', type=str, default=None,
+                    help='policy network exported by agents/PolicyGradient.py --export, played by '
+                         'agent.ExportedPolicy (default policy.npz)')
+parser.add_argument('--evaluate', action='store_true',
+                    help='freeze the agent: act greedily (epsilon 0) without learning nor checkpointing, e.g. after '
+                         '--resume; not with --workers, see runners/evaluation_runner.py to evaluate every chronic in '
+                         'parallel')
+parser.add_argument('--instrument', action='store_true',
+                    help='time the phases of the steps (act, environment step, learning...) and log a summary every '
+                         '--instrument-interval steps')
+parser.add_argument('--instrument-interval', metavar='STEPS', type=int, default=1000,
+                    help='number of steps between two instrumentation summaries (default 1000)')
+parser.add_argument('--instrument-file', metavar='INSTRUMENTATION_FILE', type=str, default=None,
+                    help='JSON lines file where the instrumentation summaries are appended (default none)')
+parser.add_argument('--trace-memory', action='store_true',
+                    help='add the memory allocated by python to the instrumentation summaries (slow)')
+parser.add_argument('--profile', choices=PROFILERS, default=None,
+                    help='profile a window of steps with cProfile or a sampling profiler (default no profiling)')
+parser.add_argument('--profile-start', metavar='STEPS', type=int, default=0,
+                    help='number of steps before the profiled window (default 0)')
+parser.add_argument('--profile-steps', metavar='STEPS', type=int, default=1000,
+                    help='number of profiled steps (default 1000)')
+parser.add_argument('--profile-file', metavar='PROFILE_FILE', type=str, default='runner.prof',
+                    help='file where the profile is written (default runner.prof)')
 parser.add_argument('-v', '--verbose', action='store_true',
                     help='display live info of the current experiment including reward, cumulative reward')
 parser.add_argument('-vv', '--vverbose', action='store_true',
@@ -42,17 +113,67 @@ parser.add_argument('-vv', '--vverbose', action='store_true',
 
 def main():
     args = parser.parse_args()
-    env_class = RunEnv
+    if not args.surrogate and not run_env.INSTALLED:
+        parser.error('pypownet is not installed, see the README, or play in the surrogate environment with --surrogate')
+    env_class = SurrogateEnvironment if args.surrogate else run_env.RunEnv
     agent_class = eval('agents.{}'.format(args.agent))
+    if args.policy_file is not None and not issubclass(agent_class, agents.agent.ExportedPolicy):
+        parser.error('--policy-file needs -a agent.ExportedPolicy')
+    if issubclass(agent_class, agents.agent.ExportedPolicy) and (args.checkpoint_dir is not None or args.resume):
+        parser.error('agent.ExportedPolicy does not learn and has no checkpoint, see --policy-file')
+    if issubclass(agent_class, agents.agent.DQN) and args.replay_capacity is not None and args.replay_capacity <= 0:
+        parser.error('agent.DQN learns from experience replay, --replay-capacity must be positive')
+    if args.resume and args.checkpoint_dir is None:
+        parser.error('--resume needs --checkpoint-dir')
+    if args.evaluate and args.workers > 1:
+        parser.error('--evaluate plays in the main process only, see runners/evaluation_runner.py to evaluate in '
+                     'parallel')
 
     # Instantiate environment and agent
-    env = env_class(parameters_folder=args.parameters, game_level=args.level,
-                    chronic_looping_mode=args.loop_mode, start_id=args.start_id,
-                    game_over_mode=args.game_over_mode, renderer_latency=args.latency,
-                    without_overflow_cutoff=args.no_overflow_cutoff)
-    agent = agent_class(env)
+    env_kwargs = dict(parameters_folder=args.parameters, game_level=args.level,
+                      chronic_looping_mode=args.loop_mode, start_id=args.start_id,
+                      game_over_mode=args.game_over_mode, renderer_latency=args.latency,
+                      without_overflow_cutoff=args.no_overflow_cutoff)
+    env = env_class(**env_kwargs)
+    agent_kwargs = dict(action_value_dtype=args.action_value_dtype)
+    if args.replay_capacity is not None:
+        agent_kwargs.update(replay_capacity=args.replay_capacity, replay_updates=args.replay_updates,
+                            replay_prioritized=args.replay_prioritized)
+    agent = agent_class(env, **agent_kwargs)
+    agent.lookahead_candidates = args.lookahead
+    agent.lookahead_budget = args.lookahead_budget
+    agent.lookahead_cache_size = args.lookahead_cache_size
+    agent.lookahead = agent.create_lookahead()
+    if args.policy_file is not None:
+        agent.load_network(args.policy_file)
+    if args.resume:
+        if checkpoint.latest(args.checkpoint_dir) is not None:
+            agent.restore_checkpoint(args.checkpoint_dir)
+    if args.evaluate:
+        agent.freeze()
+    instrumentation = Instrumentation(args.instrument, args.instrument_interval, args.instrument_file,
+                                      args.trace_memory, profiler=args.profile, profile_start=args.profile_start,
+                                      profile_steps=args.profile_steps, profile_file_path=args.profile_file)
     # Instantiate game runner and loop
-    runner = CustomRunner(env, agent, args.render, args.verbose, args.vverbose, args.parameters, args.level, args.niter)
+    if args.workers > 1 and args.hogwild:
+        runner = HogwildRunner(env, agent, env_kwargs, args.workers, args.render, args.verbose, args.vverbose,
+                               args.parameters, args.level, args.niter, checkpoint_dir=args.checkpoint_dir,
+                               checkpoint_interval=args.checkpoint_interval,
+                               machine_log_format=args.machine_log_format, instrumentation=instrumentation,
+                               prewarm_reset=args.prewarm_reset, lock_stripes=args.lock_stripes,
+                               agent_kwargs=agent_kwargs)
+    elif args.workers > 1:
+        runner = ParallelRunner(env, agent, env_kwargs, args.workers, args.render, args.verbose, args.vverbose,
+                                args.parameters, args.level, args.niter, checkpoint_dir=args.checkpoint_dir,
+                                checkpoint_interval=args.checkpoint_interval,
+                                machine_log_format=args.machine_log_format, instrumentation=instrumentation,
+                                prewarm_reset=args.prewarm_reset, agent_kwargs=agent_kwargs)
+    else:
+        runner = CustomRunner(env, agent, args.render, args.verbose, args.vverbose, args.parameters, args.level,
+                              args.niter, checkpoint_dir=args.checkpoint_dir,
+                              checkpoint_interval=args.checkpoint_interval,
+                              machine_log_format=args.machine_log_format, instrumentation=instrumentation,
+                              prewarm_reset=args.prewarm_reset)
     runner.loop(iterations=200, episodes=args.niter)
 
 
@@ -0,0 +1,210 @@
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from runners.sweep import resolve_agent_class, format_table, write_table
+
+"""Columns of the evaluation report."""
+EVALUATION_COLUMNS = ('chronic_id', 'chronic', 'survived_steps', 'game_over', 'cumulative_reward', 'steps_per_second')
+
+
+def list_chronics(parameters_folder, level):
+    """
+    :param parameters_folder: The parameters folder of pypownet.
+    :param level: The game level.
+    :return: The names of the chronics of the level, in the order of
+             their ids.
+    """
+
+    chronics_folder = os.path.join(parameters_folder, level, 'chronics')
+
+    return sorted(name for name in os.listdir(chronics_folder)
+                  if os.path.isdir(os.path.join(chronics_folder, name)))
+
+
+def play_greedy(environment, agent, iterations):
+    """
+    Play an episode with a frozen agent until the first game over, with
+    none of the logging of the runners.
+
+    :param environment: The environment, whose reset starts the chronic.
+    :param agent: A frozen CustomAgent.
+    :param iterations: Maximum number of steps.
+    :return: (chronic name, survived steps, game over, cumulative
+             reward, steps per second)
+    """
+
+    assert agent.frozen
+
+    observation = environment.reset()
+    chronic_name = environment.get_current_chronic_name()
+
+    steps = 0
+    done = False
+    cumulative_reward = 0.0
+    start_time = time.monotonic()
+    while steps < iterations and not done:
+        steps += 1
+        action = agent.act(observation)
+        (observation, rewards_list, done, info) = environment.step(action, do_sum=False)
+        # The same reward offset as CustomRunner.loop.
+        cumulative_reward += sum(rewards_list) + 5
+    elapsed_time = time.monotonic() - start_time
+
+    return chronic_name, steps - 1 if done else steps, done, cumulative_reward, steps / max(elapsed_time, 1e-9)
+
+
+def evaluate_chronic(chronic_id, agent_class_name, environment_class, environment_kwargs, iterations,
+                     checkpoint_dir=None, policy_file_path=None, agent_kwargs=None):
+    """
+    Entry point of the evaluation of a chronic in a process of the pool.
+
+    :param chronic_id: The id of the chronic, the start id of the
+                       environment.
+    :param agent_class_name: A class of the agents package, e.g.
+                             'agent.QLearning'.
+    :param environment_class: The class of environment to instantiate.
+    :param environment_kwargs: Keyword arguments of the environment.
+    :param iterations: Maximum number of steps.
+    :param checkpoint_dir: Optional checkpoint directory the agent is
+                           restored from.
+    :param policy_file_path: Optional network of agent.ExportedPolicy.
+    :param agent_kwargs: Optional keyword arguments of the agent, e.g.
+                         its action_value_dtype.
+    :return: A dict of EVALUATION_COLUMNS.
+    """
+
+    environment = environment_class(**dict(environment_kwargs, start_id=chronic_id))
+    agent = resolve_agent_class(agent_class_name)(environment, **(agent_kwargs or {}))
+    if checkpoint_dir is not None:
+        agent.restore_checkpoint(checkpoint_dir)
+    if policy_file_path is not None:
+        agent.load_network(policy_file_path)
+    agent.freeze()
+
+    (chronic_name, survived_steps, game_over, cumulative_reward, steps_per_second) = \
+        play_greedy(environment, agent, iterations)
+
+    return {'chronic_id': chronic_id,
+            'chronic': chronic_name,
+            'survived_steps': survived_steps,
+            'game_over': game_over,
+            'cumulative_reward': cumulative_reward,
+            'steps_per_second': steps_per_second}
+
+
+def evaluate(chronic_ids, agent_class_name, environment_class, environment_kwargs, iterations, processes=None,
+             checkpoint_dir=None, policy_file_path=None, logger=None, agent_kwargs=None):
+    """
+    Evaluate a trained agent on every chronic in a pool of processes:
+    the agent is frozen, acts greedily and learns nothing, so that the
+    chronics are independent and their order does not matter.
+
+    :param chronic_ids: The ids of the chronics.
+    :param processes: Size of the pool, by default the number of CPUs.
+    :param logger: Optional logger of the progress.
+    :return: (the dicts of EVALUATION_COLUMNS sorted by chronic id,
+              the total steps per second)
+    """
+
+    context = multiprocessing.get_context('spawn')
+    results = list()
+    start_time = time.monotonic()
+
+    with concurrent.futures.ProcessPoolExecutor(processes, mp_context=context) as executor:
+        futures = [executor.submit(evaluate_chronic, chronic_id, agent_class_name, environment_class,
+                                   environment_kwargs, iterations, checkpoint_dir, policy_file_path, agent_kwargs)
+                   for chronic_id in chronic_ids]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if logger is not None:
+                logger.info('chronic %s survived %d steps, cumulative reward: %.2f' %
+                            (result['chronic'], result['survived_steps'], result['cumulative_reward']))
+
+    elapsed_time = time.monotonic() - start_time
+    total_steps = sum(result['survived_steps'] + result['game_over'] for result in results)
+
+    return sorted(results, key=lambda result: result['chronic_id']), total_steps / max(elapsed_time, 1e-9)
+
+
+def summarize(results, steps_per_second):
+    """
+    :param results: The results of evaluate.
+    :param steps_per_second: The total steps per second.
+    :return: A text summary over the chronics.
+    """
+
+    survived_steps = np.array([result['survived_steps'] for result in results])
+    cumulative_rewards = np.array([result['cumulative_reward'] for result in results])
+    game_overs = sum(result['game_over'] for result in results)
+
+    return ('%d chronics, %d game overs - survived steps: mean %.1f, min %d - cumulative reward: mean %.2f - '
+            '%.1f steps/s' % (len(results), game_overs, survived_steps.mean(), survived_steps.min(),
+                              cumulative_rewards.mean(), steps_per_second))
+
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+
+    import agents.storage as storage
+    import environments.run_env as run_env
+    from environments.surrogate import SurrogateEnvironment
+
+    parser = argparse.ArgumentParser(description='Evaluate a trained agent greedily, without learning, on every '
+                                                 'chronic of a game level in parallel.')
+    parser.add_argument('-a', '--agent', metavar='AGENT_CLASS', type=str, default='agent.QLearning',
+                        help='class of the agent (default agent.QLearning)')
+    parser.add_argument('--checkpoint-dir', metavar='CHECKPOINT_DIR', type=str, default=None,
+                        help='directory of the checkpoints of the agent, the last one is evaluated')
+    parser.add_argument('--policy-file', metavar='NETWORK_FILE', type=str, default=None,
+                        help='policy network played by agent.ExportedPolicy')
+    parser.add_argument('--action-value-dtype', choices=storage.VALUE_DTYPES, default='float32',
+                        help='type of the action values the checkpoint is restored to (default "float32")')
+    parser.add_argument('-p', '--parameters', metavar='PARAMETERS_FOLDER', default='./parameters/default14/',
+                        type=str)
+    parser.add_argument('-lv', '--level', metavar='GAME_LEVEL', type=str, default='level0')
+    parser.add_argument('-c', '--chronics', metavar='NUMBER_CHRONICS', type=int, default=None,
+                        help='evaluate the first chronics only (default all the chronics of the level; 8 seeds in '
+                             'the surrogate)')
+    parser.add_argument('--iterations', type=int, default=1000,
+                        help='maximum number of steps per chronic (default 1000)')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of chronics evaluated at once (default the number of CPUs)')
+    parser.add_argument('--surrogate', action='store_true',
+                        help='evaluate in the DC power flow surrogate instead of pypownet')
+    parser.add_argument('-o', '--output', type=str, default=None, help='csv file of the evaluation')
+    args = parser.parse_args()
+    if args.policy_file is not None and args.agent != 'agent.ExportedPolicy':
+        parser.error('--policy-file needs -a agent.ExportedPolicy')
+    if args.agent == 'agent.ExportedPolicy' and args.checkpoint_dir is not None:
+        parser.error('agent.ExportedPolicy has no checkpoint, see --policy-file')
+    if not args.surrogate and not run_env.INSTALLED:
+        parser.error('pypownet is not installed, see the README, or play in the surrogate environment with --surrogate')
+
+    if args.surrogate:
+        number_chronics = 8 if args.chronics is None else args.chronics
+    else:
+        number_chronics = len(list_chronics(args.parameters, args.level))
+        if args.chronics is not None:
+            number_chronics = min(number_chronics, args.chronics)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    # Every chronic is played from its start, and a game over ends it.
+    environment_kwargs = dict(parameters_folder=args.parameters, game_level=args.level,
+                              chronic_looping_mode='fixed', game_over_mode='hard')
+    (evaluation, total_steps_per_second) = evaluate(range(number_chronics), args.agent,
+                                                    SurrogateEnvironment if args.surrogate else run_env.RunEnv,
+                                                    environment_kwargs, args.iterations, args.processes,
+                                                    args.checkpoint_dir, args.policy_file,
+                                                    logging.getLogger('evaluation'),
+                                                    dict(action_value_dtype=args.action_value_dtype))
+
+    print(format_table(evaluation, EVALUATION_COLUMNS))
+    print(summarize(evaluation, total_steps_per_second))
+    if args.output is not None:
+        write_table(evaluation, EVALUATION_COLUMNS, args.output)
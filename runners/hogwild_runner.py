@@ -0,0 +1,306 @@
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import agents.storage as storage
+from runners.parallel_runner import worker_agent_kwargs, worker_file_path
+from runners.runner import CustomRunner
+
+"""Names of the memory-mapped files of the shared action values and policy."""
+ACTION_VALUES_FILE_NAME = 'action_values.npy'
+POLICY_FILE_NAME = 'policy.npy'
+
+
+class StripedLocks:
+    """
+    A fixed number of locks shared by the states: the lock of a state
+    is the one of its stripe, state modulo the number of locks. Two
+    workers learning in the same state are serialized, the others run
+    concurrently.
+    """
+
+    def __init__(self, locks):
+        assert len(locks) > 0
+        self.locks = locks
+
+    def __call__(self, state):
+        return self.locks[int(state) % len(self.locks)]
+
+
+def attach_shared_tables(agent, shared_dir):
+    """
+    Replace the action values and the policy of an agent by the
+    memory-mapped shared ones.
+
+    :param agent: A tabular agent with a dense action-value function.
+    :param shared_dir: The directory of the shared files.
+    :return: void
+    """
+
+    agent.mdp.action_value_fn = np.load(os.path.join(shared_dir, ACTION_VALUES_FILE_NAME), mmap_mode='r+')
+    agent.policy.policy = np.load(os.path.join(shared_dir, POLICY_FILE_NAME), mmap_mode='r+')
+    agent.policy.sparse = False
+
+
+def run_hogwild_worker(worker_id, agent_class, agent_kwargs, environment_class, environment_kwargs, runner_kwargs,
+                       iterations, episodes, shared_dir, locks, episodes_queue):
+    """
+    Entry point of a Hogwild worker process. It plays and learns its
+    episodes with its own environment, in the shared action values and
+    policy.
+
+    :param worker_id: The id of the worker.
+    :param agent_class: The class of agent to instantiate.
+    :param agent_kwargs: Keyword arguments of the agent.
+    :param environment_class: The class of environment to instantiate.
+    :param environment_kwargs: Keyword arguments of the environment.
+    :param runner_kwargs: Keyword arguments of the HogwildWorkerRunner.
+    :param iterations: Maximum number of iterations per episode.
+    :param episodes: Number of episodes to play.
+    :param shared_dir: The directory of the shared files.
+    :param locks: Optional list of locks striped over the states, None
+                  to learn without locks.
+    :param episodes_queue: Queue of the episode statistics.
+    :return: void
+    """
+
+    environment = environment_class(**environment_kwargs)
+    agent = agent_class(environment, **agent_kwargs)
+    attach_shared_tables(agent, shared_dir)
+    if locks:
+        agent.learning_locks = StripedLocks(locks)
+
+    runner = HogwildWorkerRunner(environment, agent, worker_id, episodes_queue, **runner_kwargs)
+
+    try:
+        runner.loop(iterations, episodes)
+    finally:
+        episodes_queue.put((worker_id, None, 0, 0.0))
+
+
+class HogwildWorkerRunner(CustomRunner):
+    """
+    The runner of a Hogwild worker: it learns as a CustomRunner, and
+    reports its episodes to the HogwildRunner.
+    """
+
+    def __init__(self, environment, agent, worker_id, episodes_queue, **kwargs):
+        super().__init__(environment, agent, **kwargs)
+
+        self.worker_id = worker_id
+        self.episodes_queue = episodes_queue
+
+    def end_episode(self, episode, steps, cumulative_reward):
+        """
+        Report the episode.
+        """
+
+        super().end_episode(episode, steps, cumulative_reward)
+        self.episodes_queue.put((self.worker_id, episode, steps, cumulative_reward))
+
+
+class HogwildRunner(CustomRunner):
+    """
+    Run the episodes in parallel worker processes learning
+    asynchronously in one action-value table, Hogwild style: each
+    worker plays its own chronics (the start id of worker i is shifted
+    by i) and updates the table and the greedy policy in place. No
+    transition is sent between processes.
+
+    The table and the policy of the agent are copied into memory-mapped
+    files shared by the workers. By default the workers update them
+    without any lock: concurrent updates of the same state, action pair
+    are rare and losing one is harmless. With lock_stripes locks, the
+    learning in a state holds the lock of its stripe.
+
+    At the end, the table is copied back into the agent and its policy
+    is made consistent with it by a full improvement.
+    """
+
+    def __init__(self,
+                 environment,
+                 agent,
+                 environment_kwargs,
+                 workers,
+                 render=False,
+                 verbose=False,
+                 vverbose=False,
+                 parameters=None,
+                 level=None,
+                 max_iter=None,
+                 log_file_path='runner.log',
+                 machine_log_file_path='machine_logs.csv',
+                 checkpoint_dir=None,
+                 checkpoint_interval=10,
+                 machine_log_format='csv',
+                 instrumentation=None,
+                 prewarm_reset=False,
+                 lock_stripes=0,
+                 shared_dir=None,
+                 agent_kwargs=None):
+        """
+        :param environment_kwargs: Keyword arguments to instantiate the
+            environment of each worker, of the same class as the
+            environment of the runner.
+        :param workers: Number of worker processes.
+        :param lock_stripes: Number of locks striped over the states, 0
+                             to learn without locks.
+        :param shared_dir: Directory of the shared files, by default a
+                           temporary directory removed at the end.
+        :param agent_kwargs: Keyword arguments the agent was
+                             instantiated with, given to the agents of
+                             the workers.
+        """
+
+        assert workers > 0
+        assert lock_stripes >= 0
+        assert agent.mdp is not None and storage.is_dense(agent.mdp.get_action_value_function()), \
+            'Hogwild learning needs a dense float action-value table.'
+
+        super().__init__(environment,
+                         agent,
+                         render,
+                         verbose,
+                         vverbose,
+                         parameters,
+                         level,
+                         max_iter,
+                         log_file_path,
+                         machine_log_file_path,
+                         checkpoint_dir,
+                         checkpoint_interval,
+                         machine_log_format,
+                         instrumentation,
+                         prewarm_reset)
+
+        self.environment_kwargs = environment_kwargs
+        self.agent_kwargs = agent_kwargs or {}
+        self.workers = workers
+        self.lock_stripes = lock_stripes
+        self.shared_dir = shared_dir
+        self.log_file_path = log_file_path
+        self.machine_log_file_path = machine_log_file_path
+        self.machine_log_format = machine_log_format
+
+    def share_tables(self, shared_dir):
+        """
+        Copy the action values and the policy of the agent into the
+        shared files.
+
+        :param shared_dir: The directory of the shared files.
+        :return: void
+        """
+
+        action_value_fn = self.agent.mdp.get_action_value_function()
+        policy = np.asarray(self.agent.policy.policy)
+        for (file_name, array) in ((ACTION_VALUES_FILE_NAME, action_value_fn), (POLICY_FILE_NAME, policy)):
+            shared = np.lib.format.open_memmap(os.path.join(shared_dir, file_name), mode='w+', dtype=array.dtype,
+                                               shape=array.shape)
+            shared[:] = array
+            shared.flush()
+            del shared
+
+    def snapshot(self, shared_dir):
+        """
+        Copy the shared action values back into the agent once the
+        workers are done, and improve its policy on every state.
+
+        :param shared_dir: The directory of the shared files.
+        :return: void
+        """
+
+        action_value_fn = np.load(os.path.join(shared_dir, ACTION_VALUES_FILE_NAME), mmap_mode='r')
+        self.agent.mdp.action_value_fn = np.array(action_value_fn)
+        del action_value_fn
+
+        self.agent.policy.improve(self.agent.mdp.get_action_value_function())
+
+    def loop(self, iterations, episodes=1):
+        """
+        Runs the given number of episodes split over the workers.
+
+        :param iterations: int of maximum number of iterations per episode
+        :param episodes: int of number of episodes
+        :return: The cumulative reward of the last finished episode.
+        """
+
+        shared_dir = self.shared_dir or tempfile.mkdtemp(prefix='hogwild-')
+        os.makedirs(shared_dir, exist_ok=True)
+        self.share_tables(shared_dir)
+
+        context = multiprocessing.get_context('spawn')
+        episodes_queue = context.Queue()
+        locks = [context.Lock() for _ in range(self.lock_stripes)]
+        processes = list()
+
+        for worker_id in range(self.workers):
+            environment_kwargs = dict(self.environment_kwargs)
+            environment_kwargs['start_id'] = environment_kwargs.get('start_id', 0) + worker_id
+            runner_kwargs = dict(parameters=self.parameters,
+                                 level=self.level,
+                                 max_iter=self.max_iter,
+                                 log_file_path=worker_file_path(self.log_file_path, worker_id),
+                                 machine_log_file_path=worker_file_path(self.machine_log_file_path, worker_id),
+                                 machine_log_format=self.machine_log_format,
+                                 prewarm_reset=self.prewarm_reset)
+            worker_episodes = episodes // self.workers + (1 if worker_id < episodes % self.workers else 0)
+
+            process = context.Process(target=run_hogwild_worker,
+                                      args=(worker_id, type(self.agent),
+                                            worker_agent_kwargs(self.agent_kwargs, worker_id),
+                                            type(self.environment), environment_kwargs, runner_kwargs, iterations,
+                                            worker_episodes, shared_dir, locks, episodes_queue),
+                                      daemon=True)
+            process.start()
+            processes.append(process)
+
+        start_time = time.monotonic()
+        total_steps = 0
+        finished_episodes = 0
+        running_workers = self.workers
+        cumulative_reward = 0.0
+        try:
+            while running_workers > 0:
+                try:
+                    (worker_id, episode, steps, episode_reward) = episodes_queue.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes):
+                        raise RuntimeError('The Hogwild workers terminated without finishing their episodes.')
+                    continue
+
+                if episode is None:
+                    running_workers -= 1
+                    continue
+
+                total_steps += steps
+                finished_episodes += 1
+                cumulative_reward = episode_reward
+                self.logger.info("ITERATION %d - worker %d - cumulative reward: %.2f" %
+                                 (finished_episodes - 1, worker_id, cumulative_reward))
+
+            for process in processes:
+                process.join()
+
+            with self.instrumentation.phase('snapshot'):
+                self.snapshot(shared_dir)
+        finally:
+            if self.shared_dir is None:
+                shutil.rmtree(shared_dir, ignore_errors=True)
+            self.close_machine_log()
+
+        self.save_checkpoint(finished_episodes - 1)
+
+        elapsed_time = time.monotonic() - start_time
+        self.logger.info("%d steps in %.1fs with %d Hogwild workers: %.1f steps/s" %
+                         (total_steps, elapsed_time, self.workers, total_steps / max(elapsed_time, 1e-9)))
+
+        if self.instrumentation.enabled:
+            self.instrumentation.write_summary(self.agent)
+        self.instrumentation.close(self.agent)
+
+        return cumulative_reward
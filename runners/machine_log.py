@@ -0,0 +1,156 @@
+import csv
+
+import numpy as np
+
+"""Header of the machine logs csv file, as written by pypownet's Runner."""
+CSV_HEADER = ['param_env_name', 'level', 'chronic_name', 'max_iter', 'timestep', 'time', 'game_over',
+              'timestep_reward_aslist', 'timestep_reward', 'cumulated_reward']
+
+
+def record_dtype(number_rewards):
+    """
+    :param number_rewards: The number of rewards of a step.
+    :return: The structured type of the record of one step.
+    """
+
+    return np.dtype([('timestep', np.int32),
+                     ('time', 'datetime64[m]'),
+                     ('game_over', np.bool_),
+                     ('rewards', np.float64, (number_rewards,)),
+                     ('timestep_reward', np.float64),
+                     ('cumulated_reward', np.float64)])
+
+
+def csv_field(value):
+    """
+    :return: The value as written in a csv file by the csv module.
+    """
+
+    return '' if value is None else str(value)
+
+
+class MachineLogBuffer:
+    """
+    Columnar, preallocated buffer of the per-step machine logs of a
+    runner. The steps of an episode are stored in a structured numpy
+    array and written in bulk by flush, usually at the end of the
+    episode, which avoids formatting and writing a csv row per step.
+
+    The file is a sequence of chunks, one per flush, each one made of
+    two arrays written with numpy.save: the episode header
+    (param_env_name, level, chronic_name, max_iter) and the records.
+    Use convert_to_csv to get the csv layout of pypownet's machine logs.
+    """
+
+    def __init__(self, file_path, parameters=None, level=None, max_iter=None, capacity=1024):
+        """
+        :param file_path: The binary machine logs file, overwritten.
+        :param parameters: The parameters folder of the environment.
+        :param level: The game level.
+        :param max_iter: The maximum number of iterations.
+        :param capacity: Initial number of records of the buffer, it
+                         grows if an episode is longer.
+        """
+
+        self.file = open(file_path, 'wb')
+        self.header = [csv_field(parameters), csv_field(level), '', csv_field(max_iter)]
+        self.capacity = capacity
+        self.records = None
+        self.size = 0
+
+    def append(self, chronic_name, timestep, time, game_over, rewards, timestep_reward, cumulated_reward):
+        """
+        Store the logs of one step.
+
+        :return: void
+        """
+
+        if self.records is None:
+            self.records = np.zeros(self.capacity, record_dtype(len(rewards)))
+        elif self.size == len(self.records):
+            self.records = np.concatenate((self.records, np.zeros_like(self.records)))
+
+        # A chunk has a single chronic name.
+        if self.size > 0 and csv_field(chronic_name) != self.header[2]:
+            self.flush()
+        self.header[2] = csv_field(chronic_name)
+
+        record = self.records[self.size]
+        record['timestep'] = timestep
+        record['time'] = np.datetime64(time, 'm')
+        record['game_over'] = game_over
+        record['rewards'] = rewards
+        record['timestep_reward'] = timestep_reward
+        record['cumulated_reward'] = cumulated_reward
+        self.size += 1
+
+    def flush(self):
+        """
+        Write the stored records in one chunk and empty the buffer.
+
+        :return: void
+        """
+
+        if self.size == 0:
+            return
+
+        np.save(self.file, np.array(self.header))
+        np.save(self.file, self.records[:self.size])
+        self.file.flush()
+        self.size = 0
+
+    def close(self):
+        """
+        Flush and close the file.
+
+        :return: void
+        """
+
+        self.flush()
+        self.file.close()
+
+
+def read_chunks(file_path):
+    """
+    Read a binary machine logs file.
+
+    :param file_path: The binary machine logs file.
+    :return: A generator of (header, records) chunks.
+    """
+
+    with open(file_path, 'rb') as log_file:
+        while log_file.peek(1):
+            header = np.load(log_file)
+            records = np.load(log_file)
+            yield header.tolist(), records
+
+
+def convert_to_csv(file_path, csv_file_path):
+    """
+    Convert a binary machine logs file into the csv layout of pypownet.
+
+    :param file_path: The binary machine logs file.
+    :param csv_file_path: The csv file to write.
+    :return: void
+    """
+
+    with open(csv_file_path, 'w', newline='') as csv_file:
+        csv_writer = csv.writer(csv_file, delimiter=';')
+        csv_writer.writerow(CSV_HEADER)
+
+        for ((parameters, level, chronic_name, max_iter), records) in read_chunks(file_path):
+            times = np.datetime_as_string(records['time'], unit='m')
+            for (record, time) in zip(records, times):
+                csv_writer.writerow([parameters, level, chronic_name, max_iter, record['timestep'],
+                                     time.replace('T', ' '), bool(record['game_over']),
+                                     record['rewards'].tolist(), record['timestep_reward'],
+                                     record['cumulated_reward']])
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Convert binary machine logs to the csv machine logs layout.')
+    parser.add_argument('binary_file', type=str)
+    parser.add_argument('csv_file', type=str)
+    args = parser.parse_args()
+    convert_to_csv(args.binary_file, args.csv_file)
@@ -0,0 +1,274 @@
+import multiprocessing
+import os
+import queue
+import time
+
+from runners.runner import CustomRunner
+
+
+def worker_file_path(file_path, worker_id):
+    """
+    :param file_path: A log file path of the learner.
+    :param worker_id: The id of a rollout worker.
+    :return: The corresponding log file path of the worker, or None.
+    """
+
+    if file_path is None:
+        return None
+
+    (root, extension) = os.path.splitext(file_path)
+    return '{}_worker{}{}'.format(root, worker_id, extension)
+
+
+def worker_agent_kwargs(agent_kwargs, worker_id):
+    """
+    :param agent_kwargs: Keyword arguments of the agent of the learner.
+    :param worker_id: The id of a worker.
+    :return: The keyword arguments of the agent of the worker, with its
+             own replay file.
+    """
+
+    agent_kwargs = dict(agent_kwargs or {})
+    if agent_kwargs.get('replay_file_path') is not None:
+        agent_kwargs['replay_file_path'] = worker_file_path(agent_kwargs['replay_file_path'], worker_id)
+
+    return agent_kwargs
+
+
+def run_rollout_worker(worker_id, agent_class, agent_kwargs, environment_class, environment_kwargs, runner_kwargs,
+                       iterations, episodes, transitions_queue, policy_queue):
+    """
+    Entry point of a rollout worker process. It plays the episodes with
+    its own environment and sends the transitions to the learner. Its
+    agent starts from the policy first put on its policy queue.
+
+    :param worker_id: The id of the worker.
+    :param agent_class: The class of agent to instantiate.
+    :param agent_kwargs: Keyword arguments of the agent.
+    :param environment_class: The class of environment to
+                              instantiate, e.g. RunEnv.
+    :param environment_kwargs: Keyword arguments of the environment.
+    :param runner_kwargs: Keyword arguments of the RolloutRunner.
+    :param iterations: Maximum number of iterations per episode.
+    :param episodes: Number of episodes to play.
+    :param transitions_queue: Queue of the learner.
+    :param policy_queue: Queue of the policies pushed by the learner.
+    :return: void
+    """
+
+    environment = environment_class(**environment_kwargs)
+    agent = agent_class(environment, **agent_kwargs)
+    agent.set_policy_parameters(policy_queue.get())
+    runner = RolloutRunner(environment, agent, worker_id, transitions_queue, policy_queue, **runner_kwargs)
+
+    try:
+        runner.loop(iterations, episodes)
+    finally:
+        transitions_queue.put((worker_id, None, 0, 0.0))
+
+
+class RolloutRunner(CustomRunner):
+    """
+    The runner of a rollout worker. Its agent only records the
+    transitions. They are sent to the learner at the end of every
+    episode, and the last policy pushed by the learner replaces the
+    policy of the agent.
+    """
+
+    def __init__(self, environment, agent, worker_id, transitions_queue, policy_queue, **kwargs):
+        super().__init__(environment, agent, **kwargs)
+
+        self.worker_id = worker_id
+        self.transitions_queue = transitions_queue
+        self.policy_queue = policy_queue
+
+        self.agent.transitions = []
+
+    def end_episode(self, episode, steps, cumulative_reward):
+        """
+        Send the transitions of the episode and pick up the last policy.
+        """
+
+        self.transitions_queue.put((self.worker_id, self.agent.transitions, steps, cumulative_reward))
+        self.agent.transitions = []
+
+        if self.machine_log is not None:
+            self.machine_log.flush()
+
+        new_policy = None
+        try:
+            while True:
+                new_policy = self.policy_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+        if new_policy is not None:
+            self.agent.set_policy_parameters(new_policy)
+
+
+class ParallelRunner(CustomRunner):
+    """
+    Run the episodes in parallel rollout workers, each one in its own
+    process with its own environment playing its own chronics (the
+    start id of worker i is shifted by i).
+
+    The agent of this runner is the learner: it owns the MDP and the
+    policy, learns from the transitions sent by the workers and
+    periodically pushes its policy back to them.
+    """
+
+    def __init__(self,
+                 environment,
+                 agent,
+                 environment_kwargs,
+                 workers,
+                 render=False,
+                 verbose=False,
+                 vverbose=False,
+                 parameters=None,
+                 level=None,
+                 max_iter=None,
+                 log_file_path='runner.log',
+                 machine_log_file_path='machine_logs.csv',
+                 checkpoint_dir=None,
+                 checkpoint_interval=10,
+                 policy_sync_interval=None,
+                 machine_log_format='csv',
+                 instrumentation=None,
+                 prewarm_reset=False,
+                 agent_kwargs=None):
+        """
+        :param environment_kwargs: Keyword arguments to instantiate the
+            environment of each worker, of the same class as the
+            environment of the learner.
+        :param workers: Number of rollout worker processes.
+        :param policy_sync_interval: Number of learned episodes between
+            two policy pushes. By default the number of workers, so
+            each worker gets about one update per episode it plays.
+        :param agent_kwargs: Keyword arguments the agent of the learner
+            was instantiated with, given to the agents of the workers.
+        """
+
+        assert workers > 0
+
+        super().__init__(environment,
+                         agent,
+                         render,
+                         verbose,
+                         vverbose,
+                         parameters,
+                         level,
+                         max_iter,
+                         log_file_path,
+                         machine_log_file_path,
+                         checkpoint_dir,
+                         checkpoint_interval,
+                         machine_log_format,
+                         instrumentation,
+                         prewarm_reset)
+
+        self.environment_kwargs = environment_kwargs
+        self.agent_kwargs = agent_kwargs or {}
+        self.workers = workers
+        self.policy_sync_interval = policy_sync_interval or workers
+        self.log_file_path = log_file_path
+        self.machine_log_file_path = machine_log_file_path
+        self.machine_log_format = machine_log_format
+
+    def loop(self, iterations, episodes=1):
+        """
+        Runs the given number of episodes split over the workers.
+
+        :param iterations: int of maximum number of iterations per episode
+        :param episodes: int of number of episodes
+        :return: The cumulative reward of the last learned episode.
+        """
+
+        context = multiprocessing.get_context('spawn')
+        transitions_queue = context.Queue()
+        policy_queues = list()
+        processes = list()
+
+        for worker_id in range(self.workers):
+            environment_kwargs = dict(self.environment_kwargs)
+            environment_kwargs['start_id'] = environment_kwargs.get('start_id', 0) + worker_id
+            runner_kwargs = dict(parameters=self.parameters,
+                                 level=self.level,
+                                 max_iter=self.max_iter,
+                                 log_file_path=worker_file_path(self.log_file_path, worker_id),
+                                 machine_log_file_path=worker_file_path(self.machine_log_file_path, worker_id),
+                                 machine_log_format=self.machine_log_format,
+                                 prewarm_reset=self.prewarm_reset)
+            worker_episodes = episodes // self.workers + (1 if worker_id < episodes % self.workers else 0)
+
+            # The workers start from the policy of the learner, e.g. a resumed one.
+            policy_queue = context.Queue()
+            policy_queue.put(self.agent.policy_parameters())
+            process = context.Process(target=run_rollout_worker,
+                                      args=(worker_id, type(self.agent),
+                                            worker_agent_kwargs(self.agent_kwargs, worker_id),
+                                            type(self.environment), environment_kwargs, runner_kwargs, iterations,
+                                            worker_episodes, transitions_queue, policy_queue),
+                                      daemon=True)
+            process.start()
+            policy_queues.append(policy_queue)
+            processes.append(process)
+
+        start_time = time.monotonic()
+        total_steps = 0
+        learned_episodes = 0
+        running_workers = self.workers
+        cumulative_reward = 0.0
+        try:
+            while running_workers > 0:
+                try:
+                    (worker_id, transitions, steps, episode_reward) = transitions_queue.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes):
+                        raise RuntimeError('The rollout workers terminated without finishing their episodes.')
+                    continue
+
+                if transitions is None:
+                    running_workers -= 1
+                    continue
+
+                with self.instrumentation.phase('learn'):
+                    self.agent.learn_transitions(transitions)
+                total_steps += steps
+                learned_episodes += 1
+                cumulative_reward = episode_reward
+                self.logger.info("ITERATION %d - worker %d - cumulative reward: %.2f" %
+                                 (learned_episodes - 1, worker_id, cumulative_reward))
+
+                if learned_episodes % self.policy_sync_interval == 0:
+                    with self.instrumentation.phase('policy_sync'):
+                        for policy_queue in policy_queues:
+                            policy_queue.put(self.agent.policy_parameters())
+
+                if learned_episodes % self.checkpoint_interval == 0:
+                    self.save_checkpoint(learned_episodes - 1)
+        finally:
+            # The learner writes no machine logs.
+            self.close_machine_log()
+
+        for process in processes:
+            process.join()
+
+        # The workers may have ended without picking up the last policies.
+        for policy_queue in policy_queues:
+            policy_queue.cancel_join_thread()
+            policy_queue.close()
+
+        if learned_episodes % self.checkpoint_interval != 0:
+            self.save_checkpoint(learned_episodes - 1)
+
+        elapsed_time = time.monotonic() - start_time
+        self.logger.info("%d steps in %.1fs with %d workers: %.1f steps/s" %
+                         (total_steps, elapsed_time, self.workers, total_steps / max(elapsed_time, 1e-9)))
+
+        # The learner plays no step, its phases are summarized once.
+        if self.instrumentation.enabled:
+            self.instrumentation.write_summary(self.agent)
+        self.instrumentation.close(self.agent)
+
+        return cumulative_reward
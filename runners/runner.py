@@ -1,18 +1,24 @@
-from pypownet.environment import RunEnv
-from pypownet.runner import Runner
-from agents.agent import CustomAgent
+import concurrent.futures
+import csv
+import logging
 
+from agents.agent import CustomAgent, ENVIRONMENTS
+from agents.instrumentation import Instrumentation
+from runners.machine_log import CSV_HEADER, MachineLogBuffer
 
-class CustomRunner(Runner):
+
+class CustomRunner:
     """
     This is the machinery that runs the agent in an environment.
     It is purely related to perform policy inference at each time step
     given the last observations, and feeding the reward signal to the
     appropriate function (feed_return) of the CustomAgent.
 
-    The only difference between this class and its super is that it
-    overrides the step method to inform the agent about the end of
-    an episode.
+    It has the constructor, logs and machine logs of pypownet's Runner,
+    without inheriting from it: pypownet's Runner only accepts its own
+    RunEnv and Agent, and pypownet may not be installed when playing in
+    the surrogate environment. Unlike pypownet's Runner, it informs the
+    agent about the end of an episode.
     """
 
     def __init__(self,
@@ -25,22 +31,94 @@ class CustomRunner(Runner):
                  level=None,
                  max_iter=None,
                  log_file_path='runner.log',
-                 machine_log_file_path='machine_logs.csv'):
+                 machine_log_file_path='machine_logs.csv',
+                 checkpoint_dir=None,
+                 checkpoint_interval=10,
+                 machine_log_format='csv',
+                 instrumentation=None,
+                 prewarm_reset=False):
+        """
+        :param log_file_path: File where the logs are written, or None
+                              for no log file.
+        :param machine_log_file_path: File where the machine logs are
+                                      written, or None for no machine
+                                      logs.
+        :param checkpoint_dir: Optional directory where the agent is
+                               checkpointed.
+        :param checkpoint_interval: Number of episodes between two
+                                    checkpoints.
+        :param machine_log_format: 'csv' to write a row per step in the
+            machine logs file, 'binary' to buffer the steps of an
+            episode and write them in bulk at its end (see
+            runners.machine_log to convert them to csv).
+        :param instrumentation: Optional Instrumentation timing the
+            phases of the steps, shared with the agent. By default a
+            disabled one, which can be enabled at any time.
+        :param prewarm_reset: Reset the environment for the next episode
+            in a background thread, while the agent learns from the
+            last step and the episode is logged and checkpointed. What
+            the agent and the logs read from the environment about the
+            last step is read before the reset starts. In both modes
+            the agent is fed the terminal observation of the episode.
+        """
 
         # Sanity checks.
-        assert isinstance(environment, RunEnv)
+        assert isinstance(environment, ENVIRONMENTS)
         assert isinstance(agent, CustomAgent)
+        assert checkpoint_interval > 0
+        assert machine_log_format in ('csv', 'binary')
+
+        self.environment = environment
+        self.agent = agent
+        self.render = render
+        self.verbose = verbose
+        self.vverbose = vverbose
+        self.parameters = parameters
+        self.level = level
+        self.max_iter = max_iter
+
+        self.logger = logging.getLogger('pypownet')
+        if log_file_path is not None:
+            file_handler = logging.FileHandler(filename=log_file_path, mode='w+')
+            file_handler.setLevel(logging.DEBUG)
+            file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            self.logger.addHandler(file_handler)
+        if verbose or vverbose:
+            console_handler = logging.StreamHandler()
+            console_handler.setLevel(logging.DEBUG if vverbose and verbose else logging.INFO)
+            console_handler.setFormatter(logging.Formatter('%(levelname)s        %(message)s'))
+            self.logger.addHandler(console_handler)
+            self.logger.setLevel(logging.DEBUG if vverbose else logging.INFO)
+
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_interval = checkpoint_interval
 
-        super().__init__(environment,
-                         agent,
-                         render,
-                         verbose,
-                         vverbose,
-                         parameters,
-                         level,
-                         max_iter,
-                         log_file_path,
-                         machine_log_file_path)
+        """The csv machine logs, a row per step, or the binary machine logs."""
+        self.machine_log_file = None
+        self.csv_writer = None
+        self.machine_log = None
+        if machine_log_file_path is not None and machine_log_format == 'csv':
+            self.machine_log_file = open(machine_log_file_path, 'w', newline='')
+            self.csv_writer = csv.writer(self.machine_log_file, delimiter=';')
+            self.csv_writer.writerow(CSV_HEADER)
+        elif machine_log_file_path is not None:
+            self.machine_log = MachineLogBuffer(machine_log_file_path, parameters, level, max_iter)
+
+        if self.render:
+            self.environment.render()
+
+        self.instrumentation = Instrumentation() if instrumentation is None else instrumentation
+        if self.instrumentation.logger is None:
+            self.instrumentation.logger = self.logger
+        self.agent.instrumentation = self.instrumentation
+
+        self.prewarm_reset = prewarm_reset
+        """Background reset of the environment, whose result is the first observation of the next episode."""
+        self.pending_reset = None
+        self.reset_executor = None
+        """Chronic name and datetime of the last step, read before a background reset."""
+        self.step_chronic_name = None
+        self.step_datetime = None
 
     def step(self, observation):
         """
@@ -53,28 +131,45 @@ class CustomRunner(Runner):
         :return: (new observation, action taken, reward received)
         """
 
-        self.logger.debug('observation: ' + str(self.environment.observation_space.array_to_observation(observation)))
-        action = self.agent.act(observation)
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            self.logger.debug('observation: %s', self.environment.observation_space.array_to_observation(observation))
+        with self.instrumentation.phase('act'):
+            action = self.agent.act(observation)
 
         # Update the environment with the chosen action
-        observation, rewards_list, done, info = self.environment.step(action, do_sum=False)
+        with self.instrumentation.phase('environment.step'):
+            observation, rewards_list, done, info = self.environment.step(action, do_sum=False)
+        if not self.agent.frozen:
+            self.agent.observe_action_outcome(done or bool(info))
         if done:
             self.logger.warning('\b\b\bGAME OVER! Resetting grid... (hint: %s)' % info.text)
-            observation = self.environment.reset()
+            if self.prewarm_reset:
+                self.start_reset()
+                self.agent.observation_datetime = self.step_datetime
         elif info:
             self.logger.warning(info.text)
 
         reward = sum(rewards_list)
 
-        if self.render:
+        if self.render and self.pending_reset is None:
             self.environment.render()
 
-        self.agent.feed_return(action, observation, rewards_list, done)
+        # The agent learns from the terminal observation, the environment is reset afterwards.
+        if not self.agent.frozen:
+            with self.instrumentation.phase('feed_return'):
+                self.agent.feed_return(action, observation, rewards_list, done)
+        self.agent.observation_datetime = None
 
-        self.logger.debug('action: {}'.format(action))
-        self.logger.debug('reward: {}'.format('[' + ','.join(list(map(str, rewards_list))) + ']'))
-        self.logger.debug('done: {}'.format(done))
-        self.logger.debug('info: {}'.format(info if not info else info.text))
+        if done and not self.prewarm_reset:
+            with self.instrumentation.phase('environment.reset'):
+                observation = self.environment.reset()
+
+        if debug:
+            self.logger.debug('action: {}'.format(action))
+            self.logger.debug('reward: {}'.format('[' + ','.join(list(map(str, rewards_list))) + ']'))
+            self.logger.debug('done: {}'.format(done))
+            self.logger.debug('info: {}'.format(info if not info else info.text))
 
         return observation, action, reward, rewards_list, done
 
@@ -87,23 +182,138 @@ class CustomRunner(Runner):
         :return:
         """
 
+        log_steps = self.logger.isEnabledFor(logging.INFO)
         cumulative_reward = 0.0
-        for i_episode in range(episodes):
-            cumulative_reward = 0.0
-            step = 0
-            observation = self.environment.reset()
-            while True:
-                step += 1
-                (observation, action, reward, reward_as_list, done) = self.step(observation)
-                cumulative_reward += reward + 5
-                self.logger.info("step %d - episode %d - reward: %.2f; " % (step, i_episode, reward + 5))
-                self.dump_machinelogs(step, done, reward + 5, reward_as_list, cumulative_reward,
-                                      self.environment.get_current_datetime())
-                if done:
-                    break
-
-                if step > iterations:
-                    break
-            self.logger.info("ITERATION %d - cumulative reward: %.2f" % (i_episode, cumulative_reward))
+        # The first observation of the next episode, when the environment was already reset.
+        observation = None
+        try:
+            for i_episode in range(episodes):
+                cumulative_reward = 0.0
+                step = 0
+                if self.pending_reset is not None:
+                    with self.instrumentation.phase('environment.reset.wait'):
+                        observation = self.pending_reset.result()
+                    self.pending_reset = None
+                elif observation is None:
+                    with self.instrumentation.phase('environment.reset'):
+                        observation = self.environment.reset()
+                while True:
+                    step += 1
+                    (observation, action, reward, reward_as_list, done) = self.step(observation)
+                    cumulative_reward += reward + 5
+                    with self.instrumentation.phase('logging'):
+                        if log_steps:
+                            self.logger.info("step %d - episode %d - reward: %.2f; " % (step, i_episode, reward + 5))
+                        datetime = self.step_datetime if self.pending_reset is not None else \
+                            self.environment.get_current_datetime()
+                        self.dump_machinelogs(step, done, reward + 5, reward_as_list, cumulative_reward, datetime)
+                    self.instrumentation.end_step(self.agent)
+                    if done:
+                        # The step already reset the environment, or is resetting it.
+                        if self.pending_reset is not None:
+                            observation = None
+                        break
+
+                    if step > iterations:
+                        observation = None
+                        if self.prewarm_reset and i_episode < episodes - 1:
+                            self.start_reset()
+                        break
+                self.logger.info("ITERATION %d - cumulative reward: %.2f" % (i_episode, cumulative_reward))
+                self.end_episode(i_episode, step, cumulative_reward)
+
+            if self.pending_reset is not None:
+                self.pending_reset.result()
+                self.pending_reset = None
+
+            if episodes % self.checkpoint_interval != 0:
+                self.save_checkpoint(episodes - 1)
+        finally:
+            if self.reset_executor is not None:
+                self.reset_executor.shutdown()
+                self.reset_executor = None
+                self.pending_reset = None
+            self.close_machine_log()
+
+        self.instrumentation.close(self.agent)
 
         return cumulative_reward
+
+    def dump_machinelogs(self, timestep_id, done, reward, reward_aslist, cumul_rew, datetime):
+        """
+        Log the step in the machine logs, buffered if they are binary.
+        The chronic name is read before a background reset, if any.
+        """
+
+        if self.csv_writer is None and self.machine_log is None:
+            return
+
+        chronic_name = self.step_chronic_name if self.pending_reset is not None else \
+            self.environment.get_current_chronic_name()
+        if self.csv_writer is not None:
+            self.csv_writer.writerow([self.parameters, self.level, chronic_name, self.max_iter, timestep_id,
+                                      datetime.strftime('%Y-%m-%d %H:%M'), done, reward_aslist, reward, cumul_rew])
+        else:
+            self.machine_log.append(chronic_name, timestep_id, datetime, done, reward_aslist, reward, cumul_rew)
+
+    def close_machine_log(self):
+        """
+        Flush and close the machine logs, if any.
+
+        :return: void
+        """
+
+        if self.machine_log is not None:
+            self.machine_log.close()
+        if self.machine_log_file is not None:
+            self.machine_log_file.close()
+
+    def start_reset(self):
+        """
+        Reset the environment in a background thread. The chronic name
+        and datetime of the last step are read before.
+
+        :return: void
+        """
+
+        assert self.pending_reset is None
+
+        self.step_chronic_name = self.environment.get_current_chronic_name()
+        self.step_datetime = self.environment.get_current_datetime()
+
+        if self.reset_executor is None:
+            self.reset_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.pending_reset = self.reset_executor.submit(self.environment.reset)
+
+    def end_episode(self, episode, steps, cumulative_reward):
+        """
+        Called by loop at the end of every episode. Override this
+        method to act between episodes.
+
+        :param episode: The index of the terminated episode.
+        :param steps: The number of steps played in the episode.
+        :param cumulative_reward: The cumulative reward of the episode.
+        :return: void
+        """
+
+        if self.machine_log is not None:
+            self.machine_log.flush()
+
+        if (episode + 1) % self.checkpoint_interval == 0:
+            self.save_checkpoint(episode)
+
+    def save_checkpoint(self, episode):
+        """
+        Checkpoint the agent if a checkpoint directory is set.
+
+        :param episode: The index of the last learned episode.
+        :return: void
+        """
+
+        if self.checkpoint_dir is None or self.agent.frozen:
+            return
+
+        checkpoint_path = self.agent.save_checkpoint(self.checkpoint_dir, episode=episode,
+                                                     parameters=self.parameters, level=self.level)
+        if checkpoint_path is not None:
+            self.logger.info("checkpoint of episode %d saved in %s" % (episode, checkpoint_path))
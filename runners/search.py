@@ -0,0 +1,171 @@
+import itertools
+import math
+
+import numpy as np
+
+
+def parse_values(text):
+    """
+    Parse the values of a hyperparameter given on the command line.
+
+    :param text: Comma separated values, e.g. "0.05,0.1,0.2", or a
+                 "low:high" range for random search.
+    :return: A list of values, or a (low, high) tuple for a range.
+    """
+
+    if ':' in text:
+        (low, high) = (float(bound) for bound in text.split(':'))
+        assert low <= high
+        return low, high
+
+    values = list()
+    for value in text.split(','):
+        try:
+            values.append(int(value))
+        except ValueError:
+            try:
+                values.append(float(value))
+            except ValueError:
+                values.append(value)
+
+    return values
+
+
+def grid_configurations(space):
+    """
+    :param space: Dict of the hyperparameters to the list of their
+                  values.
+    :return: The list of every combination of values, as dicts.
+    """
+
+    for (name, values) in space.items():
+        if isinstance(values, tuple):
+            raise ValueError('The range of {} can only be sampled by a random search.'.format(name))
+
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_configurations(space, trials, random_state=np.random):
+    """
+    :param space: Dict of the hyperparameters to the list of their
+                  values, drawn uniformly, or to a (low, high) range,
+        drawn log-uniformly if both bounds are positive and uniformly
+        otherwise.
+    :param trials: The number of configurations.
+    :param random_state: The random generator.
+    :return: A list of trials configurations, as dicts.
+    """
+
+    configurations = list()
+    for _ in range(trials):
+        configuration = dict()
+        for (name, values) in space.items():
+            if not isinstance(values, tuple):
+                configuration[name] = values[random_state.randint(len(values))]
+            elif values[0] > 0:
+                configuration[name] = float(math.exp(random_state.uniform(math.log(values[0]), math.log(values[1]))))
+            else:
+                configuration[name] = float(random_state.uniform(*values))
+        configurations.append(configuration)
+
+    return configurations
+
+
+def running_mean(rewards, episodes):
+    """
+    :param rewards: The cumulative rewards of the episodes of a trial.
+    :param episodes: The number of first episodes averaged.
+    :return: Their mean cumulative reward.
+    """
+
+    return float(np.mean(rewards[:episodes]))
+
+
+class MedianStoppingRule:
+    """
+    Stop a trial whose mean cumulative reward is below the median of
+    the means of the other trials over the same number of episodes.
+    No trial is stopped before grace_episodes, nor before
+    min_trials other trials are compared to it.
+    """
+
+    def __init__(self, grace_episodes=10, min_trials=3):
+        assert grace_episodes > 0
+        assert min_trials > 0
+
+        self.grace_episodes = grace_episodes
+        self.min_trials = min_trials
+
+    def should_stop(self, trial_id, rewards):
+        """
+        :param trial_id: The trial which just finished an episode.
+        :param rewards: Dict of every trial to the list of the
+                        cumulative rewards of its episodes.
+        :return: True if the trial should be stopped.
+        """
+
+        episodes = len(rewards[trial_id])
+        if episodes < self.grace_episodes:
+            return False
+
+        others = [running_mean(other_rewards, episodes) for (other_id, other_rewards) in rewards.items()
+                  if other_id != trial_id and len(other_rewards) >= episodes]
+        if len(others) < self.min_trials:
+            return False
+
+        return running_mean(rewards[trial_id], episodes) < float(np.median(others))
+
+
+class SuccessiveHalvingRule:
+    """
+    Asynchronous successive halving: the rungs are at min_episodes,
+    min_episodes * reduction_factor, min_episodes * reduction_factor^2,
+    ... episodes. A trial reaching a rung goes on only if its mean
+    cumulative reward is in the top 1 / reduction_factor of the trials
+    which reached the rung, once reduction_factor trials did.
+    """
+
+    def __init__(self, min_episodes=10, reduction_factor=3):
+        assert min_episodes > 0
+        assert reduction_factor > 1
+
+        self.min_episodes = min_episodes
+        self.reduction_factor = reduction_factor
+
+    def is_rung(self, episodes):
+        """
+        :return: True if a rung is at this number of episodes.
+        """
+
+        rung = self.min_episodes
+        while rung < episodes:
+            rung *= self.reduction_factor
+
+        return rung == episodes
+
+    def should_stop(self, trial_id, rewards):
+        """
+        :param trial_id: The trial which just finished an episode.
+        :param rewards: Dict of every trial to the list of the
+                        cumulative rewards of its episodes.
+        :return: True if the trial should be stopped.
+        """
+
+        episodes = len(rewards[trial_id])
+        if not self.is_rung(episodes):
+            return False
+
+        means = [running_mean(other_rewards, episodes) for other_rewards in rewards.values()
+                 if len(other_rewards) >= episodes]
+        if len(means) < self.reduction_factor:
+            return False
+
+        kept = max(1, len(means) // self.reduction_factor)
+        threshold = sorted(means, reverse=True)[kept - 1]
+
+        return running_mean(rewards[trial_id], episodes) < threshold
+
+
+"""Early stopping rules by name."""
+STOPPING_RULES = {'median': MedianStoppingRule, 'halving': SuccessiveHalvingRule}
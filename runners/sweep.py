@@ -0,0 +1,307 @@
+import concurrent.futures
+import csv
+import importlib
+import logging
+import multiprocessing
+import os
+import queue
+
+import numpy as np
+
+import runners.search as search
+from runners.runner import CustomRunner
+
+"""Columns of the results table after the hyperparameters."""
+RESULT_COLUMNS = ('status', 'episodes', 'mean_reward', 'best_reward', 'last_reward')
+
+
+def resolve_agent_class(name):
+    """
+    :param name: A class of the agents package, e.g. 'agent.QLearning'.
+    :return: The class.
+    """
+
+    (module_name, class_name) = name.rsplit('.', 1)
+    return getattr(importlib.import_module('agents.' + module_name), class_name)
+
+
+class TrialStopped(Exception):
+    """
+    Raised in a trial stopped early by the sweep.
+    """
+
+
+class TrialRunner(CustomRunner):
+    """
+    The runner of a sweep trial: it streams the cumulative reward of
+    every episode to the sweep, and stops once the sweep stopped the
+    trial.
+    """
+
+    def __init__(self, environment, agent, trial_id, rewards_queue, stopped_trials, **kwargs):
+        super().__init__(environment, agent, **kwargs)
+
+        self.trial_id = trial_id
+        self.rewards_queue = rewards_queue
+        self.stopped_trials = stopped_trials
+
+    def end_episode(self, episode, steps, cumulative_reward):
+        """
+        Report the episode, and stop if the sweep says so.
+        """
+
+        super().end_episode(episode, steps, cumulative_reward)
+        self.rewards_queue.put((self.trial_id, cumulative_reward))
+
+        if self.stopped_trials.get(self.trial_id, False):
+            raise TrialStopped()
+
+
+def run_trial(trial_id, configuration, environment_class, environment_kwargs, iterations, episodes, log_dir,
+              rewards_queue, stopped_trials, agent_kwargs=None):
+    """
+    Entry point of a trial in a process of the pool.
+
+    :param trial_id: The id of the trial.
+    :param configuration: Dict of the agent class name and of the
+                          hyperparameters of the trial.
+    :param environment_class: The class of environment to instantiate.
+    :param environment_kwargs: Keyword arguments of the environment.
+    :param iterations: Maximum number of iterations per episode.
+    :param episodes: Number of episodes to play if not stopped.
+    :param log_dir: Directory of the logs of the trials.
+    :param rewards_queue: Queue of the (trial_id, cumulative reward) of
+                          the episodes.
+    :param stopped_trials: Shared dict of the ids of the stopped
+                           trials.
+    :param agent_kwargs: Optional keyword arguments of the agents,
+                         e.g. their action_value_dtype.
+    :return: True if the trial was stopped early.
+    """
+
+    hyperparameters = dict(configuration)
+    agent_class = resolve_agent_class(hyperparameters.pop('agent'))
+
+    environment = environment_class(**environment_kwargs)
+    agent = agent_class(environment, **(agent_kwargs or {}))
+    agent.set_hyperparameters(**hyperparameters)
+
+    runner = TrialRunner(environment, agent, trial_id, rewards_queue, stopped_trials,
+                         log_file_path=os.path.join(log_dir, 'trial{}.log'.format(trial_id)),
+                         machine_log_file_path=os.path.join(log_dir, 'trial{}_machine_logs.bin'.format(trial_id)),
+                         machine_log_format='binary')
+    try:
+        runner.loop(iterations, episodes)
+    except TrialStopped:
+        return True
+
+    return False
+
+
+def run_sweep(configurations, environment_class, environment_kwargs, iterations, episodes, processes=None,
+              stopping_rule=None, log_dir='sweep_logs', logger=None, agent_kwargs=None):
+    """
+    Run a trial per configuration in a pool of processes, at most
+    processes trials at once. The cumulative rewards of the episodes
+    are streamed back, and the stopping rule stops the trials clearly
+    worse than the others.
+
+    :param configurations: List of dicts of the agent class name, key
+                           'agent', and of the hyperparameters.
+    :param environment_class: The class of environment, e.g. RunEnv.
+    :param environment_kwargs: Keyword arguments of the environment,
+                               the same chronics for every trial.
+    :param iterations: Maximum number of iterations per episode.
+    :param episodes: Number of episodes of a trial.
+    :param processes: Size of the pool, by default the number of CPUs.
+    :param stopping_rule: Optional rule with should_stop(trial_id,
+                          rewards), see runners.search.
+    :param log_dir: Directory of the logs of the trials.
+    :param logger: Optional logger of the progress.
+    :param agent_kwargs: Optional keyword arguments of the agents of
+                         every trial, e.g. their action_value_dtype.
+    :return: The results, a dict per trial with the configuration and
+             RESULT_COLUMNS, the best mean reward first.
+    """
+
+    os.makedirs(log_dir, exist_ok=True)
+    context = multiprocessing.get_context('spawn')
+    rewards = {trial_id: [] for trial_id in range(len(configurations))}
+    statuses = dict()
+
+    with context.Manager() as manager:
+        rewards_queue = manager.Queue()
+        stopped_trials = manager.dict()
+
+        def drain(timeout):
+            try:
+                while True:
+                    (trial_id, cumulative_reward) = rewards_queue.get(timeout=timeout)
+                    rewards[trial_id].append(cumulative_reward)
+                    if stopping_rule is not None and trial_id not in stopped_trials and \
+                            len(rewards[trial_id]) < episodes and stopping_rule.should_stop(trial_id, rewards):
+                        stopped_trials[trial_id] = True
+                        if logger is not None:
+                            logger.info('trial %d stopped after %d episodes' % (trial_id, len(rewards[trial_id])))
+                    timeout = 0
+            except queue.Empty:
+                pass
+
+        with concurrent.futures.ProcessPoolExecutor(processes, mp_context=context) as executor:
+            futures = {executor.submit(run_trial, trial_id, configuration, environment_class, environment_kwargs,
+                                       iterations, episodes, log_dir, rewards_queue, stopped_trials,
+                                       agent_kwargs): trial_id
+                       for (trial_id, configuration) in enumerate(configurations)}
+            pending = set(futures)
+            while pending:
+                drain(0.5)
+                for future in [future for future in pending if future.done()]:
+                    pending.remove(future)
+                    trial_id = futures[future]
+                    if future.exception() is not None:
+                        statuses[trial_id] = 'failed'
+                        if logger is not None:
+                            logger.error('trial %d failed: %s' % (trial_id, future.exception()))
+                    else:
+                        statuses[trial_id] = 'stopped' if future.result() else 'completed'
+                        if logger is not None:
+                            logger.info('trial %d %s' % (trial_id, statuses[trial_id]))
+            drain(0)
+
+    results = list()
+    for (trial_id, configuration) in enumerate(configurations):
+        trial_rewards = rewards[trial_id]
+        results.append(dict(configuration,
+                            trial=trial_id,
+                            status=statuses[trial_id],
+                            episodes=len(trial_rewards),
+                            mean_reward=float(np.mean(trial_rewards)) if trial_rewards else float('nan'),
+                            best_reward=max(trial_rewards) if trial_rewards else float('nan'),
+                            last_reward=trial_rewards[-1] if trial_rewards else float('nan')))
+
+    # The trials which played no episode, e.g. failed, come last.
+    return sorted(results, key=lambda result: (result['episodes'] == 0,
+                                               -result['mean_reward'] if result['episodes'] > 0 else 0.0))
+
+
+def format_table(rows, columns):
+    """
+    :param rows: Dicts of the columns.
+    :param columns: The columns of the table.
+    :return: The rows as a text table, the floats with 3 decimals.
+    """
+
+    cells = [[('%.3f' % row[column]) if isinstance(row[column], float) else str(row[column]) for column in columns]
+             for row in rows]
+    widths = [max(len(column), *(len(line[i]) for line in cells)) for (i, column) in enumerate(columns)]
+
+    lines = ['  '.join(column.ljust(width) for (column, width) in zip(columns, widths))]
+    lines += ['  '.join(value.ljust(width) for (value, width) in zip(line, widths)) for line in cells]
+
+    return '\n'.join(lines)
+
+
+def write_table(rows, columns, csv_file_path):
+    """
+    Write rows in a csv file, with the delimiter of the machine logs.
+
+    :param rows: Dicts of the columns.
+    :param columns: The columns of the table.
+    :param csv_file_path: The csv file.
+    :return: void
+    """
+
+    with open(csv_file_path, 'w', newline='') as csv_file:
+        csv_writer = csv.writer(csv_file, delimiter=';')
+        csv_writer.writerow(columns)
+        for row in rows:
+            csv_writer.writerow([row[column] for column in columns])
+
+
+def format_results(results, names):
+    """
+    :param results: The results of run_sweep.
+    :param names: The configuration names, e.g. agent and alpha.
+    :return: The results as a text table.
+    """
+
+    return format_table(results, ['trial'] + list(names) + list(RESULT_COLUMNS))
+
+
+def write_results(results, names, csv_file_path):
+    """
+    Write the results of run_sweep in a csv file.
+
+    :return: void
+    """
+
+    write_table(results, ['trial'] + list(names) + list(RESULT_COLUMNS), csv_file_path)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    import agents.storage as storage
+    import environments.run_env as run_env
+    from environments.surrogate import SurrogateEnvironment
+
+    parser = argparse.ArgumentParser(description='Sweep the hyperparameters of the agents over trials run in '
+                                                 'parallel, stopping the worst trials early.')
+    parser.add_argument('-a', '--agent', type=str, default='agent.QLearning',
+                        help='comma separated agent classes (default agent.QLearning)')
+    for name in ('alpha', 'gamma', 'epsilon', 'mdp_iteration', 'trace_decay'):
+        parser.add_argument('--' + name.replace('_', '-'), dest=name, type=str, default=None,
+                            help='comma separated values of %s, or a low:high range with --random' % name)
+    parser.add_argument('--action-value-dtype', choices=storage.VALUE_DTYPES, default='float32',
+                        help='type of the action values of the tabular agents (default "float32")')
+    parser.add_argument('--random', metavar='TRIALS', type=int, default=0,
+                        help='sample this number of configurations instead of the whole grid')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random search')
+    parser.add_argument('-n', '--niter', type=int, metavar='NUMBER_EPISODES', default=100,
+                        help='number of episodes of a trial (default 100)')
+    parser.add_argument('--iterations', type=int, default=200,
+                        help='maximum number of iterations per episode (default 200)')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of trials run at once (default the number of CPUs)')
+    parser.add_argument('--rule', choices=('none',) + tuple(search.STOPPING_RULES), default='median',
+                        help='early stopping rule (default median)')
+    parser.add_argument('--grace', type=int, default=10,
+                        help='episodes before a trial can be stopped, the first rung of halving (default 10)')
+    parser.add_argument('--reduction-factor', type=int, default=3,
+                        help='halving keeps the top 1/REDUCTION_FACTOR trials at each rung (default 3)')
+    parser.add_argument('-p', '--parameters', metavar='PARAMETERS_FOLDER', default='./parameters/default14/',
+                        type=str)
+    parser.add_argument('-lv', '--level', metavar='GAME_LEVEL', type=str, default='level0')
+    parser.add_argument('-s', '--start-id', metavar='CHRONIC_START_ID', type=int, default=0)
+    parser.add_argument('--surrogate', action='store_true',
+                        help='play in the DC power flow surrogate instead of pypownet')
+    parser.add_argument('--log-dir', type=str, default='sweep_logs', help='directory of the logs of the trials')
+    parser.add_argument('-o', '--output', type=str, default=None, help='csv file of the results')
+    args = parser.parse_args()
+    if not args.surrogate and not run_env.INSTALLED:
+        parser.error('pypownet is not installed, see the README, or play in the surrogate environment with --surrogate')
+
+    space = {'agent': args.agent.split(',')}
+    for name in ('alpha', 'gamma', 'epsilon', 'mdp_iteration', 'trace_decay'):
+        if getattr(args, name) is not None:
+            space[name] = search.parse_values(getattr(args, name))
+    if args.random > 0:
+        configurations = search.random_configurations(space, args.random, np.random.RandomState(args.seed))
+    else:
+        configurations = search.grid_configurations(space)
+
+    rule = None
+    if args.rule == 'median':
+        rule = search.MedianStoppingRule(args.grace)
+    elif args.rule == 'halving':
+        rule = search.SuccessiveHalvingRule(args.grace, args.reduction_factor)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    environment_kwargs = dict(parameters_folder=args.parameters, game_level=args.level, start_id=args.start_id)
+    sweep_results = run_sweep(configurations, SurrogateEnvironment if args.surrogate else run_env.RunEnv,
+                              environment_kwargs, args.iterations, args.niter, args.processes, rule, args.log_dir,
+                              logging.getLogger('sweep'), dict(action_value_dtype=args.action_value_dtype))
+
+    print(format_results(sweep_results, list(space)))
+    if args.output is not None:
+        write_results(sweep_results, list(space), args.output)
@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+import agents.action_mask as action_mask
+import agents.policy as policy
+
+
+class FakeActionSpace:
+    """Two substations linked by two lines, a production on the first one and a load on the second one."""
+    prods_subs_ids = np.array([0])
+    loads_subs_ids = np.array([1])
+    lines_or_subs_id = np.array([0, 0])
+    lines_ex_subs_id = np.array([1, 1])
+
+
+class TestActionMask(unittest.TestCase):
+    """
+    Test the legality mask of the node splitting actions.
+    """
+
+    def test_from_action_space(self):
+        mask = action_mask.ActionMask.from_action_space(FakeActionSpace(), 6)
+
+        self.assertTrue(np.array_equal(mask.legal, [False, False, True, True, True, True]))
+        self.assertEqual(len(mask), 4)
+
+    def test_single_line_substation(self):
+        legal = action_mask.node_splitting_legality((0,), (2,), (0, 1), (1, 2))
+
+        # The substations 0 and 2 have a single line serving their production or load.
+        self.assertTrue(np.array_equal(legal, [False, False, False, True, True, False]))
+        self.assertFalse(legal.flags.writeable)
+
+    def test_without_substations_all_legal(self):
+        mask = action_mask.ActionMask.from_action_space(object(), 3)
+
+        self.assertTrue(np.all(mask.legal))
+
+    def test_rejected_actions_are_masked(self):
+        mask = action_mask.ActionMask(np.ones(3, bool), rejections_threshold=2)
+        mask.observe(0, True)
+        mask.observe(1, False)
+        mask.observe(1, True)
+        mask.observe(1, True)
+
+        self.assertFalse(mask.observe(0, False))
+        self.assertTrue(np.all(mask.legal))
+
+        mask.observe(2, True)
+        self.assertTrue(mask.observe(2, True))
+        self.assertTrue(np.array_equal(mask.legal_actions, [0, 1]))
+
+    def test_last_legal_action_is_kept(self):
+        mask = action_mask.ActionMask(np.array([False, True]), rejections_threshold=1)
+        mask.observe(1, True)
+
+        self.assertTrue(mask.legal[1])
+
+    def test_epsilon_greedy_with_mask(self):
+        np.random.seed(0)
+        mask = action_mask.ActionMask(np.array([False, True, True]))
+        greedy = policy.EpsilonGreedy(2, 3, 0.5, action_mask=mask)
+        action_value_fn = np.array([[9.0, 1.0, 2.0], [9.0, 3.0, 0.0]])
+
+        greedy.improve(action_value_fn)
+        actions = [greedy.get_action(0) for _ in range(100)] + greedy.get_actions(np.ones(100, int)).tolist()
+
+        self.assertTrue(np.array_equal(greedy.policy, [2, 1]))
+        self.assertNotIn(0, actions)
+
+        mask.mark_illegal(2)
+        greedy.epsilon = 0.0
+        self.assertEqual(greedy.get_action(0), 1)
@@ -0,0 +1,70 @@
+import unittest
+import numpy as np
+import agents.action_pool as action_pool
+
+
+class FakeAction:
+    def __init__(self, array):
+        self.node_splitting_subaction = array
+
+    def get_node_splitting_subaction(self):
+        return self.node_splitting_subaction
+
+    def set_node_splitting_subaction(self, new_subaction):
+        self.node_splitting_subaction = new_subaction
+
+
+class FakeActionSpace:
+    def __init__(self, size):
+        self.size = size
+        self.built_actions = 0
+
+    def get_do_nothing_action(self):
+        return np.zeros(self.size, int)
+
+    def array_to_action(self, array):
+        self.built_actions += 1
+        return FakeAction(array)
+
+
+class TestActionPool(unittest.TestCase):
+    """
+    Test the cache of environment actions.
+    """
+
+    def test_action_switches_one_element(self):
+        pool = action_pool.ActionPool(FakeActionSpace(5), 5)
+
+        subaction = pool[3].get_node_splitting_subaction()
+
+        self.assertTrue(np.array_equal(subaction, [0, 0, 0, 1, 0]))
+        self.assertFalse(subaction.flags.writeable)
+
+    def test_actions_are_built_once(self):
+        action_space = FakeActionSpace(5)
+        pool = action_pool.ActionPool(action_space, 5)
+
+        first = pool[2]
+        second = pool[2]
+
+        self.assertIs(first, second)
+        self.assertEqual(action_space.built_actions, 1)
+
+    def test_lru_cap(self):
+        action_space = FakeActionSpace(5)
+        pool = action_pool.ActionPool(action_space, 5, max_size=2)
+
+        pool[0]
+        pool[1]
+        pool[0]
+        pool[2]
+
+        self.assertEqual(len(pool), 2)
+        self.assertIn(0, pool.actions)
+        self.assertNotIn(1, pool.actions)
+
+    def test_fill(self):
+        pool = action_pool.ActionPool(FakeActionSpace(5), 5, max_size=3)
+        pool.fill()
+
+        self.assertEqual(len(pool), 3)
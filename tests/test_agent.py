@@ -0,0 +1,16 @@
+import unittest
+import agents.agent as agent
+from environments.surrogate import SurrogateEnvironment
+
+
+class TestAgent(unittest.TestCase):
+    """
+    Test the construction of the agents in the surrogate environment.
+    """
+
+    def test_dqn_needs_replay(self):
+        environment = SurrogateEnvironment()
+
+        self.assertIsNotNone(agent.DQN(environment, replay_capacity=10).replay_buffer)
+        with self.assertRaises(AssertionError):
+            agent.DQN(environment, replay_capacity=0)
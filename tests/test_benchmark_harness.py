@@ -0,0 +1,36 @@
+import unittest
+import benchmarks.harness as harness
+
+
+class TestBenchmarkHarness(unittest.TestCase):
+    """
+    Test the measures and the regression detection of the benchmarks.
+    """
+
+    def test_case_key(self):
+        self.assertEqual(harness.case_key('MonteCarlo.learn', {'episode_length': 10, 'action_space_size': 56}),
+                         'MonteCarlo.learn[action_space_size=56,episode_length=10]')
+
+    def test_measure(self):
+        def setup():
+            values = list()
+            return (lambda: values.append(bytearray(1024))), 2
+
+        result = harness.measure(setup, repeat=1, min_time=0.001)
+
+        self.assertGreater(result['throughput'], 0.0)
+        self.assertAlmostEqual(result['time_per_operation'] * result['throughput'], 1.0)
+        self.assertGreaterEqual(result['peak_memory'], 1024)
+
+    def test_compare(self):
+        baseline = {'a': {'throughput': 100.0, 'peak_memory': 10 ** 6},
+                    'b': {'throughput': 100.0, 'peak_memory': 10 ** 6},
+                    'c': {'throughput': 100.0, 'peak_memory': 1000}}
+        results = {'a': {'throughput': 90.0, 'peak_memory': 10 ** 6},
+                   'b': {'throughput': 50.0, 'peak_memory': 2 * 10 ** 6},
+                   'c': {'throughput': 100.0, 'peak_memory': 2000},
+                   'd': {'throughput': 1.0, 'peak_memory': 1}}
+
+        regressions = harness.compare(results, baseline, threshold=0.2)
+
+        self.assertEqual(regressions, [('b', 'throughput', 100.0, 50.0), ('b', 'peak_memory', 10 ** 6, 2 * 10 ** 6)])
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import agents.checkpoint as checkpoint
+import agents.storage as storage
+
+
+class TestCheckpoint(unittest.TestCase):
+    """
+    Test the checkpoints of action value functions and policies.
+    """
+
+    def test_save_and_load_dense(self):
+        action_value_fn = np.arange(6, dtype=float).reshape(3, 2)
+        policy = np.array([1, 0, 1])
+
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            checkpoint.save(checkpoint_dir, action_value_fn, policy, {'alpha': 0.1})
+            (action_values, policy_actions, metadata) = checkpoint.load(checkpoint_dir)
+
+            self.assertIsInstance(action_values, np.memmap)
+            self.assertTrue(np.array_equal(action_values, action_value_fn))
+            self.assertTrue(np.array_equal(policy_actions, policy))
+            self.assertEqual(metadata['alpha'], 0.1)
+            self.assertEqual(metadata['action_value_fn'], 'dense')
+
+    def test_loaded_arrays_are_copy_on_write(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            checkpoint.save(checkpoint_dir, np.zeros((2, 2)), np.zeros(2, int), {})
+            (action_values, _, _) = checkpoint.load(checkpoint_dir)
+
+            action_values[0][0] = 1.0
+            (reloaded, _, _) = checkpoint.load(checkpoint_dir)
+
+            self.assertEqual(reloaded[0][0], 0.0)
+
+    def test_save_and_load_sparse(self):
+        store = storage.SparseActionValueStore(2)
+        store[b'\x01\x00'][1] = 2.0
+        store[b'\x00\x00'][0] = 1.0
+        policy = {b'\x01\x00': 1}
+
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            checkpoint.save(checkpoint_dir, store, policy, {})
+            ((states, rows), policy_actions, metadata) = checkpoint.load(checkpoint_dir)
+
+            self.assertEqual(states, [b'\x01\x00', b'\x00\x00'])
+            self.assertTrue(np.array_equal(rows, [[0.0, 2.0], [1.0, 0.0]]))
+            self.assertEqual(policy_actions, policy)
+            self.assertEqual(metadata['policy'], 'sparse')
+
+    def test_latest_checkpoint_and_cleanup(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            self.assertIsNone(checkpoint.latest(checkpoint_dir))
+            for i in range(4):
+                path = checkpoint.save(checkpoint_dir, np.full((1, 1), i, float), np.zeros(1, int), {}, keep=2)
+
+            (action_values, _, _) = checkpoint.load(checkpoint_dir)
+
+            self.assertEqual(checkpoint.latest(checkpoint_dir), path)
+            self.assertEqual(action_values[0][0], 3.0)
+            self.assertEqual(sorted(name for name in os.listdir(checkpoint_dir) if name.startswith('checkpoint')),
+                             ['checkpoint-00000002', 'checkpoint-00000003'])
+
+    def test_load_without_checkpoint(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            with self.assertRaises(FileNotFoundError):
+                checkpoint.load(checkpoint_dir)
+
+    def test_save_files(self):
+        def write_files(directory):
+            checkpoint.write_array(os.path.join(directory, 'weights.npy'), np.ones(3))
+
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            checkpoint.save_files(checkpoint_dir, write_files, {'agent': 'DQN'})
+            path = checkpoint.save_files(checkpoint_dir, write_files, {'agent': 'DQN'})
+            (checkpoint_path, metadata) = checkpoint.load_metadata(checkpoint_dir)
+
+            self.assertEqual(checkpoint_path, path)
+            self.assertEqual(metadata['agent'], 'DQN')
+            self.assertTrue(np.array_equal(np.load(os.path.join(checkpoint_path, 'weights.npy')), np.ones(3)))
@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+import agents.encoder as encoder
+
+
+class TestStateEncoder(unittest.TestCase):
+    """
+    Test the encoding of lines capacity usage into states.
+    """
+
+    def test_state_space_size(self):
+        self.assertEqual(encoder.StateEncoder(20).state_space_size, 2 ** 20)
+        self.assertEqual(encoder.StateEncoder(4, (0.5, 1.0)).state_space_size, 3 ** 4)
+
+    def test_encode_matches_bit_loop(self):
+        lines_usage = np.random.random_sample(20) * 2
+
+        state = 0
+        for bit in np.greater(lines_usage, 1.0):
+            state = (state << 1) | int(bit)
+
+        self.assertEqual(encoder.StateEncoder(20).encode(lines_usage), state)
+
+    def test_threshold_is_exclusive(self):
+        state_encoder = encoder.StateEncoder(3, (0.7,))
+        self.assertEqual(state_encoder.encode([0.7, 0.71, 0.2]), 0b010)
+
+    def test_multi_level_encoding(self):
+        state_encoder = encoder.StateEncoder(3, (0.5, 1.0))
+        self.assertEqual(state_encoder.encode([0.2, 0.8, 1.2]), 0 * 9 + 1 * 3 + 2)
+
+    def test_encode_batch_matches_encode(self):
+        state_encoder = encoder.StateEncoder(30, (0.7, 1.0))
+        lines_usage = np.random.random_sample((100, 30)) * 1.5
+
+        states = state_encoder.encode_batch(lines_usage)
+
+        self.assertEqual(states.dtype, np.int64)
+        self.assertEqual(list(states), [state_encoder.encode(usage) for usage in lines_usage])
+
+    def test_wide_encoder_returns_bytes_keys(self):
+        state_encoder = encoder.StateEncoder(100)
+        lines_usage = np.zeros((2, 100))
+        lines_usage[1, 99] = 1.5
+
+        keys = state_encoder.encode_batch(lines_usage)
+
+        self.assertTrue(state_encoder.wide)
+        self.assertEqual(len(keys[0]), 13)
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(state_encoder.encode(lines_usage[1]), keys[1])
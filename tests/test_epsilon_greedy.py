@@ -0,0 +1,55 @@
+import unittest
+import numpy as np
+import agents.model as model
+import agents.policy as policy
+
+
+class TestEpsilonGreedy(unittest.TestCase):
+    """
+    Test the epsilon greedy policy.
+    """
+
+    def test_improve(self):
+        greedy = policy.EpsilonGreedy(3, 2, 0.0)
+        action_value_fn = np.array([[0.0, 1.0], [2.0, 0.0], [0.0, 3.0]])
+
+        greedy.improve(action_value_fn)
+
+        self.assertEqual(greedy.get_action(0), 1)
+        self.assertEqual(greedy.get_action(1), 0)
+        self.assertEqual(greedy.get_action(2), 1)
+
+    def test_improve_touched_states_only(self):
+        greedy = policy.EpsilonGreedy(3, 2, 0.0)
+        greedy.policy[:] = 0
+        action_value_fn = np.array([[0.0, 1.0], [0.0, 2.0], [0.0, 3.0]])
+
+        greedy.improve(action_value_fn, {0, 2})
+
+        self.assertEqual(greedy.get_action(0), 1)
+        self.assertEqual(greedy.get_action(1), 0)
+        self.assertEqual(greedy.get_action(2), 1)
+
+    def test_model_tracks_touched_states(self):
+        mdp = model.TemporalDifference(4, 2, 0.5, 5, 0.5)
+        mdp.learn(((1, 0, 0.0), (3, 1, 1.0)))
+        mdp.reset_action_values(2)
+
+        self.assertEqual(mdp.pop_touched_states(), {2, 3})
+        self.assertEqual(mdp.pop_touched_states(), set())
+
+    def test_incremental_improvement_matches_full_improvement(self):
+        np.random.seed(1)
+        mdp = model.MonteCarlo(20, 4, 0.5, 1, 0.5)
+        incremental = policy.EpsilonGreedy(20, 4, 0.0)
+        full = policy.EpsilonGreedy(20, 4, 0.0)
+
+        for _ in range(5):
+            history = [(np.random.randint(20), np.random.randint(4), np.random.random_sample()) for _ in range(10)]
+            mdp.learn(history)
+            touched_states = mdp.pop_touched_states()
+            incremental.improve(mdp.get_action_value_function(), touched_states)
+            full.improve(mdp.get_action_value_function())
+
+            for state in touched_states:
+                self.assertEqual(incremental.get_action(state), full.get_action(state))
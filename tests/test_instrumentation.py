@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import unittest
+import agents.instrumentation as instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    Test the per phase timers and summaries.
+    """
+
+    def test_disabled_phase_does_nothing(self):
+        instruments = instrumentation.Instrumentation()
+
+        with instruments.phase('act'):
+            pass
+
+        self.assertIs(instruments.phase('act'), instrumentation.NULL_TIMER)
+        self.assertEqual(instruments.timers, {})
+
+    def test_phase_timer(self):
+        timer = instrumentation.PhaseTimer('act')
+        for duration in (1e-6, 1e-6, 1e-6, 1e-3):
+            timer.record(duration)
+
+        summary = timer.summary()
+
+        self.assertEqual(summary['count'], 4)
+        self.assertAlmostEqual(summary['total'], 1.003e-3)
+        self.assertEqual(summary['max'], 1e-3)
+        self.assertTrue(1e-6 <= summary['p50'] < 2e-6)
+        self.assertEqual(summary['p99'], 1e-3)
+        self.assertEqual(sum(summary['histogram'].values()), 4)
+
+    def test_summary_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'instrumentation.jsonl')
+            instruments = instrumentation.Instrumentation(True, summary_interval=2, file_path=file_path)
+            for _ in range(5):
+                with instruments.phase('act'):
+                    pass
+                instruments.end_step()
+            instruments.close()
+
+            with open(file_path) as instrumentation_file:
+                summaries = [json.loads(line) for line in instrumentation_file]
+
+        self.assertEqual([summary['steps'] for summary in summaries], [2, 4, 5])
+        self.assertEqual([summary['phases']['act']['count'] for summary in summaries], [2, 2, 1])
+
+    def test_profiler_window(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'runner.prof')
+            instruments = instrumentation.Instrumentation(profiler='cprofile', profile_start=1, profile_steps=2,
+                                                          profile_file_path=file_path)
+            instruments.end_step()
+            self.assertIsNotNone(instruments.profiler)
+            instruments.end_step()
+            instruments.end_step()
+
+            self.assertIsNone(instruments.profiler)
+            self.assertTrue(os.path.isfile(file_path))
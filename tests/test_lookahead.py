@@ -0,0 +1,131 @@
+import datetime
+import time
+import unittest
+import numpy as np
+import agents.action_mask as action_mask
+import agents.lookahead as lookahead
+
+
+class FakeEnvironment:
+    """
+    Environment whose simulated reward of an action is given by a
+    table, None for a game over, counting the simulations.
+    """
+
+    def __init__(self, rewards, delay=0.0):
+        self.rewards = rewards
+        self.delay = delay
+        self.simulations = 0
+        self.datetime = datetime.datetime(2019, 1, 1, 12, 0)
+
+    def simulate(self, action, do_sum=True):
+        self.simulations += 1
+        if self.delay:
+            time.sleep(self.delay)
+        reward = self.rewards[action]
+        if reward is None:
+            return None, 0.0, True, 'game over'
+        return np.zeros(4), reward, False, None
+
+    def get_current_datetime(self):
+        return self.datetime
+
+
+class IdentityPool:
+    def __getitem__(self, action):
+        return action
+
+
+class TestLookahead(unittest.TestCase):
+    """
+    Test the memoized lookahead of the greedy action.
+    """
+
+    def test_candidates_by_decreasing_value(self):
+        selector = lookahead.Lookahead(FakeEnvironment(None), candidates=3)
+
+        candidates = selector.get_candidates(np.array([0.5, 2.0, 1.0, 2.0, -1.0]))
+
+        self.assertEqual(candidates.tolist(), [1, 3, 2])
+
+    def test_candidates_are_legal(self):
+        selector = lookahead.Lookahead(FakeEnvironment(None), candidates=2)
+        mask = action_mask.ActionMask(np.array([True, False, True, True]))
+
+        candidates = selector.get_candidates(np.array([0.0, 5.0, 1.0, 2.0]), mask)
+
+        self.assertEqual(candidates.tolist(), [3, 2])
+
+    def test_avoids_game_over(self):
+        environment = FakeEnvironment([0.0, -10.0, -0.5])
+        selector = lookahead.Lookahead(environment, candidates=2)
+
+        action = selector.select(0, np.array([0.0, 2.0, 1.0]), IdentityPool())
+
+        self.assertEqual(action, 2)
+        self.assertEqual(environment.simulations, 2)
+
+    def test_game_over_scores_lowest(self):
+        environment = FakeEnvironment([0.0, None, -0.5])
+        selector = lookahead.Lookahead(environment, candidates=2)
+
+        action = selector.select(0, np.array([0.0, 2.0, 1.0]), IdentityPool())
+
+        self.assertEqual(action, 2)
+        self.assertEqual(selector.cache[(0, 1, environment.datetime.time())], float('-inf'))
+
+    def test_memoized_across_chronics(self):
+        environment = FakeEnvironment([0.0, -10.0, -0.5])
+        selector = lookahead.Lookahead(environment, candidates=2)
+        selector.select(0, np.array([0.0, 2.0, 1.0]), IdentityPool())
+
+        # The same time of another day.
+        environment.datetime = datetime.datetime(2019, 3, 7, 12, 0)
+        selector.select(0, np.array([0.0, 2.0, 1.0]), IdentityPool())
+
+        self.assertEqual(environment.simulations, 2)
+        self.assertEqual(selector.hits, 2)
+
+    def test_bounded_cache(self):
+        environment = FakeEnvironment([0.0, -10.0, -0.5])
+        selector = lookahead.Lookahead(environment, candidates=2, cache_size=3)
+
+        for state in range(3):
+            selector.select(state, np.array([0.0, 2.0, 1.0]), IdentityPool())
+
+        self.assertEqual(len(selector.cache), 3)
+        self.assertNotIn((0, 1, environment.datetime.time()), selector.cache)
+
+    def test_budget_falls_back_to_greedy(self):
+        environment = FakeEnvironment([0.0, -10.0, -0.5], delay=0.01)
+        selector = lookahead.Lookahead(environment, candidates=3, budget=0.001)
+        # The budget is exhausted before the first simulation.
+        environment.get_current_datetime = lambda: time.sleep(0.01) or environment.datetime
+
+        action = selector.select(0, np.array([0.0, 2.0, 1.0]), IdentityPool())
+
+        self.assertEqual(action, 1)
+        self.assertEqual(environment.simulations, 0)
+        self.assertEqual(selector.fallbacks, 1)
+
+    def test_budget_keeps_best_simulated(self):
+        environment = FakeEnvironment([0.0, None, -0.5], delay=0.01)
+        selector = lookahead.Lookahead(environment, candidates=3, budget=0.001)
+        # The greedy candidate is a known game over, the budget runs out after simulating the second one.
+        selector.cache[(0, 1, environment.datetime.time())] = float('-inf')
+
+        action = selector.select(0, np.array([0.0, 2.0, 1.0]), IdentityPool())
+
+        self.assertEqual(action, 2)
+        self.assertEqual(environment.simulations, 1)
+        self.assertEqual(selector.fallbacks, 0)
+
+    def test_budget_avoids_simulated_game_over(self):
+        environment = FakeEnvironment([0.0, None, -0.5], delay=0.01)
+        selector = lookahead.Lookahead(environment, candidates=3, budget=0.001)
+
+        action = selector.select(0, np.array([0.0, 2.0, 1.0]), IdentityPool())
+
+        self.assertEqual(action, 2)
+        self.assertEqual(environment.simulations, 1)
+        self.assertEqual(selector.fallbacks, 0)
@@ -0,0 +1,63 @@
+import csv
+import datetime
+import os
+import tempfile
+import unittest
+import numpy as np
+import runners.machine_log as machine_log
+
+
+class TestMachineLog(unittest.TestCase):
+    """
+    Test the buffered binary machine logs.
+    """
+
+    def test_append_and_flush(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'machine_logs.bin')
+            buffer = machine_log.MachineLogBuffer(file_path, 'default14', 'level0', 200, capacity=1)
+            time = datetime.datetime(2019, 1, 1, 0, 5)
+            for step in range(3):
+                buffer.append('chronic_0', step, time, step == 2, [1.0, 2.0], 3.0, 3.0 * (step + 1))
+
+            self.assertEqual(buffer.size, 3)
+            buffer.close()
+
+            chunks = list(machine_log.read_chunks(file_path))
+
+            self.assertEqual(len(chunks), 1)
+            (header, records) = chunks[0]
+            self.assertEqual(header, ['default14', 'level0', 'chronic_0', '200'])
+            self.assertTrue(np.array_equal(records['timestep'], [0, 1, 2]))
+            self.assertTrue(np.array_equal(records['game_over'], [False, False, True]))
+            self.assertTrue(np.array_equal(records['rewards'][1], [1.0, 2.0]))
+            self.assertTrue(np.array_equal(records['cumulated_reward'], [3.0, 6.0, 9.0]))
+
+    def test_new_chronic_starts_a_chunk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'machine_logs.bin')
+            buffer = machine_log.MachineLogBuffer(file_path)
+            time = datetime.datetime(2019, 1, 1)
+            buffer.append('chronic_0', 0, time, False, [0.0], 0.0, 0.0)
+            buffer.append('chronic_1', 0, time, False, [0.0], 0.0, 0.0)
+            buffer.close()
+
+            self.assertEqual([header[2] for (header, _) in machine_log.read_chunks(file_path)],
+                             ['chronic_0', 'chronic_1'])
+
+    def test_convert_to_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'machine_logs.bin')
+            csv_file_path = os.path.join(directory, 'machine_logs.csv')
+            buffer = machine_log.MachineLogBuffer(file_path, 'default14', 'level0', 200)
+            buffer.append('chronic_0', 1, datetime.datetime(2019, 1, 1, 0, 5), True, [1.0, -2.0], -1.0, -1.0)
+            buffer.close()
+
+            machine_log.convert_to_csv(file_path, csv_file_path)
+
+            with open(csv_file_path, newline='') as csv_file:
+                rows = list(csv.reader(csv_file, delimiter=';'))
+
+            self.assertEqual(rows[0], machine_log.CSV_HEADER)
+            self.assertEqual(rows[1], ['default14', 'level0', 'chronic_0', '200', '1', '2019-01-01 00:05', 'True',
+                                       '[1.0, -2.0]', '-1.0', '-1.0'])
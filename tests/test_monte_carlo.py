@@ -62,3 +62,46 @@ class TestMonteCarlo(unittest.TestCase):
         mdp.learn(history)
 
         self.assertTrue(mdp.is_mature())
+
+    def test_learn_does_not_change_unvisited_pairs(self):
+        mdp = model.MonteCarlo(3, 2, 0.5, 5, 0.5)
+        mdp.action_value_fn[2][1] = 4.0
+
+        mdp.learn(((0, 0, 1.0),))
+
+        self.assertEqual(mdp.action_value_fn[2][1], 4.0)
+        self.assertEqual(mdp.action_value_fn[0][0], 0.5)
+
+    def test_learn_keeps_first_visit(self):
+        mdp = model.MonteCarlo(2, 1, 1.0, 5, 0.5)
+        history = ((0, 0, 1.0), (1, 0, 1.0), (0, 0, 1.0))
+
+        mdp.learn(history)
+
+        self.assertEqual(mdp.action_value_fn[0][0], 4.75)
+        self.assertEqual(mdp.action_value_fn[1][0], 2.5)
+
+    def test_learn_episodes_matches_sequential_learn(self):
+        np.random.seed(0)
+        histories = [[(np.random.randint(6), np.random.randint(3), np.random.random_sample()) for _ in range(150)]
+                     for _ in range(4)]
+        sequential = model.MonteCarlo(6, 3, 0.3, 5, 0.2)
+        batched = model.MonteCarlo(6, 3, 0.3, 5, 0.2)
+
+        for history in histories:
+            sequential.learn(history)
+        batched.learn_episodes(histories)
+
+        self.assertTrue(np.allclose(sequential.action_value_fn, batched.action_value_fn))
+        self.assertEqual(batched.iteration_count, 4)
+
+    def test_discounted_returns(self):
+        rewards = np.random.random_sample(200)
+        expected = np.zeros(200)
+        cumulative_reward = 0.0
+        for i in reversed(range(200)):
+            cumulative_reward = rewards[i] + 0.9 * cumulative_reward
+            expected[i] = cumulative_reward
+
+        self.assertTrue(np.allclose(model.discounted_returns(rewards, 0.9), expected))
+        self.assertTrue(np.array_equal(model.discounted_returns(rewards, 0), rewards))
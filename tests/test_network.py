@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import agents.network as network
+
+
+def random_layers(sizes):
+    weights = [np.random.standard_normal((n_in, n_out)).astype(np.float32) for (n_in, n_out) in zip(sizes, sizes[1:])]
+    biases = [np.random.standard_normal(n_out).astype(np.float32) for n_out in sizes[1:]]
+    return weights, biases
+
+
+class TestNetwork(unittest.TestCase):
+    """
+    Test the NumPy forward pass of exported policy networks.
+    """
+
+    def test_save_and_load(self):
+        (weights, biases) = random_layers([4, 8, 3])
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'policy.npz')
+            network.save(file_path, weights, biases, metadata={'env_name': 'CartPole-v0'})
+            exported = network.load(file_path)
+
+        self.assertEqual(exported.input_size, 4)
+        self.assertEqual(exported.output_size, 3)
+        self.assertEqual(exported.metadata['env_name'], 'CartPole-v0')
+        for (kernel, loaded) in zip(weights, exported.weights):
+            self.assertTrue(np.array_equal(kernel, loaded))
+
+    def test_forward_pass(self):
+        (weights, biases) = random_layers([4, 8, 3])
+        exported = network.Network(weights, biases, 'tanh')
+        inputs = np.random.standard_normal((5, 4))
+
+        expected = np.tanh(inputs @ weights[0] + biases[0]) @ weights[1] + biases[1]
+
+        self.assertTrue(np.allclose(exported.logits(inputs), expected, atol=1e-5))
+        self.assertTrue(np.allclose(exported.logits(inputs[0]), expected[0], atol=1e-5))
+        self.assertTrue(np.array_equal(exported.greedy_actions(inputs), np.argmax(expected, axis=1)))
+
+    def test_illegal_actions_never_played(self):
+        (weights, biases) = random_layers([4, 8, 3])
+        exported = network.Network(weights, biases, 'relu')
+        inputs = np.random.standard_normal((100, 4))
+        legal = np.array([True, False, True])
+
+        self.assertNotIn(1, exported.greedy_actions(inputs, legal))
+        self.assertNotIn(1, exported.sample_actions(inputs, legal))
+
+    def test_sampling_follows_softmax(self):
+        exported = network.Network([np.zeros((1, 2), np.float32)], [np.log(np.array([0.2, 0.8], np.float32))],
+                                   'identity')
+
+        actions = exported.sample_actions(np.zeros((20000, 1)))
+
+        self.assertAlmostEqual(np.mean(actions), 0.8, delta=0.02)
+
+    def test_backward_matches_numerical_gradient(self):
+        exported = network.Network.random([3, 5, 2], 'tanh', np.random.RandomState(0))
+        inputs = np.random.RandomState(1).standard_normal((4, 3)).astype(np.float32)
+
+        def loss():
+            return 0.5 * np.sum(exported.logits(inputs).astype(np.float64) ** 2)
+
+        (outputs, layer_inputs) = exported.forward(inputs)
+        (weights_gradients, _) = exported.backward(layer_inputs, outputs)
+
+        kernel = exported.weights[0]
+        step = 1e-2
+        kernel[1, 2] += step
+        loss_plus = loss()
+        kernel[1, 2] -= 2 * step
+        loss_minus = loss()
+        kernel[1, 2] += step
+
+        self.assertAlmostEqual(weights_gradients[0][1, 2], (loss_plus - loss_minus) / (2 * step), delta=1e-2)
+
+    def test_adam_fits_regression(self):
+        random_state = np.random.RandomState(0)
+        regressor = network.Network.random([2, 16, 1], 'relu', random_state)
+        optimizer = network.Adam(regressor, learning_rate=1e-2)
+        inputs = random_state.uniform(-1.0, 1.0, (256, 2)).astype(np.float32)
+        targets = (inputs[:, :1] - 2.0 * inputs[:, 1:]).astype(np.float32)
+
+        for _ in range(500):
+            (outputs, layer_inputs) = regressor.forward(inputs)
+            optimizer.step(*regressor.backward(layer_inputs, (outputs - targets) / len(inputs)))
+
+        self.assertLess(np.mean((regressor.logits(inputs) - targets) ** 2), 1e-2)
+
+    def test_copy_and_assign(self):
+        source = network.Network.random([2, 3, 2], 'relu', np.random.RandomState(0))
+        target = source.copy()
+        source.weights[0][0, 0] += 1.0
+
+        self.assertNotEqual(target.weights[0][0, 0], source.weights[0][0, 0])
+        target.assign(source)
+        self.assertEqual(target.weights[0][0, 0], source.weights[0][0, 0])
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import agents.model as model
+import agents.replay as replay
+
+
+class TestReplayBuffer(unittest.TestCase):
+    """
+    Test the experience replay buffer.
+    """
+
+    def test_add_and_sample(self):
+        buffer = replay.ReplayBuffer(4)
+        buffer.add(1, 2, 3.0, 4, True)
+
+        (indices, transitions, weights) = buffer.sample(3)
+
+        self.assertEqual(len(buffer), 1)
+        self.assertTrue(np.array_equal(indices, [0, 0, 0]))
+        self.assertTrue(np.array_equal(weights, [1.0, 1.0, 1.0]))
+        self.assertEqual(transitions['state'][0], 1)
+        self.assertEqual(transitions['action'][0], 2)
+        self.assertEqual(transitions['reward'][0], 3.0)
+        self.assertEqual(transitions['next_state'][0], 4)
+        self.assertTrue(transitions['done'][0])
+
+    def test_ring_overwrites_oldest(self):
+        buffer = replay.ReplayBuffer(3)
+        for i in range(5):
+            buffer.add(i, 0, 0.0, 0, False)
+
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(sorted(buffer.transitions['state']), [2, 3, 4])
+
+    def test_add_batch(self):
+        buffer = replay.ReplayBuffer(3)
+        buffer.add(9, 0, 0.0, 0, False)
+        buffer.add_batch(np.arange(4), np.zeros(4), np.zeros(4), np.arange(4), np.zeros(4, bool))
+
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(sorted(buffer.transitions['state']), [1, 2, 3])
+
+    def test_prioritized_sampling(self):
+        np.random.seed(0)
+        buffer = replay.ReplayBuffer(2, prioritized=True, alpha=1.0)
+        buffer.add(0, 0, 0.0, 0, False)
+        buffer.add(1, 0, 0.0, 0, False)
+        buffer.update_priorities(np.array([0, 1]), np.array([0.0, 10.0]))
+
+        (_, transitions, _) = buffer.sample(1000)
+
+        self.assertGreater(np.count_nonzero(transitions['state'] == 1), 990)
+
+    def test_importance_sampling_weights(self):
+        np.random.seed(0)
+        buffer = replay.ReplayBuffer(4, prioritized=True, alpha=1.0, beta=1.0)
+        buffer.add_batch(np.arange(3), np.zeros(3), np.zeros(3), np.arange(3), np.zeros(3, bool))
+        buffer.update_priorities(np.arange(3), np.array([1.0, 2.0, 4.0]))
+
+        (indices, _, weights) = buffer.sample(100)
+
+        # With beta = 1 the weights are inversely proportional to the priorities, the rarest sample weighing 1.
+        inverse_priorities = 1.0 / np.array([1.0, 2.0, 4.0])[indices]
+        self.assertTrue(np.allclose(weights, inverse_priorities / np.max(inverse_priorities)))
+        self.assertEqual(np.max(weights), 1.0)
+
+    def test_sum_tree(self):
+        tree = replay.SumTree(5)
+        tree.update(np.arange(5), np.array([1.0, 2.0, 3.0, 4.0, 5.0]))
+        tree.update([1, 1], [0.5, 0.0])
+
+        self.assertEqual(tree.total(), 13.0)
+        self.assertTrue(np.array_equal(tree.get([0, 1, 4]), [1.0, 0.0, 5.0]))
+        self.assertTrue(np.array_equal(tree.find([0.0, 0.9, 1.0, 3.9, 4.0, 7.9, 8.0, 12.9]), [0, 0, 2, 2, 3, 3, 4, 4]))
+
+    def test_sum_tree_matches_cumulative_sum(self):
+        random_state = np.random.RandomState(0)
+        priorities = random_state.random_sample(100)
+        tree = replay.SumTree(100)
+        tree.update(np.arange(100), priorities)
+        targets = random_state.random_sample(1000) * tree.total()
+
+        self.assertTrue(np.isclose(tree.total(), np.sum(priorities)))
+        self.assertTrue(np.array_equal(tree.find(targets),
+                                       np.searchsorted(np.cumsum(priorities), targets, side='right')))
+
+    def test_memory_mapped_buffer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'replay.npy')
+            buffer = replay.ReplayBuffer(2, file_path=file_path)
+            buffer.add(7, 1, 0.5, 8, False)
+            buffer.flush()
+
+            self.assertEqual(np.load(file_path)['state'][0], 7)
+            del buffer
+
+    def test_replayed_batch_learning(self):
+        buffer = replay.ReplayBuffer(8)
+        mdp = model.TemporalDifference(2, 2, 0.5, 5, 0.5)
+        buffer.add(0, 1, 2.0, 1, True)
+
+        (indices, transitions, _) = buffer.sample(2)
+        td_errors = mdp.learn_batch(transitions['state'], transitions['action'], transitions['reward'],
+                                    transitions['next_state'], dones=transitions['done'])
+
+        self.assertTrue(np.array_equal(td_errors, [2.0, 2.0]))
+        self.assertEqual(mdp.action_value_fn[0][1], 1.5)
+
+    def test_weighted_batch_learning(self):
+        mdp = model.TemporalDifference(2, 2, 0.5, 5, 0.5)
+
+        td_errors = mdp.learn_batch([0, 1], [1, 0], [2.0, 2.0], [1, 1], dones=[True, True], weights=[1.0, 0.5])
+
+        self.assertTrue(np.array_equal(td_errors, [2.0, 2.0]))
+        self.assertEqual(mdp.action_value_fn[0][1], 1.0)
+        self.assertEqual(mdp.action_value_fn[1][0], 0.5)
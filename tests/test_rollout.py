@@ -0,0 +1,49 @@
+import unittest
+import numpy as np
+import agents.rollout as rollout
+
+
+class TestRollout(unittest.TestCase):
+    """
+    Test the policy gradient weights of lockstep rollouts.
+    """
+
+    def setUp(self):
+        # Two environments during 4 steps: the first one finishes an episode of 2 steps, the second one of 3 steps.
+        self.rewards = np.array([[1.0, 1.0],
+                                 [2.0, 2.0],
+                                 [3.0, 3.0],
+                                 [4.0, 4.0]])
+        self.dones = np.array([[False, False],
+                               [True, False],
+                               [False, True],
+                               [False, False]])
+
+    def test_episode_returns(self):
+        (weights, valid, returns, lengths) = rollout.episode_weights(self.rewards, self.dones)
+
+        self.assertTrue(np.array_equal(weights[valid], [3.0, 3.0, 6.0, 6.0, 6.0]))
+        self.assertTrue(np.array_equal(valid, [True, True, False, False, True, True, True, False]))
+        self.assertTrue(np.array_equal(returns, [3.0, 6.0]))
+        self.assertTrue(np.array_equal(lengths, [2, 3]))
+
+    def test_reward_to_go(self):
+        (weights, valid, _, _) = rollout.episode_weights(self.rewards, self.dones, reward_to_go=True)
+
+        self.assertTrue(np.allclose(weights[valid], [3.0, 2.0, 6.0, 5.0, 3.0]))
+
+    def test_matches_episode_loop(self):
+        rewards = np.random.random_sample((50, 3))
+        dones = np.random.random_sample((50, 3)) < 0.1
+        (weights, valid, _, _) = rollout.episode_weights(rewards, dones, reward_to_go=True)
+
+        expected = list()
+        for i in range(3):
+            episode = list()
+            for t in range(50):
+                episode.append(rewards[t, i])
+                if dones[t, i]:
+                    expected += list(np.cumsum(episode[::-1])[::-1])
+                    episode = list()
+
+        self.assertTrue(np.allclose(weights[valid], expected))
@@ -0,0 +1,190 @@
+import os
+import queue
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import agents.agent as agent
+import agents.checkpoint as checkpoint
+import agents.network as network
+from environments.surrogate import SurrogateEnvironment, SurrogateInfo
+from runners.hogwild_runner import HogwildRunner
+from runners.parallel_runner import ParallelRunner, run_rollout_worker
+from runners.runner import CustomRunner
+
+"""The agents played end to end, with small tile coding tables to keep the tests fast."""
+AGENTS = ((agent.QLearning, {}),
+          (agent.DQN, {'replay_capacity': 1000}),
+          (agent.TileCodingQLearning, {'tile_coding_memory': 1 << 20}))
+
+
+class GameOverEnvironment(SurrogateEnvironment):
+    """
+    The surrogate environment with a game over every 3 steps which,
+    like pypownet's RunEnv, comes without observation.
+    """
+
+    def step(self, action, do_sum=True):
+        (observation, reward, done, info) = super().step(action, do_sum)
+        if self.timesteps[0] % 3 == 0:
+            return None, reward, True, SurrogateInfo('game over')
+
+        return observation, reward, done, info
+
+
+class TestRunners(unittest.TestCase):
+    """
+    Test the runners end to end in the surrogate environment, which
+    does not need pypownet.
+    """
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.log_dir)
+
+    def machine_log_rows(self, file_name):
+        with open(os.path.join(self.log_dir, file_name)) as machine_log_file:
+            return machine_log_file.read().splitlines()[1:]
+
+    def test_custom_runner(self):
+        for (agent_class, agent_kwargs) in AGENTS:
+            with self.subTest(agent=agent_class.__name__):
+                environment = SurrogateEnvironment()
+                runner = CustomRunner(environment, agent_class(environment, **agent_kwargs), log_file_path=None,
+                                      machine_log_file_path=os.path.join(self.log_dir, 'machine_logs.csv'),
+                                      checkpoint_dir=os.path.join(self.log_dir, agent_class.__name__),
+                                      checkpoint_interval=2)
+                runner.loop(iterations=10, episodes=3)
+
+                self.assertTrue(runner.machine_log_file.closed)
+                self.assertGreaterEqual(len(self.machine_log_rows('machine_logs.csv')), 3)
+                self.assertIsNotNone(checkpoint.latest(os.path.join(self.log_dir, agent_class.__name__)))
+
+                restored = agent_class(environment, **agent_kwargs)
+                restored.restore_checkpoint(os.path.join(self.log_dir, agent_class.__name__))
+
+    def test_exported_policy_has_no_checkpoint(self):
+        environment = SurrogateEnvironment()
+        exported_policy = agent.ExportedPolicy(environment)
+        network.Network.random([environment.observation_space.shape[0], 8, exported_policy.action_space_size]).save(
+            os.path.join(self.log_dir, 'policy.npz'))
+        exported_policy.load_network(os.path.join(self.log_dir, 'policy.npz'))
+        runner = CustomRunner(environment, exported_policy, log_file_path=None, machine_log_file_path=None,
+                              checkpoint_dir=os.path.join(self.log_dir, 'checkpoints'), checkpoint_interval=1)
+        runner.loop(iterations=10, episodes=2)
+
+        self.assertIsNone(checkpoint.latest(os.path.join(self.log_dir, 'checkpoints')))
+
+    def test_lookahead(self):
+        environment = SurrogateEnvironment()
+        qlearning = agent.QLearning(environment)
+        qlearning.lookahead_candidates = 3
+        qlearning.lookahead_budget = None
+        qlearning.lookahead = qlearning.create_lookahead()
+        runner = CustomRunner(environment, qlearning, log_file_path=None, machine_log_file_path=None)
+        runner.loop(iterations=10, episodes=2)
+
+        self.assertGreater(qlearning.lookahead.misses, 0)
+
+    def test_prewarm_reset_learns_the_same(self):
+        action_values = list()
+        for prewarm_reset in (False, True):
+            np.random.seed(0)
+            environment = SurrogateEnvironment(game_over_mode='hard')
+            qlearning = agent.QLearning(environment)
+            machine_log_file_name = 'machine_logs{}.csv'.format(int(prewarm_reset))
+            runner = CustomRunner(environment, qlearning, log_file_path=None,
+                                  machine_log_file_path=os.path.join(self.log_dir, machine_log_file_name),
+                                  prewarm_reset=prewarm_reset)
+            runner.loop(iterations=30, episodes=4)
+            action_values.append(np.array(qlearning.mdp.get_action_value_function()))
+
+        self.assertTrue(np.array_equal(action_values[0], action_values[1]))
+        self.assertEqual(self.machine_log_rows('machine_logs0.csv'), self.machine_log_rows('machine_logs1.csv'))
+
+    def test_parallel_runner(self):
+        for (agent_class, agent_kwargs) in AGENTS:
+            with self.subTest(agent=agent_class.__name__):
+                environment = SurrogateEnvironment()
+                runner = ParallelRunner(environment, agent_class(environment, **agent_kwargs), {}, 2,
+                                        log_file_path=None,
+                                        machine_log_file_path=os.path.join(self.log_dir, 'machine_logs.csv'),
+                                        policy_sync_interval=1, agent_kwargs=agent_kwargs)
+                runner.loop(iterations=10, episodes=4)
+
+                self.assertGreaterEqual(len(self.machine_log_rows('machine_logs_worker0.csv')), 2)
+                self.assertGreaterEqual(len(self.machine_log_rows('machine_logs_worker1.csv')), 2)
+
+    def test_rollout_worker_starts_from_the_learner_policy(self):
+        np.random.seed(0)
+        learner = agent.QLearning(SurrogateEnvironment())
+        greedy_action = int(learner.legal_actions()[-1])
+        learner.policy.policy[:] = greedy_action
+        transitions_queue = queue.Queue()
+        policy_queue = queue.Queue()
+        policy_queue.put(learner.policy_parameters())
+
+        run_rollout_worker(0, agent.QLearning, {}, SurrogateEnvironment, {}, dict(log_file_path=None,
+                           machine_log_file_path=None), 10, 1, transitions_queue, policy_queue)
+
+        (_, transitions, _, _) = transitions_queue.get()
+        actions = [action for (_, action, _, _, _) in transitions]
+        self.assertGreater(actions.count(greedy_action), len(actions) // 2)
+
+    def test_parallel_exported_policy(self):
+        environment = SurrogateEnvironment()
+        exported_policy = agent.ExportedPolicy(environment)
+        network.Network.random([environment.observation_space.shape[0], 8, exported_policy.action_space_size]).save(
+            os.path.join(self.log_dir, 'policy.npz'))
+        exported_policy.load_network(os.path.join(self.log_dir, 'policy.npz'))
+        runner = ParallelRunner(environment, exported_policy, {}, 2, log_file_path=None, machine_log_file_path=None)
+
+        runner.loop(iterations=10, episodes=2)
+
+    def test_hogwild_runner(self):
+        environment = SurrogateEnvironment()
+        qlearning = agent.QLearning(environment)
+        runner = HogwildRunner(environment, qlearning, {}, 2, log_file_path=None,
+                               machine_log_file_path=os.path.join(self.log_dir, 'machine_logs.csv'))
+        runner.loop(iterations=10, episodes=4)
+
+        self.assertGreaterEqual(len(self.machine_log_rows('machine_logs_worker0.csv')), 2)
+        self.assertGreaterEqual(len(self.machine_log_rows('machine_logs_worker1.csv')), 2)
+        self.assertTrue(np.any(np.asarray(qlearning.mdp.get_action_value_function()) != 0))
+
+    def test_hogwild_runner_needs_a_table(self):
+        for (agent_class, agent_kwargs) in AGENTS[1:]:
+            with self.subTest(agent=agent_class.__name__):
+                environment = SurrogateEnvironment()
+                with self.assertRaises(AssertionError):
+                    HogwildRunner(environment, agent_class(environment, **agent_kwargs), {}, 2, log_file_path=None,
+                                  machine_log_file_path=None)
+
+    def test_game_over_without_observation(self):
+        agents = AGENTS + ((agent.PolicyIteration, {}), (agent.Sarsa, {'replay_capacity': 100}),
+                           (agent.QLearning, {'replay_capacity': 100}), (agent.SarsaLambda, {}),
+                           (agent.WatkinsQLambda, {}))
+        for (agent_class, agent_kwargs) in agents:
+            for prewarm_reset in (False, True):
+                with self.subTest(agent=agent_class.__name__, prewarm_reset=prewarm_reset):
+                    environment = GameOverEnvironment(game_over_mode='hard')
+                    runner = CustomRunner(environment, agent_class(environment, **agent_kwargs), log_file_path=None,
+                                          machine_log_file_path=os.path.join(self.log_dir, 'machine_logs.csv'),
+                                          prewarm_reset=prewarm_reset)
+                    runner.loop(iterations=10, episodes=3)
+
+                    # Every episode ends by a game over, after at most 3 steps.
+                    rows = self.machine_log_rows('machine_logs.csv')
+                    self.assertLessEqual(len(rows), 9)
+                    self.assertEqual([row.split(';')[6] for row in rows].count('True'), 3)
+
+    def test_game_over_without_observation_in_workers(self):
+        for (agent_class, agent_kwargs) in AGENTS[:2] + ((agent.Sarsa, {}),):
+            with self.subTest(agent=agent_class.__name__):
+                environment = GameOverEnvironment()
+                runner = ParallelRunner(environment, agent_class(environment, **agent_kwargs), {}, 2,
+                                        log_file_path=None, machine_log_file_path=None, policy_sync_interval=1,
+                                        agent_kwargs=agent_kwargs)
+                runner.loop(iterations=10, episodes=4)
@@ -0,0 +1,68 @@
+import unittest
+import numpy as np
+import runners.search as search
+
+
+class TestSearch(unittest.TestCase):
+    """
+    Test the configurations of the hyperparameter sweep and its early
+    stopping rules.
+    """
+
+    def test_parse_values(self):
+        self.assertEqual(search.parse_values('1,2'), [1, 2])
+        self.assertEqual(search.parse_values('0.1,0.5'), [0.1, 0.5])
+        self.assertEqual(search.parse_values('agent.QLearning,agent.Sarsa'), ['agent.QLearning', 'agent.Sarsa'])
+        self.assertEqual(search.parse_values('0.01:0.5'), (0.01, 0.5))
+
+    def test_grid_configurations(self):
+        configurations = search.grid_configurations({'alpha': [0.1, 0.2], 'gamma': [0.9, 0.99, 1.0]})
+
+        self.assertEqual(len(configurations), 6)
+        self.assertIn({'alpha': 0.2, 'gamma': 0.99}, configurations)
+
+    def test_grid_configurations_rejects_ranges(self):
+        with self.assertRaises(ValueError):
+            search.grid_configurations({'alpha': (0.01, 0.5)})
+
+    def test_random_configurations(self):
+        space = {'agent': ['agent.QLearning'], 'alpha': (0.01, 0.5), 'gamma': (-1.0, 1.0)}
+        configurations = search.random_configurations(space, 50, np.random.RandomState(0))
+
+        self.assertEqual(len(configurations), 50)
+        for configuration in configurations:
+            self.assertEqual(configuration['agent'], 'agent.QLearning')
+            self.assertTrue(0.01 <= configuration['alpha'] <= 0.5)
+            self.assertTrue(-1.0 <= configuration['gamma'] <= 1.0)
+        self.assertEqual(configurations,
+                         search.random_configurations(space, 50, np.random.RandomState(0)))
+
+    def test_median_stopping_rule(self):
+        rule = search.MedianStoppingRule(grace_episodes=2, min_trials=2)
+        rewards = {0: [10, 10], 1: [5, 5, 5], 2: [0, 0], 3: [-1]}
+
+        self.assertFalse(rule.should_stop(3, rewards))
+        self.assertFalse(rule.should_stop(0, rewards))
+        # Trial 3 is not compared, it did not play 2 episodes.
+        self.assertTrue(rule.should_stop(2, rewards))
+        self.assertFalse(rule.should_stop(1, {0: [10, 10], 1: [5, 5]}))
+
+    def test_successive_halving_rungs(self):
+        rule = search.SuccessiveHalvingRule(min_episodes=2, reduction_factor=3)
+
+        self.assertEqual([episodes for episodes in range(1, 20) if rule.is_rung(episodes)], [2, 6, 18])
+
+    def test_successive_halving_rule(self):
+        rule = search.SuccessiveHalvingRule(min_episodes=2, reduction_factor=3)
+        rewards = {0: [3, 3], 1: [2, 2], 2: [1, 1, 1]}
+
+        self.assertFalse(rule.should_stop(0, rewards))
+        self.assertTrue(rule.should_stop(1, rewards))
+        # Not at a rung.
+        self.assertFalse(rule.should_stop(2, rewards))
+        # Too few trials reached the rung.
+        self.assertFalse(rule.should_stop(1, {0: [3, 3], 1: [2, 2], 2: [1]}))
+
+
+if __name__ == '__main__':
+    unittest.main()
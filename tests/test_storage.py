@@ -0,0 +1,194 @@
+import unittest
+import numpy as np
+import agents.model as model
+import agents.policy as policy
+import agents.storage as storage
+
+
+class TestSparseActionValueStore(unittest.TestCase):
+    """
+    Test the sparse storage of action value functions.
+    """
+
+    def test_unvisited_state_is_zero_row(self):
+        store = storage.SparseActionValueStore(3)
+        self.assertTrue(np.array_equal(store[7], np.zeros(3)))
+        self.assertEqual(len(store), 1)
+
+    def test_row_indexing(self):
+        store = storage.SparseActionValueStore(2)
+        store[5][1] = 2.5
+        store[5][0] += 1.0
+
+        self.assertEqual(store[5][0], 1.0)
+        self.assertEqual(store[5][1], 2.5)
+
+        store[5].fill(0)
+        self.assertTrue(np.array_equal(store[5], np.zeros(2)))
+
+    def test_get_does_not_insert(self):
+        store = storage.SparseActionValueStore(2)
+        self.assertIsNone(store.get(3))
+        self.assertNotIn(3, store)
+
+    def test_lru_eviction(self):
+        store = storage.SparseActionValueStore(1, max_states=2, eviction='lru')
+        store[0][0] = 1.0
+        store[1][0] = 2.0
+        store[0][0] += 1.0
+        store[2][0] = 3.0
+
+        self.assertIn(0, store)
+        self.assertNotIn(1, store)
+        self.assertIn(2, store)
+        self.assertEqual(store.evictions, 1)
+
+    def test_fifo_eviction(self):
+        store = storage.SparseActionValueStore(1, max_states=2, eviction='fifo')
+        store[0][0] = 1.0
+        store[1][0] = 2.0
+        store[0][0] += 1.0
+        store[2][0] = 3.0
+
+        self.assertNotIn(0, store)
+        self.assertIn(1, store)
+        self.assertIn(2, store)
+
+    def test_no_eviction_raises(self):
+        store = storage.SparseActionValueStore(1, max_states=1, eviction='none')
+        store[0][0] = 1.0
+
+        with self.assertRaises(MemoryError):
+            store[1][0] = 1.0
+
+    def test_create_auto_chooses_sparse_over_budget(self):
+        dense = storage.create_action_value_store(4, 2, memory_budget=1024)
+        sparse = storage.create_action_value_store(2 ** 40, 2, memory_budget=1024)
+
+        self.assertTrue(storage.is_dense(dense))
+        self.assertFalse(storage.is_dense(sparse))
+        self.assertGreater(sparse.max_states, 0)
+
+    def test_monte_carlo_learn_matches_dense(self):
+        history = ((1, 0, 1.0), (4, 1, 1.5), (0, 0, 0.9))
+        dense = model.MonteCarlo(5, 2, 0.5, 5, 0.5)
+        sparse = model.MonteCarlo(5, 2, 0.5, 5, 0.5, storage.SparseActionValueStore(2))
+
+        dense.learn(history)
+        dense.learn(history[1:])
+        sparse.learn(history)
+        sparse.learn(history[1:])
+
+        for (state, row) in sparse.get_action_value_function().items():
+            self.assertTrue(np.allclose(row, dense.get_action_value_function()[state]))
+
+    def test_temporal_difference_learn_with_sparse_store(self):
+        mdp = model.TemporalDifference(2 ** 80, 2, 1.0, 5, 0.5, storage.SparseActionValueStore(2))
+        mdp.learn(((2 ** 70, 0, 0.0), (2 ** 79, 1, 1.5)))
+
+        self.assertEqual(mdp.action_value_fn[2 ** 79][1], 1.5)
+
+    def test_epsilon_greedy_improve_with_sparse_store(self):
+        store = storage.SparseActionValueStore(3)
+        store[2 ** 64][2] = 1.0
+        greedy = policy.EpsilonGreedy(2 ** 65, 3, 0.0, sparse=True)
+
+        greedy.improve(store)
+
+        self.assertEqual(greedy.get_action(2 ** 64), 2)
+        self.assertIn(greedy.get_action(5), range(3))
+
+    def test_blend_duplicates_matches_sequential_updates(self):
+        states = np.array([0, 1, 0, 0, 1])
+        actions = np.array([1, 0, 1, 1, 0])
+        targets = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+        dense = np.ones((2, 2))
+        sparse = storage.SparseActionValueStore(2)
+        sparse[0][:] = 1.0
+        sparse[1][:] = 1.0
+
+        storage.blend(dense, states, actions, targets, 0.3)
+        storage.blend(sparse, states, actions, targets, 0.3)
+
+        expected = np.ones((2, 2))
+        for (state, action, target) in zip(states, actions, targets):
+            expected[state][action] += 0.3 * (target - expected[state][action])
+        self.assertTrue(np.allclose(dense, expected))
+        self.assertTrue(np.allclose(sparse[0], expected[0]))
+        self.assertTrue(np.allclose(sparse[1], expected[1]))
+
+
+class TestActionValueTypes(unittest.TestCase):
+    """
+    Test the compact types of the action values and the quantized
+    storage.
+    """
+
+    def test_create_with_dtype(self):
+        for dtype in ('float64', 'float32', 'float16'):
+            self.assertEqual(storage.create_action_value_store(4, 2, dtype=dtype).dtype, np.dtype(dtype))
+        self.assertTrue(storage.is_quantized(storage.create_action_value_store(4, 2, dtype='int16')))
+        self.assertEqual(storage.create_action_value_store(2 ** 40, 2, memory_budget=1024, dtype='int16').dtype,
+                         np.dtype(np.float32))
+
+    def test_quantized_row_indexing(self):
+        store = storage.QuantizedActionValueStore(4, 3)
+        store[2][1] = 2.5
+        store[2][0] += 1.0
+
+        self.assertAlmostEqual(store[2][0], 1.0, places=3)
+        self.assertAlmostEqual(store[2][1], 2.5, places=3)
+        self.assertEqual(np.argmax(store[2]), 1)
+        self.assertEqual(list(store), [2])
+        self.assertIsNone(store.get(0))
+
+        store[2].fill(0)
+        self.assertTrue(np.array_equal(store.get(2), np.zeros(3)))
+
+    def test_quantized_precision_relative_to_row(self):
+        store = storage.QuantizedActionValueStore(2, 2)
+        store[0][0] = 0.001
+        store[0][1] = 1000.0
+        store[1][0] = 0.001
+
+        self.assertTrue(np.allclose(store.get(0), [0.0, 1000.0], atol=1000.0 / storage.QUANTIZATION_LEVELS))
+        self.assertAlmostEqual(store[1][0], 0.001, places=6)
+
+    def test_learners_with_compact_types(self):
+        history = ((1, 0, 1.0), (4, 1, 1.5), (0, 0, 0.9))
+        reference = model.MonteCarlo(5, 2, 0.5, 5, 0.5)
+        reference.learn(history)
+        reference.learn(history[1:])
+
+        for dtype in ('float32', 'float16', 'int16'):
+            mdp = model.MonteCarlo(5, 2, 0.5, 5, 0.5, storage.create_action_value_store(5, 2, dtype=dtype))
+            mdp.learn(history)
+            mdp.learn(history[1:])
+            self.assertTrue(np.allclose(storage.gather_rows(mdp.action_value_fn, range(5)),
+                                        reference.action_value_fn, rtol=1e-2, atol=1e-2))
+
+            mdp = model.TemporalDifference(5, 2, 1.0, 5, 0.5, storage.create_action_value_store(5, 2, dtype=dtype))
+            mdp.learn(((2, 0, 0.0), (3, 1, 1.5)))
+            mdp.learn_batch([1, 1], [0, 0], [1.0, 1.0], [3, 3])
+            mdp.reset_action_values(3)
+            self.assertAlmostEqual(float(mdp.action_value_fn[3][1]), 0.0)
+            self.assertAlmostEqual(float(mdp.action_value_fn[1][0]), 1.0 + 0.5 * 1.5, places=2)
+
+    def test_float16_saturates(self):
+        mdp = model.MonteCarlo(2, 1, 1.0, 5, 0.8, storage.create_action_value_store(2, 1, dtype='float16'))
+        mdp.learn([(0, 0, 1.0)] * 100)
+
+        self.assertTrue(np.isfinite(mdp.action_value_fn).all())
+
+    def test_epsilon_greedy_improve_with_quantized_store(self):
+        store = storage.QuantizedActionValueStore(4, 3)
+        store[1][2] = 1.0
+        store[3][0] = -1.0
+        greedy = policy.EpsilonGreedy(4, 3, 0.0)
+
+        greedy.improve(store, {1, 3})
+        self.assertEqual(greedy.get_action(1), 2)
+        self.assertEqual(greedy.get_action(3), 1)
+
+        greedy.improve(store)
+        self.assertEqual(greedy.get_action(1), 2)
@@ -0,0 +1,136 @@
+import unittest
+import numpy as np
+import environments.surrogate as surrogate
+
+
+def two_substations_grid():
+    """Two substations linked by two lines, a production on the first one and a load on the second one."""
+    return surrogate.Grid(2, [0, 0], [1, 1], [0.1, 0.3], [0], [1], [100.0], [100.0], thermal_limits=[100.0, 100.0])
+
+
+class TestSurrogate(unittest.TestCase):
+    """
+    Test the DC power flow surrogate environment.
+    """
+
+    def test_dc_power_flow(self):
+        grid = two_substations_grid()
+
+        (flows, game_over) = surrogate.dc_power_flow(grid, np.zeros((1, 6), np.int8), np.ones((1, 2), bool),
+                                                     np.array([[100.0]]), np.array([[100.0]]))
+
+        # The flows split inversely to the reactances.
+        self.assertTrue(np.allclose(flows, [[75.0, 25.0]]))
+        self.assertFalse(game_over[0])
+
+    def test_node_splitting_isolates_load(self):
+        grid = two_substations_grid()
+        topologies = np.array([[0, 0, 0, 0, 0, 0],
+                               [0, 1, 0, 0, 0, 0],
+                               [0, 0, 0, 0, 1, 0]], np.int8)
+
+        (flows, game_over) = surrogate.dc_power_flow(grid, topologies, np.ones((3, 2), bool),
+                                                     np.full((3, 1), 100.0), np.full((3, 1), 100.0))
+
+        self.assertTrue(np.array_equal(game_over, [False, True, False]))
+        self.assertTrue(np.allclose(flows[2], [0.0, 100.0]))
+
+    def test_ieee14_spaces(self):
+        environment = surrogate.SurrogateEnvironment()
+
+        self.assertEqual(environment.observation_space.number_power_lines, 20)
+        self.assertEqual(environment.action_space.node_splitting_subaction_length, 5 + 11 + 20 + 20)
+        self.assertEqual(len(environment.reset()), environment.observation_space.shape[0])
+
+    def test_step(self):
+        environment = surrogate.SurrogateEnvironment()
+        observation = environment.observation_space.array_to_observation(environment.reset())
+        action = environment.action_space.get_do_nothing_action(as_class_Action=True)
+
+        (next_observation, rewards, done, info) = environment.step(action, do_sum=False)
+
+        self.assertEqual(len(rewards), 5)
+        self.assertFalse(done)
+        self.assertIsNone(info)
+        self.assertTrue(np.all(observation.get_lines_capacity_usage() < 1.0))
+        self.assertTrue(np.all(observation.get_lines_status() == 1.0))
+
+    def test_game_over_without_observation(self):
+        environment = surrogate.SurrogateEnvironment()
+        environment.reset()
+        action = environment.action_space.get_do_nothing_action()
+        action[environment.action_space.node_splitting_subaction_length:] = 1
+
+        (observation, _, done, info) = environment.step(action)
+
+        self.assertTrue(done)
+        self.assertIsNone(observation)
+        self.assertIsNotNone(info.text)
+
+    def test_batch_matches_single_grids(self):
+        batch = surrogate.SurrogateEnvironment(batch_size=3, load_noise=0.0)
+        batch.reset_batch()
+        actions = np.zeros((3, batch.action_space.action_length), int)
+        actions[1][7] = 1
+
+        (observations, rewards, dones, _) = batch.step_batch(actions)
+
+        for i in range(3):
+            single = surrogate.SurrogateEnvironment(load_noise=0.0)
+            single.phases[0] = batch.phases[i]
+            single.reset()
+            (observation, reward, done, _) = single.step(actions[i], do_sum=False)
+
+            self.assertEqual(dones[i], done)
+            if not done:
+                self.assertTrue(np.allclose(observations[i], observation))
+            self.assertTrue(np.allclose(rewards[i], reward))
+
+    def test_deterministic(self):
+        first = surrogate.SurrogateEnvironment(start_id=3)
+        second = surrogate.SurrogateEnvironment(start_id=3)
+        action = first.action_space.get_do_nothing_action()
+        first.reset()
+        second.reset()
+
+        for _ in range(5):
+            self.assertTrue(np.array_equal(first.step(action)[0], second.step(action)[0]))
+
+    def test_reset_batch_mask(self):
+        environment = surrogate.SurrogateEnvironment(batch_size=2)
+        environment.reset_batch()
+        actions = np.zeros((2, environment.action_space.action_length), int)
+        actions[:, 0] = 1
+        environment.step_batch(actions)
+
+        environment.reset_batch(np.array([True, False]))
+
+        self.assertEqual(environment.topologies[0][0], 0)
+        self.assertEqual(environment.topologies[1][0], 1)
+
+    def test_simulate_leaves_environment_unchanged(self):
+        environment = surrogate.SurrogateEnvironment()
+        environment.reset()
+        action = environment.action_space.get_do_nothing_action()
+        action[0] = 1
+
+        (simulated_observation, simulated_reward, simulated_done, _) = environment.simulate(action)
+
+        self.assertEqual(environment.timesteps[0], 0)
+        self.assertEqual(environment.topologies[0][0], 0)
+        (observation, reward, done, _) = environment.step(action)
+        self.assertAlmostEqual(reward, simulated_reward)
+        self.assertEqual(done, simulated_done)
+        self.assertTrue(np.array_equal(observation, simulated_observation))
+
+    def test_simulate_game_over(self):
+        environment = surrogate.SurrogateEnvironment()
+        environment.reset()
+        action = environment.action_space.get_do_nothing_action()
+        action[environment.action_space.node_splitting_subaction_length:] = 1
+
+        (observation, _, done, info) = environment.simulate(action)
+
+        self.assertTrue(done)
+        self.assertIsNone(observation)
+        self.assertFalse(environment.step(environment.action_space.get_do_nothing_action())[2])
@@ -67,3 +67,38 @@ class TestTemporalDifference(unittest.TestCase):
         mdp.learn(history)
 
         self.assertTrue(mdp.is_mature())
+
+    def test_learn_batch_matches_learn(self):
+        sequential = model.TemporalDifference(4, 2, 0.5, 5, 0.5)
+        batched = model.TemporalDifference(4, 2, 0.5, 5, 0.5)
+        for mdp in (sequential, batched):
+            mdp.action_value_fn[2][:] = [1.0, 3.0]
+            mdp.action_value_fn[3][:] = [2.0, 4.0]
+
+        transitions = ((0, 1, 1.0, 2, 0), (1, 0, 2.0, 3, 1), (0, 0, 0.5, 2, 1))
+        for (state, action, reward, next_state, next_action) in transitions:
+            sequential.learn(((next_state, next_action, 0.0), (state, action, reward)))
+        (states, actions, rewards, next_states, next_actions) = zip(*transitions)
+        batched.learn_batch(states, actions, rewards, next_states, next_actions)
+
+        self.assertTrue(np.allclose(sequential.action_value_fn, batched.action_value_fn))
+        self.assertEqual(batched.iteration_count, 3)
+
+    def test_learn_batch_duplicate_pairs(self):
+        mdp = model.TemporalDifference(3, 1, 0.5, 5, 0.5)
+        mdp.action_value_fn[2][0] = 2.0
+
+        mdp.learn_batch([0, 0], [0, 0], [1.0, 3.0], [2, 2], [0, 0])
+
+        # 0 -> 0 + 0.5(2 - 0) = 1 -> 1 + 0.5(4 - 1) = 2.5
+        self.assertEqual(mdp.action_value_fn[0][0], 2.5)
+
+    def test_learn_batch_q_learning_targets(self):
+        mdp = model.TemporalDifference(3, 2, 1.0, 5, 0.5)
+        mdp.action_value_fn[2][:] = [1.0, 4.0]
+
+        mdp.learn_batch([0, 1], [1, 0], [1.0, 1.0], [2, 2], dones=[False, True])
+
+        self.assertEqual(mdp.action_value_fn[0][1], 3.0)
+        self.assertEqual(mdp.action_value_fn[1][0], 1.0)
+        self.assertEqual(mdp.pop_touched_states(), {0, 1})
@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+import agents.model as model
+import agents.storage as storage
+
+
+class TestTemporalDifferenceLambda(unittest.TestCase):
+    """
+    Test the TD(lambda) learning algorithm.
+    """
+
+    def test_learn_without_traces_is_td0(self):
+        td_lambda = model.TemporalDifferenceLambda(2, 2, 1.0, 5, 0.5, 0.0)
+        td = model.TemporalDifference(2, 2, 1.0, 5, 0.5)
+        history = ((1, 0, 0.0), (0, 1, 1.5))
+
+        td_lambda.learn(history)
+        td.learn(history)
+
+        self.assertTrue(np.array_equal(td_lambda.action_value_fn, td.action_value_fn))
+        self.assertEqual(td_lambda.traces, dict())
+
+    def test_learn_propagates_to_traced_pairs(self):
+        mdp = model.TemporalDifferenceLambda(3, 1, 1.0, 5, 1.0, 0.5)
+
+        mdp.learn(((1, 0, 0.0), (0, 0, 0.0)))
+        mdp.learn(((2, 0, 0.0), (1, 0, 2.0)))
+
+        self.assertEqual(mdp.action_value_fn[1][0], 2.0)
+        self.assertEqual(mdp.action_value_fn[0][0], 1.0)
+        self.assertEqual(mdp.traces, {(0, 0): 0.25, (1, 0): 0.5})
+
+    def test_traces_are_pruned_below_cutoff(self):
+        mdp = model.TemporalDifferenceLambda(10, 1, 0.5, 5, 0.5, 0.5, trace_cutoff=0.1)
+
+        for state in range(5):
+            mdp.learn(((state + 1, 0, 0.0), (state, 0, 1.0)))
+
+        self.assertEqual(list(mdp.traces), [(4, 0)])
+
+    def test_max_traces_drops_least_recently_visited(self):
+        mdp = model.TemporalDifferenceLambda(10, 1, 0.5, 5, 1.0, 1.0, max_traces=2)
+
+        mdp.learn(((1, 0, 0.0), (0, 0, 1.0)))
+        mdp.learn(((2, 0, 0.0), (1, 0, 1.0)))
+        mdp.learn(((1, 0, 0.0), (0, 0, 1.0)))
+        mdp.learn(((3, 0, 0.0), (2, 0, 1.0)))
+
+        self.assertEqual(list(mdp.traces), [(0, 0), (2, 0)])
+
+    def test_replacing_traces(self):
+        mdp = model.TemporalDifferenceLambda(2, 1, 0.5, 5, 1.0, 1.0, replacing_traces=True)
+
+        mdp.learn(((0, 0, 0.0), (0, 0, 1.0)))
+        mdp.learn(((0, 0, 0.0), (0, 0, 1.0)))
+
+        self.assertEqual(mdp.traces[(0, 0)], 1.0)
+
+    def test_reset_traces(self):
+        mdp = model.TemporalDifferenceLambda(2, 1, 0.5, 5, 0.5, 0.5)
+        mdp.learn(((1, 0, 0.0), (0, 0, 1.0)))
+
+        mdp.reset_traces()
+
+        self.assertEqual(mdp.traces, dict())
+
+    def test_learn_with_sparse_store(self):
+        dense = model.TemporalDifferenceLambda(4, 2, 0.5, 5, 0.9, 0.8)
+        sparse = model.TemporalDifferenceLambda(4, 2, 0.5, 5, 0.9, 0.8, storage.SparseActionValueStore(2))
+        history = [((1, 0, 0.0), (0, 1, 1.0)), ((2, 1, 0.0), (1, 0, 2.0)), ((3, 0, 0.0), (2, 1, -1.0))]
+
+        for step in history:
+            dense.learn(step)
+            sparse.learn(step)
+
+        for (state, row) in sparse.action_value_fn.items():
+            self.assertTrue(np.allclose(row, dense.action_value_fn[state]))
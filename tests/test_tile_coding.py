@@ -0,0 +1,67 @@
+import unittest
+import numpy as np
+import agents.tile_coding as tile_coding
+
+
+class TestTileCoding(unittest.TestCase):
+    """
+    Test the hashed tile coding of the observations and its linear
+    action values.
+    """
+
+    def setUp(self):
+        self.coder = tile_coding.TileCoder(20, 1024, number_tilings=8, lines_per_tiling=4)
+        self.usage = np.linspace(0.1, 0.9, 20)
+        self.status = np.ones(20)
+        self.topology = np.zeros(56)
+
+    def test_features_in_buckets(self):
+        features = self.coder.features(self.usage, self.status, self.topology, 600)
+
+        self.assertEqual(len(features), self.coder.number_features)
+        self.assertTrue(np.all((features >= 0) & (features < 1024)))
+
+    def test_deterministic(self):
+        other = tile_coding.TileCoder(20, 1024, number_tilings=8, lines_per_tiling=4)
+
+        self.assertTrue(np.array_equal(self.coder.features(self.usage, self.status, self.topology, 600),
+                                       other.features(self.usage, self.status, self.topology, 600)))
+
+    def test_tilings_see_all_lines(self):
+        for number_power_lines in (20, 41, 186):
+            coder = tile_coding.TileCoder(number_power_lines, 1024, number_tilings=8)
+
+            self.assertEqual(len(np.unique(coder.tiling_lines)), number_power_lines)
+            for lines in coder.tiling_lines:
+                self.assertEqual(len(np.unique(lines)), len(lines))
+
+    def test_close_observations_share_tiles(self):
+        features = self.coder.features(self.usage, self.status, self.topology, 600)
+        close = self.coder.features(self.usage + 0.01, self.status, self.topology, 600)
+        far = self.coder.features(self.usage + 0.5, self.status, self.topology, 600)
+
+        self.assertGreater(np.count_nonzero(features == close), np.count_nonzero(features == far))
+        # The topology feature does not depend on the usage.
+        self.assertEqual(features[-1], far[-1])
+
+    def test_topology_changes_its_feature(self):
+        topology = self.topology.copy()
+        topology[3] = 1
+
+        features = self.coder.features(self.usage, self.status, self.topology, 600)
+        switched = self.coder.features(self.usage, self.status, topology, 600)
+
+        self.assertTrue(np.array_equal(features[:-1], switched[:-1]))
+        self.assertNotEqual(features[-1], switched[-1])
+
+    def test_linear_learning(self):
+        action_values = tile_coding.LinearActionValues(16, 3, learning_rate=0.5, discount=0.9)
+        features = np.array([1, 4, 9, 12])
+
+        td_error = action_values.learn(features, 2, 1.0)
+        self.assertEqual(td_error, 1.0)
+        self.assertAlmostEqual(action_values.action_values(features)[2], 0.5)
+
+        action_values.learn(features, 2, 0.0, next_value=1.0)
+        self.assertAlmostEqual(action_values.action_values(features)[2], 0.5 + 0.5 * (0.9 - 0.5))
+        self.assertEqual(action_values.action_values(features)[0], 0.0)
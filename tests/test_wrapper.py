@@ -0,0 +1,50 @@
+import unittest
+import numpy as np
+import agents.wrapper as wrapper
+import environments.run_env as run_env
+import environments.surrogate as surrogate
+
+
+class PypownetObservation(run_env.Observation):
+    """
+    An observation with the attributes of pypownet's Observation used
+    by the wrapper, without the rest of it.
+    """
+
+    def __init__(self, ampere_flows, thermal_limits, lines_status, productions_nodes, loads_nodes, lines_or_nodes,
+                 lines_ex_nodes):
+        self.ampere_flows = ampere_flows
+        self.thermal_limits = thermal_limits
+        self.lines_status = lines_status
+        self.productions_nodes = productions_nodes
+        self.loads_nodes = loads_nodes
+        self.lines_or_nodes = lines_or_nodes
+        self.lines_ex_nodes = lines_ex_nodes
+
+    def get_lines_capacity_usage(self):
+        return np.divide(self.ampere_flows, self.thermal_limits)
+
+
+class TestWrapper(unittest.TestCase):
+    """
+    Test the features of the observations of pypownet and of the
+    surrogate environment.
+    """
+
+    def test_pypownet_observation_to_features(self):
+        observation = PypownetObservation(np.array([50.0, 150.0]), np.array([100.0, 100.0]), np.array([1, 0]),
+                                          np.array([0]), np.array([1, 0]), np.array([0, 1]), np.array([1, 1]))
+
+        features = wrapper.observation_to_features(observation)
+
+        self.assertEqual(features.dtype, np.float32)
+        self.assertTrue(np.array_equal(features, [0.5, 1.5, 1, 0, 0, 1, 0, 0, 1, 1, 1]))
+
+    def test_surrogate_observation_to_features(self):
+        environment = surrogate.SurrogateEnvironment()
+        observation = environment.observation_space.array_to_observation(environment.reset())
+
+        features = wrapper.observation_to_features(observation)
+
+        self.assertEqual(len(features), 2 * 20 + environment.grid.number_elements)
+        self.assertTrue(np.allclose(features[:20], observation.get_lines_capacity_usage()))